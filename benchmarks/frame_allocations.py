@@ -0,0 +1,165 @@
+"""Audio buffers allocated per second of audio by the input pipeline of a session.
+
+Frames of user speech go through noise suppression, the VAD and an STT stream
+expecting 16kHz audio (like Deepgram), as in a call. Two pipelines are compared:
+
+- `copying`: the input at 24kHz (the default of the room input), the noise
+  suppression copying every 10ms chunk to and from a new frame, and the VAD and
+  the STT resampling the frames to 16kHz each
+- `in_place`: the input at 16kHz, the noise suppression running in place in the
+  frames of the audio stream, read as is by the VAD and the STT
+
+For each it reports the audio frames allocated (every `rtc.AudioFrame()` copies
+its data to a new buffer, the resampled frames included), the bytes copied into
+them and the resamplers created, per second of audio, and the CPU time of the
+pipeline per second of audio. The frame the audio stream of the room allocates
+for every input frame is counted in both, as are the frames the VAD allocates for
+its events.
+
+    uv run python benchmarks/frame_allocations.py --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS
+
+from adaptive_nc import WebRTCNoiseSuppression
+from fakes import FakeRecognizeStream, FakeSTT
+from shared_models import load_vad
+
+STT_SAMPLE_RATE = 16000
+
+
+class _Counts:
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+        self.resamplers = 0
+
+    def install(self) -> None:
+        frame_init = rtc.AudioFrame.__init__
+        resampler_init = rtc.AudioResampler.__init__
+
+        def _frame_init(frame, data, *args, **kwargs) -> None:
+            self.frames += 1
+            self.bytes += memoryview(data).nbytes
+            frame_init(frame, data, *args, **kwargs)
+
+        def _resampler_init(resampler, *args, **kwargs) -> None:
+            self.resamplers += 1
+            resampler_init(resampler, *args, **kwargs)
+
+        rtc.AudioFrame.__init__ = _frame_init
+        rtc.AudioResampler.__init__ = _resampler_init
+
+
+class _CopyingSuppression:
+    """Noise suppression copying the chunks of the frames, before `chunk_views`."""
+
+    def __init__(self) -> None:
+        self._apm = rtc.AudioProcessingModule(
+            noise_suppression=True, high_pass_filter=True
+        )
+
+    def process(self, frame: rtc.AudioFrame) -> rtc.AudioFrame:
+        samples = np.frombuffer(frame.data, dtype=np.int16)
+        chunk_size = frame.sample_rate // 100
+        for start in range(0, len(samples) - chunk_size + 1, chunk_size):
+            chunk = rtc.AudioFrame(
+                samples[start : start + chunk_size].tobytes(),
+                frame.sample_rate,
+                1,
+                chunk_size,
+            )
+            self._apm.process_stream(chunk)
+            samples[start : start + chunk_size] = np.frombuffer(
+                chunk.data, dtype=np.int16
+            )
+        return frame
+
+
+def _speech(duration: float, sample_rate: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    tone = np.sin(2 * np.pi * 220 * t) * 8000 * (t % 2.0 < 1.0)
+    return (tone + rng.standard_normal(len(t)) * 500).astype(np.int16)
+
+
+async def _run_pipeline(name: str, duration: float, counts: _Counts) -> dict:
+    sample_rate = 24000 if name == "copying" else STT_SAMPLE_RATE
+    frame_size = sample_rate // 20
+    speech = _speech(duration, sample_rate)
+    vad_stream = load_vad().stream()
+    stt_stream = FakeRecognizeStream(
+        stt=FakeSTT(["hello"]),
+        conn_options=DEFAULT_API_CONNECT_OPTIONS,
+        sample_rate=STT_SAMPLE_RATE,
+    )
+    suppression = (
+        _CopyingSuppression() if name == "copying" else WebRTCNoiseSuppression()
+    )
+
+    async def _drain(stream) -> None:
+        async for _ in stream:
+            pass
+
+    drain_tasks = [asyncio.create_task(_drain(s)) for s in (vad_stream, stt_stream)]
+    before = (counts.frames, counts.bytes, counts.resamplers)
+    started_at = time.process_time()
+    for start in range(0, len(speech) - frame_size + 1, frame_size):
+        # allocated by the audio stream of the room
+        frame = rtc.AudioFrame(
+            speech[start : start + frame_size].tobytes(), sample_rate, 1, frame_size
+        )
+        frame = suppression.process(frame)
+        stt_stream.push_frame(frame)
+        vad_stream.push_frame(frame)
+        # let the VAD and the STT consume the frames, like in a call
+        await asyncio.sleep(0)
+
+    vad_stream.end_input()
+    stt_stream.end_input()
+    await asyncio.gather(*drain_tasks)
+    cpu = time.process_time() - started_at
+    await vad_stream.aclose()
+    await stt_stream.aclose()
+
+    frames, copied, resamplers = (
+        after - before
+        for after, before in zip(
+            (counts.frames, counts.bytes, counts.resamplers), before
+        )
+    )
+    return {
+        "input_sample_rate": sample_rate,
+        "frames_allocated_per_audio_second": frames / duration,
+        "bytes_copied_per_audio_second": copied / duration,
+        "resamplers": resamplers,
+        "cpu_ms_per_audio_second": cpu / duration * 1000,
+    }
+
+
+async def _run(duration: float) -> dict:
+    counts = _Counts()
+    counts.install()
+    return {
+        name: await _run_pipeline(name, duration, counts)
+        for name in ["copying", "in_place"]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=30.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(_run(args.duration)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
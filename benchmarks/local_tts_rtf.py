@@ -0,0 +1,74 @@
+"""Real-time factor of the local fallback TTS, per CPU core.
+
+Synthesizes the same sentences on 1 to `--threads` threads at once. The real-time
+factor is the synthesis time over the duration of the audio produced (below 1 is
+faster than real time). The number of real-time streams a core sustains, with
+every thread busy, tells how many calls a host serves in degraded mode.
+
+Requires the `local-tts` extra and a Piper voice:
+
+    uv run python benchmarks/local_tts_rtf.py --model en_US-lessac-medium.onnx
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from local_tts import PiperVoice
+
+SENTENCES = [
+    "Of course! We're open from nine to six, Monday to Friday.",
+    "Let me check that for you, it will only take a second.",
+    "Your appointment is confirmed for tomorrow at three in the afternoon.",
+    "I'm sorry, I didn't catch that. Could you say it again?",
+]
+
+
+def _synthesize(voice: PiperVoice, rounds: int) -> tuple[float, float]:
+    """Seconds spent synthesizing and seconds of audio produced."""
+    started_at = time.perf_counter()
+    num_bytes = 0
+    for _ in range(rounds):
+        for sentence in SENTENCES:
+            for chunk in voice.synthesize(sentence):
+                num_bytes += len(chunk)
+    return time.perf_counter() - started_at, num_bytes / 2 / voice.sample_rate
+
+
+def _measure(voice: PiperVoice, threads: int, rounds: int) -> dict:
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda _: _synthesize(voice, rounds), range(threads)))
+    elapsed = time.perf_counter() - started_at
+
+    audio = sum(duration for _, duration in results)
+    rtf = sum(spent for spent, _ in results) / audio
+    return {
+        "threads": threads,
+        "real_time_factor": rtf,
+        "real_time_streams": audio / elapsed,
+        "real_time_streams_per_core": audio
+        / elapsed
+        / min(threads, os.cpu_count() or 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", required=True, help="Piper voice (.onnx)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    voice = PiperVoice.load(args.model)
+    results = [
+        _measure(voice, threads, args.rounds)
+        for threads in sorted({1, *range(2, args.threads + 1, 2), args.threads})
+    ]
+    print(json.dumps({"sample_rate": voice.sample_rate, "runs": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
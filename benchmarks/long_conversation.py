@@ -0,0 +1,91 @@
+"""LLM time to first token over a long conversation, with and without compaction.
+
+Runs text turns through `Assistant` with a fake LLM whose time to first token
+grows with the size of the prompt, like the prompt processing of a real one.
+Without compaction the whole history is sent every turn and the TTFT grows
+linearly, with `ContextCompactor` it stays flat once the budget is reached.
+
+    uv run python benchmarks/long_conversation.py --turns 100
+"""
+
+import argparse
+import asyncio
+import json
+
+from livekit.agents import AgentSession
+
+from agent import Assistant
+from context_compaction import ContextCompactor
+from fakes import FakeAudioOutput, FakeLLM, FakeTTS
+
+QUESTION = "Can you tell me more about the opening hours of the downtown store?"
+ANSWER = (
+    "Sure! The downtown store is open from nine in the morning to seven in the "
+    "evening on weekdays, and from ten to five on Saturdays."
+)
+
+
+async def _run_conversation(
+    args: argparse.Namespace, compactor: ContextCompactor | None
+) -> FakeLLM:
+    fake_llm = FakeLLM(
+        [ANSWER],
+        ttft=args.llm_ttft,
+        token_interval=0.0,
+        prompt_token_latency=args.prompt_token_latency,
+    )
+    async with AgentSession(llm=fake_llm, tts=FakeTTS(ttfb=0.0)) as session:
+        session.output.audio = FakeAudioOutput(realtime=False)
+        await session.start(Assistant(compactor=compactor))
+        for _ in range(args.turns):
+            await session.run(user_input=QUESTION)
+
+    if compactor is not None:
+        await compactor.aclose()
+    return fake_llm
+
+
+def _report(fake_llm: FakeLLM, turns: int) -> dict:
+    checkpoints = sorted({1, *range(10, turns + 1, 10)})
+    return {
+        f"turn_{turn}": {
+            "ttft_ms": fake_llm.delays[turn - 1] * 1000,
+            "prompt_tokens": fake_llm.prompt_tokens[turn - 1],
+        }
+        for turn in checkpoints
+    }
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    full = await _run_conversation(args, None)
+    compactor = ContextCompactor(
+        FakeLLM(["The user asked about the opening hours."], ttft=args.llm_ttft),
+        keep_turns=args.keep_turns,
+        max_tokens=args.max_tokens,
+    )
+    compacted = await _run_conversation(args, compactor)
+    return {
+        "full_history": _report(full, args.turns),
+        "compacted": _report(compacted, args.turns),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--keep-turns", type=int, default=6)
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--llm-ttft", type=float, default=0.05)
+    parser.add_argument(
+        "--prompt-token-latency",
+        type=float,
+        default=0.00005,
+        help="seconds of TTFT added per prompt token",
+    )
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(_run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
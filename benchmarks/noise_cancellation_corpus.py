@@ -0,0 +1,225 @@
+"""CPU and STT accuracy of adaptive noise cancellation, on recorded audio.
+
+Every recording (16-bit mono WAV) goes through the noise cancellation of a session
+in 50ms frames at 24kHz, like the audio input of the room: never, always with the
+WebRTC noise suppression (`webrtc_ns`), always with BVC (`bvc`), and in adaptive
+mode, where the WebRTC noise suppression is only applied while the SNR of the
+input is low. With `--noise-snr` white noise is mixed into the recordings first,
+for a noisy corpus. For each mode it reports:
+
+- the CPU time of the noise cancellation per second of audio, the difference
+  between `webrtc_ns` and `adaptive` is the CPU saved per session
+- the part of the audio the noise cancellation was applied to
+- the word error rate of the local STT on the processed audio, against the `.txt`
+  file next to the recording
+
+BVC only runs on the tracks of a LiveKit Cloud room: with `--bvc`, every recording
+is published in real time to a room of `LIVEKIT_URL` and received with BVC by a
+second participant. Its CPU time also counts the Opus encoding and decoding of
+the room, it isn't comparable with the other modes.
+
+    uv run --extra local-stt python benchmarks/noise_cancellation_corpus.py \\
+        --model vosk-model-small-en-us-0.15 --bvc recordings/*.wav
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+import wave
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+from livekit import api, rtc
+from livekit.plugins import noise_cancellation
+
+from adaptive_nc import AdaptiveNoiseCancellation, WebRTCNoiseSuppression
+from local_stt import VoskRecognizer, word_error_rate
+
+SAMPLE_RATE = 24000
+FRAME_SIZE = SAMPLE_RATE // 20
+
+load_dotenv(".env.local")
+
+
+def _read_samples(path: Path, noise_snr: float | None, seed: int) -> np.ndarray:
+    """The recording at 24kHz, with white noise at `noise_snr` dB if given."""
+    with wave.open(str(path)) as f:
+        if f.getsampwidth() != 2 or f.getnchannels() != 1:
+            raise SystemExit(f"{path}: expected 16-bit mono audio")
+        sample_rate = f.getframerate()
+        data = f.readframes(f.getnframes())
+
+    resampler = rtc.AudioResampler(sample_rate, SAMPLE_RATE)
+    frames = [
+        *resampler.push(rtc.AudioFrame(data, sample_rate, 1, len(data) // 2)),
+        *resampler.flush(),
+    ]
+    samples = np.concatenate(
+        [np.frombuffer(frame.data, dtype=np.int16) for frame in frames]
+    ).astype(np.float64)
+    if noise_snr is not None:
+        noise = np.random.default_rng(seed).standard_normal(len(samples))
+        samples += noise * np.std(samples) / 10 ** (noise_snr / 20)
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def _frames(samples: np.ndarray) -> list[rtc.AudioFrame]:
+    return [
+        rtc.AudioFrame(
+            samples[i : i + FRAME_SIZE].tobytes(), SAMPLE_RATE, 1, FRAME_SIZE
+        )
+        for i in range(0, len(samples) - FRAME_SIZE + 1, FRAME_SIZE)
+    ]
+
+
+async def _bvc(frames: list[rtc.AudioFrame]) -> list[rtc.AudioFrame]:
+    """The frames published to a LiveKit Cloud room, as received with BVC."""
+    url = os.environ["LIVEKIT_URL"]
+    room_name = f"nc-benchmark-{uuid.uuid4().hex[:8]}"
+
+    def _token(identity: str) -> str:
+        return (
+            api.AccessToken()
+            .with_identity(identity)
+            .with_grants(api.VideoGrants(room_join=True, room=room_name))
+            .to_jwt()
+        )
+
+    publisher, subscriber = rtc.Room(), rtc.Room()
+    subscribed: asyncio.Future[rtc.Track] = asyncio.get_running_loop().create_future()
+
+    @subscriber.on("track_subscribed")
+    def _on_track_subscribed(track: rtc.Track, *_) -> None:
+        if not subscribed.done():
+            subscribed.set_result(track)
+
+    await subscriber.connect(url, _token("subscriber"))
+    await publisher.connect(url, _token("publisher"))
+    try:
+        source = rtc.AudioSource(SAMPLE_RATE, 1)
+        await publisher.local_participant.publish_track(
+            rtc.LocalAudioTrack.create_audio_track("recording", source),
+            rtc.TrackPublishOptions(source=rtc.TrackSource.SOURCE_MICROPHONE),
+        )
+        stream = rtc.AudioStream.from_track(
+            track=await asyncio.wait_for(subscribed, 10),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            noise_cancellation=noise_cancellation.BVC(),
+        )
+        received: list[rtc.AudioFrame] = []
+
+        async def _receive() -> None:
+            async for ev in stream:
+                received.append(ev.frame)
+
+        receive_task = asyncio.create_task(_receive())
+        # followed by a second of silence, for the audio buffered on the way
+        silence = rtc.AudioFrame(bytes(FRAME_SIZE * 2), SAMPLE_RATE, 1, FRAME_SIZE)
+        for frame in [*frames, *[silence] * 20]:
+            await source.capture_frame(frame)
+        await source.wait_for_playout()
+        receive_task.cancel()
+        await stream.aclose()
+        return received
+    finally:
+        await publisher.disconnect()
+        await subscriber.disconnect()
+
+
+def _process(samples: np.ndarray, mode: str) -> tuple[np.ndarray, dict]:
+    frames = _frames(samples)
+    processor = None
+    if mode == "webrtc_ns":
+        processor = WebRTCNoiseSuppression()
+    elif mode == "adaptive":
+        processor = AdaptiveNoiseCancellation(WebRTCNoiseSuppression())
+
+    duration = len(frames) * FRAME_SIZE / SAMPLE_RATE
+    started_at = time.process_time()
+    if mode == "bvc":
+        frames = asyncio.run(_bvc(frames))
+    elif isinstance(processor, AdaptiveNoiseCancellation):
+        frames = [processor._process(frame) for frame in frames]
+    elif processor is not None:
+        frames = [processor.process(frame) for frame in frames]
+    cpu = time.process_time() - started_at
+
+    cancelled = 0.0 if mode == "never" else duration
+    if isinstance(processor, AdaptiveNoiseCancellation):
+        cancelled = processor.cancelled_duration
+    output = np.concatenate([np.frombuffer(f.data, dtype=np.int16) for f in frames])
+    return output, {
+        "cpu_ms_per_audio_second": cpu / duration * 1000,
+        "cancelled_fraction": cancelled / duration,
+    }
+
+
+def _transcribe(recognizer: VoskRecognizer, samples: np.ndarray) -> str:
+    resampler = rtc.AudioResampler(SAMPLE_RATE, recognizer.sample_rate)
+    frames = [
+        *resampler.push(
+            rtc.AudioFrame(samples.tobytes(), SAMPLE_RATE, 1, len(samples))
+        ),
+        *resampler.flush(),
+    ]
+    utterance = recognizer.utterance()
+    for frame in frames:
+        utterance.accept(bytes(frame.data))
+    return utterance.finish()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recordings", type=Path, nargs="+")
+    parser.add_argument("--model", required=True, help="Vosk model directory")
+    parser.add_argument(
+        "--noise-snr", type=float, help="SNR in dB of the white noise to mix in"
+    )
+    parser.add_argument(
+        "--bvc",
+        action="store_true",
+        help="also run BVC, in a room of LIVEKIT_URL (LIVEKIT_API_KEY/SECRET)",
+    )
+    args = parser.parse_args()
+
+    recognizer = VoskRecognizer.load(args.model)
+    modes = ["never", "webrtc_ns", *(["bvc"] if args.bvc else []), "adaptive"]
+    runs = []
+    for seed, path in enumerate(args.recordings):
+        samples = _read_samples(path, args.noise_snr, seed)
+        reference_path = path.with_suffix(".txt")
+        run: dict = {"recording": str(path)}
+        for mode in modes:
+            output, run[mode] = _process(samples, mode)
+            if reference_path.exists():
+                run[mode]["word_error_rate"] = word_error_rate(
+                    reference_path.read_text(), _transcribe(recognizer, output)
+                )
+        runs.append(run)
+
+    summary = {
+        mode: {
+            key: float(np.mean([run[mode][key] for run in runs if key in run[mode]]))
+            for key in [
+                "cpu_ms_per_audio_second",
+                "cancelled_fraction",
+                "word_error_rate",
+            ]
+            if any(key in run[mode] for run in runs)
+        }
+        for mode in modes
+    }
+    summary["cpu_ms_saved_per_audio_second"] = (
+        summary["webrtc_ns"]["cpu_ms_per_audio_second"]
+        - summary["adaptive"]["cpu_ms_per_audio_second"]
+    )
+    print(json.dumps({"runs": runs, "summary": summary}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
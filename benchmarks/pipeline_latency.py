@@ -0,0 +1,283 @@
+"""Offline latency benchmark of the voice pipeline, with fake STT, LLM and TTS.
+
+Drives `Assistant` through an `AgentSession` fed with synthetic audio. The fake
+providers add the configured latencies (with seeded gaussian jitter) and never
+touch the network, so what's left of the measured latency is the overhead of the
+pipeline itself:
+
+- pipeline overhead: time from the end of an utterance to the first audio frame
+  of the response, minus the injected STT, LLM and TTS latencies
+- interruption handling: time from the user interrupting (the injected STT interim
+  latency excluded) to the agent audio being cleared
+- throughput: text turns per second with zero latency providers
+
+Results are written as JSON, pass a previous run as `--baseline` to print the
+relative change of every metric.
+
+    uv run python benchmarks/pipeline_latency.py --turns 20 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import time
+from collections.abc import Callable, Sequence
+
+import numpy as np
+from livekit.agents import AgentSession
+
+from agent import Assistant
+from fakes import (
+    FakeAudioInput,
+    FakeAudioOutput,
+    FakeLLM,
+    FakeSTT,
+    FakeTTS,
+    silence_frames,
+    speech_frames,
+)
+from latency import QUANTILES
+
+TRANSCRIPTS = [
+    "What are your opening hours?",
+    "Can you tell me a fun fact about space?",
+    "How do I reset my password?",
+]
+RESPONSES = [
+    "We're open from nine in the morning to six in the evening, Monday to Friday.",
+    "Sure! A day on Venus is longer than a year on Venus.",
+    "Click on forgot password on the login page and follow the link we email you.",
+]
+
+
+def _quantiles(samples: Sequence[float]) -> dict[str, float]:
+    return {
+        f"p{int(q * 100)}": float(np.quantile(samples, q)) * 1000 for q in QUANTILES
+    }
+
+
+def _providers(args: argparse.Namespace) -> tuple[FakeSTT, FakeLLM, FakeTTS]:
+    return (
+        FakeSTT(
+            TRANSCRIPTS,
+            latency=args.stt_latency,
+            jitter=args.jitter,
+            seed=args.seed,
+        ),
+        FakeLLM(
+            RESPONSES,
+            ttft=args.llm_ttft,
+            token_interval=args.llm_token_interval,
+            jitter=args.jitter,
+            seed=args.seed,
+        ),
+        FakeTTS(ttfb=args.tts_ttfb, jitter=args.jitter, seed=args.seed),
+    )
+
+
+def _session(fake_stt: FakeSTT, fake_llm: FakeLLM, fake_tts: FakeTTS) -> AgentSession:
+    return AgentSession(
+        stt=fake_stt,
+        llm=fake_llm,
+        tts=fake_tts,
+        turn_detection="stt",
+        min_endpointing_delay=0.0,
+        preemptive_generation=True,
+    )
+
+
+async def _silence_until(
+    audio_input: FakeAudioInput, predicate: Callable[[], bool], timeout: float = 30.0
+) -> None:
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("the agent didn't respond")
+        await audio_input.push_frames(silence_frames(0.02))
+
+
+async def _measure_turns(args: argparse.Namespace) -> dict:
+    fake_stt, fake_llm, fake_tts = _providers(args)
+    audio_input, audio_output = FakeAudioInput(), FakeAudioOutput(realtime=False)
+    response, overhead = [], []
+    async with _session(fake_stt, fake_llm, fake_tts) as session:
+        session.input.audio = audio_input
+        session.output.audio = audio_output
+        await session.start(Assistant())
+
+        for turn in range(args.turns):
+            await audio_input.push_frames(speech_frames(args.speech_duration))
+            await _silence_until(
+                audio_input,
+                lambda turn=turn: (
+                    len(audio_output.first_frame_times) > turn
+                    and session.agent_state == "listening"
+                ),
+            )
+
+            latency = (
+                audio_output.first_frame_times[turn]
+                - fake_stt.utterance_end_times[turn]
+            )
+            response.append(latency)
+            overhead.append(
+                latency
+                - fake_stt.final_delays[turn]
+                - fake_llm.delays[-1]
+                - fake_tts.delays[-1]
+            )
+
+        audio_input.close()
+
+    return {
+        "turns": args.turns,
+        "response_latency_ms": _quantiles(response),
+        "pipeline_overhead_ms": _quantiles(overhead),
+    }
+
+
+async def _measure_interruptions(args: argparse.Namespace) -> dict:
+    fake_stt, fake_llm, fake_tts = _providers(args)
+    audio_input, audio_output = FakeAudioInput(), FakeAudioOutput(realtime=True)
+    handling = []
+    async with _session(fake_stt, fake_llm, fake_tts) as session:
+        session.input.audio = audio_input
+        session.output.audio = audio_output
+        await session.start(Assistant())
+
+        for _ in range(args.interruptions):
+            responses = len(audio_output.first_frame_times)
+            clears = len(audio_output.clear_times)
+            await audio_input.push_frames(speech_frames(args.speech_duration))
+            await _silence_until(
+                audio_input,
+                lambda n=responses: len(audio_output.first_frame_times) > n,
+            )
+            await audio_input.push_frames(silence_frames(args.interrupt_after))
+
+            interrupted_at = time.perf_counter()
+            await audio_input.push_frames(speech_frames(args.speech_duration))
+            await _silence_until(
+                audio_input, lambda n=clears: len(audio_output.clear_times) > n
+            )
+            handling.append(
+                audio_output.clear_times[clears]
+                - interrupted_at
+                - fake_stt.interim_delays[-1]
+            )
+
+            # let the agent answer the interruption before the next round
+            await _silence_until(
+                audio_input,
+                lambda n=responses: (
+                    len(audio_output.first_frame_times) > n + 1
+                    and session.agent_state == "listening"
+                ),
+            )
+
+        audio_input.close()
+
+    return {
+        "interruptions": args.interruptions,
+        "interruption_handling_ms": _quantiles(handling),
+    }
+
+
+async def _measure_throughput(args: argparse.Namespace) -> dict:
+    fake_stt = FakeSTT(TRANSCRIPTS, latency=0.0)
+    fake_llm = FakeLLM(RESPONSES, ttft=0.0, token_interval=0.0)
+    fake_tts = FakeTTS(ttfb=0.0)
+    async with _session(fake_stt, fake_llm, fake_tts) as session:
+        session.output.audio = FakeAudioOutput(realtime=False)
+        await session.start(Assistant())
+
+        started_at = time.perf_counter()
+        for turn in range(args.throughput_turns):
+            await session.run(user_input=TRANSCRIPTS[turn % len(TRANSCRIPTS)])
+        elapsed = time.perf_counter() - started_at
+
+    return {
+        "throughput_turns": args.throughput_turns,
+        "turns_per_second": args.throughput_turns / elapsed,
+    }
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, float):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _compare(results: dict, baseline: dict) -> dict[str, float]:
+    """Relative change of every metric, in percent."""
+    current, previous = _flatten(results["metrics"]), _flatten(baseline["metrics"])
+    return {
+        key: (current[key] - previous[key]) / previous[key] * 100
+        for key in current
+        if previous.get(key)
+    }
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    metrics: dict = {}
+    metrics.update(await _measure_turns(args))
+    metrics.update(await _measure_interruptions(args))
+    metrics.update(await _measure_throughput(args))
+    return {
+        "commit": _commit(),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline")
+        },
+        "metrics": metrics,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--interruptions", type=int, default=5)
+    parser.add_argument("--throughput-turns", type=int, default=50)
+    parser.add_argument("--stt-latency", type=float, default=0.1)
+    parser.add_argument("--llm-ttft", type=float, default=0.2)
+    parser.add_argument("--llm-token-interval", type=float, default=0.01)
+    parser.add_argument("--tts-ttfb", type=float, default=0.15)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--speech-duration", type=float, default=0.6)
+    parser.add_argument("--interrupt-after", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of a previous run to compare to")
+    args = parser.parse_args()
+
+    results = asyncio.run(_run(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["change_percent"] = _compare(results, json.load(f))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Resample operations per second of audio of a session, by participant kind.
+
+The audio of a call goes through the stages of a session: the user's speech
+from the decoded track (48kHz) through the room input to the VAD and the STT,
+and the agent's speech from the TTS through the room output to the published
+track (48kHz). The rates of the stages are either the defaults of the plugins
+and the room (`fixed`: room input and output at 24kHz, the VAD and Deepgram at
+16kHz, the TTS at 24kHz) or the ones `negotiate` chooses for the kind of
+participant. For each it reports, per second of audio in each direction:
+
+- the resample operations (a call of `AudioResampler.push`) of every stage, the
+  ones of the audio stream and source of the room, done natively by the SDK,
+  are run with the same resampler here
+- the samples resampled, the work of these operations
+
+    uv run python benchmarks/resample_ops.py --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+from collections import Counter
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS
+
+from audio_format import AudioFormat, negotiate, vad_at
+from fakes import FakeRecognizeStream, FakeSTT
+from shared_models import load_vad
+
+TRACK_SAMPLE_RATE = 48000
+FIXED = {"input": 24000, "stt": 16000, "vad": 16000, "tts": 24000, "output": 24000}
+
+
+class _Counts:
+    """Resample operations and samples, by stage."""
+
+    def __init__(self) -> None:
+        self.stage = ""
+        self.ops: Counter[str] = Counter()
+        self.samples: Counter[str] = Counter()
+
+    def install(self) -> None:
+        push = rtc.AudioResampler.push
+
+        def _push(resampler, data):
+            self.ops[self.stage] += 1
+            self.samples[self.stage] += len(data.data)
+            return push(resampler, data)
+
+        rtc.AudioResampler.push = _push
+
+
+def _frames(duration: float, sample_rate: int) -> list[rtc.AudioFrame]:
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    samples = (np.sin(2 * np.pi * 220 * t) * 8000 * (t % 2.0 < 1.0)).astype(np.int16)
+    size = sample_rate // 50
+    return [
+        rtc.AudioFrame(samples[i : i + size].tobytes(), sample_rate, 1, size)
+        for i in range(0, len(samples) - size + 1, size)
+    ]
+
+
+def _resample(
+    counts: _Counts, stage: str, frames: list[rtc.AudioFrame], rate: int
+) -> list[rtc.AudioFrame]:
+    if frames[0].sample_rate == rate:
+        return frames
+    counts.stage = stage
+    resampler = rtc.AudioResampler(frames[0].sample_rate, rate)
+    return [out for frame in frames for out in resampler.push(frame)]
+
+
+async def _session(rates: dict[str, int], duration: float, counts: _Counts) -> None:
+    # way in: the audio stream of the room, then the STT and the VAD
+    frames = _resample(
+        counts, "room_input", _frames(duration, TRACK_SAMPLE_RATE), rates["input"]
+    )
+    stt_stream = FakeRecognizeStream(
+        stt=FakeSTT(["hello"]),
+        conn_options=DEFAULT_API_CONNECT_OPTIONS,
+        sample_rate=rates["stt"],
+    )
+    vad_stream = vad_at(load_vad(), rates["vad"]).stream()
+
+    async def _drain(stream) -> None:
+        async for _ in stream:
+            pass
+
+    drain_tasks = [asyncio.create_task(_drain(s)) for s in (stt_stream, vad_stream)]
+    for frame in frames:
+        counts.stage = "stt"
+        stt_stream.push_frame(frame)
+        counts.stage = "vad"
+        vad_stream.push_frame(frame)
+        await asyncio.sleep(0)
+    stt_stream.end_input()
+    vad_stream.end_input()
+    await asyncio.gather(*drain_tasks)
+    await stt_stream.aclose()
+    await vad_stream.aclose()
+
+    # way out: the TTS played by the room output, then the audio source
+    frames = _resample(
+        counts, "agent_output", _frames(duration, rates["tts"]), rates["output"]
+    )
+    _resample(counts, "room_output", frames, TRACK_SAMPLE_RATE)
+
+
+def _rates(audio_format: AudioFormat) -> dict[str, int]:
+    return {
+        "input": audio_format.input_rate,
+        "stt": audio_format.input_rate,
+        "vad": audio_format.input_rate,
+        "tts": audio_format.output_rate,
+        "output": audio_format.output_rate,
+    }
+
+
+async def _run(duration: float) -> dict:
+    counts = _Counts()
+    counts.install()
+    results: dict[str, dict] = {}
+    for kind_name, kind in [
+        ("sip", rtc.ParticipantKind.PARTICIPANT_KIND_SIP),
+        ("webrtc", rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD),
+    ]:
+        for name, rates in [("fixed", FIXED), ("negotiated", _rates(negotiate(kind)))]:
+            counts.ops.clear()
+            counts.samples.clear()
+            await _session(rates, duration, counts)
+            results.setdefault(kind_name, {})[name] = {
+                "rates": rates,
+                "resample_ops_per_second": sum(counts.ops.values()) / duration,
+                "samples_resampled_per_second": sum(counts.samples.values()) / duration,
+                "ops_per_second_by_stage": {
+                    stage: ops / duration for stage, ops in counts.ops.items()
+                },
+            }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(_run(args.duration)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Shadow comparison of the local STT with Deepgram, on recorded audio.
+
+Every recording (16-bit mono WAV) is streamed in real time to both STTs at once,
+followed by a second of silence. For each STT the benchmark reports the delay of
+the first interim transcript from the start of the audio, the delay of the last
+final transcript from the end of the audio and the word error rate.
+
+The reference transcript of a recording is the `.txt` file next to it when there
+is one. Otherwise the transcript of Deepgram is the reference, and the word error
+rate of the local STT measures how much it disagrees with Deepgram.
+
+    uv run --extra local-stt python benchmarks/stt_shadow.py \\
+        --model vosk-model-small-en-us-0.15 recordings/*.wav
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import wave
+from pathlib import Path
+
+import aiohttp
+import numpy as np
+from dotenv import load_dotenv
+from livekit import rtc
+from livekit.agents import stt
+from livekit.plugins import deepgram
+
+from fakes import silence_frames
+from local_stt import LocalSTT, VoskRecognizer, word_error_rate
+from shared_models import load_vad
+
+load_dotenv(".env.local")
+
+
+def _read_frames(path: Path) -> list[rtc.AudioFrame]:
+    """The recording in 20ms frames."""
+    with wave.open(str(path)) as f:
+        if f.getsampwidth() != 2 or f.getnchannels() != 1:
+            raise SystemExit(f"{path}: expected 16-bit mono audio")
+        sample_rate = f.getframerate()
+        frames = []
+        while data := f.readframes(sample_rate // 50):
+            frames.append(rtc.AudioFrame(data, sample_rate, 1, len(data) // 2))
+    return frames
+
+
+async def _transcribe(
+    stream: stt.RecognizeStream, started_at: float, audio_end: asyncio.Future[float]
+) -> dict:
+    first_interim_at, final_at, transcript = None, None, []
+    async for ev in stream:
+        now = time.perf_counter()
+        if ev.type == stt.SpeechEventType.INTERIM_TRANSCRIPT:
+            first_interim_at = first_interim_at or now
+        elif ev.type == stt.SpeechEventType.FINAL_TRANSCRIPT and ev.alternatives:
+            first_interim_at = first_interim_at or now
+            final_at = now
+            transcript.append(ev.alternatives[0].text)
+
+    return {
+        "transcript": " ".join(transcript),
+        "first_interim": first_interim_at - started_at if first_interim_at else None,
+        "final": final_at - await audio_end if final_at else None,
+    }
+
+
+async def _shadow(stts: dict[str, stt.STT], path: Path, speed: float) -> dict:
+    frames = _read_frames(path)
+    streams = {name: stt_.stream() for name, stt_ in stts.items()}
+    audio_end = asyncio.get_running_loop().create_future()
+    started_at = time.perf_counter()
+    transcribe_tasks = {
+        name: asyncio.create_task(_transcribe(stream, started_at, audio_end))
+        for name, stream in streams.items()
+    }
+
+    # pushed in real time, the schedule doesn't drift with the pushes
+    pushed = 0.0
+    trailing_silence = silence_frames(1.0, sample_rate=frames[0].sample_rate)
+    for i, frame in enumerate([*frames, *trailing_silence]):
+        if i == len(frames):
+            audio_end.set_result(time.perf_counter())
+        for stream in streams.values():
+            stream.push_frame(frame)
+        pushed += frame.duration / speed
+        await asyncio.sleep(max(0.0, started_at + pushed - time.perf_counter()))
+    for stream in streams.values():
+        stream.end_input()
+
+    results = {name: await task for name, task in transcribe_tasks.items()}
+    for stream in streams.values():
+        await stream.aclose()
+
+    reference_path = path.with_suffix(".txt")
+    reference = (
+        reference_path.read_text()
+        if reference_path.exists()
+        else results["deepgram"]["transcript"]
+    )
+    for name, result in results.items():
+        if reference_path.exists() or name != "deepgram":
+            result["word_error_rate"] = word_error_rate(reference, result["transcript"])
+    return {"recording": str(path), "reference": reference, **results}
+
+
+def _summary(runs: list[dict], name: str) -> dict:
+    def _mean(key: str) -> float | None:
+        values = [run[name][key] for run in runs if run[name].get(key) is not None]
+        return float(np.mean(values)) if values else None
+
+    return {
+        "first_interim": _mean("first_interim"),
+        "final": _mean("final"),
+        "word_error_rate": _mean("word_error_rate"),
+    }
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    local_stt = LocalSTT(VoskRecognizer.load(args.model), vad=load_vad())
+    async with aiohttp.ClientSession() as http_session:
+        stts = {
+            "deepgram": deepgram.STT(model="nova-2", http_session=http_session),
+            "local": local_stt,
+        }
+        runs = [await _shadow(stts, path, args.speed) for path in args.recordings]
+    await local_stt.aclose()
+    return {"runs": runs, "summary": {name: _summary(runs, name) for name in stts}}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recordings", type=Path, nargs="+")
+    parser.add_argument("--model", required=True, help="Vosk model directory")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="times real time to stream at"
+    )
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(_run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""First end-of-turn prediction latency, in the inference process or in the job process.
+
+The baseline (`ipc`) is the default of the agent server: the turn detector is
+loaded once in the inference process shared by the job processes, and every
+prediction is sent to it. The first prediction of a call runs after the process
+was initialized, like it is when the agent server starts. `in_process` is the first
+prediction of a call when the model was loaded in `prewarm` of the job process
+(`TURN_DETECTOR_PREWARM=1`).
+
+Requires the model files, run `uv run python src/agent.py download-files` first.
+
+    uv run python benchmarks/turn_detector_startup.py --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import time
+
+from livekit.agents import llm
+from livekit.agents.inference_runner import _InferenceRunner
+from livekit.agents.ipc.inference_proc_executor import InferenceProcExecutor
+from livekit.plugins.turn_detector.multilingual import _EUORunnerMultilingual
+
+from turn_detection import PrewarmedTurnDetector
+
+# sent like `EOUModelBase.predict_end_of_turn` sends it
+_REQUEST = json.dumps(
+    {
+        "chat_ctx": [
+            {"role": "assistant", "content": "Hello, how can I help you?"},
+            {"role": "user", "content": "Can you tell me the opening hours"},
+        ]
+    }
+).encode()
+
+
+def _chat_ctx() -> llm.ChatContext:
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(role="assistant", content="Hello, how can I help you?")
+    chat_ctx.add_message(role="user", content="Can you tell me the opening hours")
+    return chat_ctx
+
+
+async def _ipc_predictions(runs: int) -> tuple[float, list[float]]:
+    # started like the agent server starts it
+    executor = InferenceProcExecutor(
+        runners=_InferenceRunner.registered_runners,
+        initialize_timeout=5 * 60,
+        close_timeout=5,
+        memory_warn_mb=2000,
+        memory_limit_mb=0,
+        ping_interval=5,
+        ping_timeout=60,
+        high_ping_threshold=2.5,
+        mp_ctx=multiprocessing.get_context("spawn"),
+        loop=asyncio.get_running_loop(),
+        http_proxy=None,
+    )
+    started_at = time.perf_counter()
+    await executor.start()
+    await executor.initialize()
+    startup = time.perf_counter() - started_at
+
+    predictions = []
+    try:
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            await executor.do_inference(
+                _EUORunnerMultilingual.INFERENCE_METHOD, _REQUEST
+            )
+            predictions.append(time.perf_counter() - started_at)
+    finally:
+        await executor.aclose()
+    return startup, predictions
+
+
+async def _in_process_first_prediction(detector: PrewarmedTurnDetector) -> float:
+    model = detector.model()
+    started_at = time.perf_counter()
+    await model.predict_end_of_turn(_chat_ctx())
+    return time.perf_counter() - started_at
+
+
+async def _run(runs: int) -> dict:
+    startup, ipc = await _ipc_predictions(runs)
+
+    started_at = time.perf_counter()
+    detector = PrewarmedTurnDetector.load()
+    prewarm = time.perf_counter() - started_at
+    in_process = [await _in_process_first_prediction(detector) for _ in range(runs)]
+
+    return {
+        "runs": runs,
+        "ipc_startup_ms": startup * 1000,
+        "ipc_first_prediction_ms": ipc[0] * 1000,
+        "ipc_prediction_ms": statistics.median(ipc) * 1000,
+        "in_process_prewarm_ms": prewarm * 1000,
+        "in_process_first_prediction_ms": statistics.median(in_process) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(_run(args.runs)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""CPU per end-of-turn prediction, with and without the token cache of the session.
+
+Replays a conversation whose user messages are transcribed word by word, asking
+for a prediction at every interim transcript like the turn detection of a call.
+Every prediction runs on the runner of the plugin, which formats and tokenizes
+the whole conversation each time, and on `CachedEOURunner` with the tokens of
+the session kept from one call to the next. For each of them it reports the CPU
+time per prediction, and the part of it spent before the inference (formatting
+and tokenization).
+
+Requires the model files, run `uv run python src/agent.py download-files` first.
+
+    uv run python benchmarks/turn_detector_tokens.py --turns 6
+"""
+
+import argparse
+import json
+import time
+from collections.abc import Callable, Iterator
+
+from livekit.plugins.turn_detector.multilingual import _EUORunnerMultilingual
+
+from turn_detection import CachedEOURunner
+
+USER_MESSAGES = [
+    "Hi I'd like to know your opening hours on weekends please",
+    "And do I need to book a table in advance for a group of six",
+    "Great can I book one for Saturday evening around eight",
+]
+ASSISTANT_MESSAGES = [
+    "We're open from ten to ten on Saturdays and from ten to six on Sundays.",
+    "For six people we recommend booking, weekends are busy.",
+    "Done, your table for six is booked on Saturday at eight.",
+]
+
+
+def _requests(turns: int, session_id: str | None) -> Iterator[bytes]:
+    """The request of every interim transcript of the conversation."""
+    chat_ctx: list[dict[str, str]] = []
+    for turn in range(turns):
+        words = USER_MESSAGES[turn % len(USER_MESSAGES)].split()
+        for i in range(1, len(words) + 1):
+            interim = {"role": "user", "content": " ".join(words[:i])}
+            request = {"chat_ctx": [*chat_ctx, interim][-6:]}
+            if session_id:
+                request["session_id"] = session_id
+            yield json.dumps(request).encode()
+
+        chat_ctx.append(interim)
+        chat_ctx.append(
+            {
+                "role": "assistant",
+                "content": ASSISTANT_MESSAGES[turn % len(ASSISTANT_MESSAGES)],
+            }
+        )
+
+
+def _cpu_per_call(fnc: Callable[[bytes], object], requests: list[bytes]) -> float:
+    started_at = time.process_time()
+    for data in requests:
+        fnc(data)
+    return (time.process_time() - started_at) / len(requests) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    plugin_runner = _EUORunnerMultilingual()
+    plugin_runner.initialize()
+    runner = CachedEOURunner()
+    runner.initialize()
+
+    def _plugin_preparation(data: bytes) -> None:
+        text = plugin_runner._format_chat_ctx(json.loads(data)["chat_ctx"])
+        plugin_runner._tokenizer(text, add_special_tokens=False, return_tensors="np")
+
+    # warm the caches of the tokenizer and the buffers of the ONNX session
+    for data in _requests(1, "warmup"):
+        plugin_runner.run(data)
+        runner.run(data)
+
+    results: dict[str, dict[str, float]] = {"plugin": {}, "session_cache": {}}
+    for repeat in range(args.repeat):
+        plain = list(_requests(args.turns, None))
+        cached = list(_requests(args.turns, f"session-{repeat}"))
+        for name, key, fnc, requests in [
+            ("plugin", "cpu_ms_per_call", plugin_runner.run, plain),
+            ("plugin", "preparation_ms_per_call", _plugin_preparation, plain),
+            ("session_cache", "cpu_ms_per_call", runner.run, cached),
+            ("session_cache", "preparation_ms_per_call", runner._prepare, cached),
+        ]:
+            results[name].setdefault(key, 0.0)
+            results[name][key] += _cpu_per_call(fnc, requests) / args.repeat
+
+    print(json.dumps({"calls": len(plain), **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import collections
+import logging
+from typing import Protocol
+
+import numpy as np
+from livekit import rtc
+
+from frame_buffer import CHUNK_DURATION, chunk_views
+
+logger = logging.getLogger("agent")
+# the percentiles of the levels cost more than measuring them, they're only
+# updated this often
+_UPDATE_INTERVAL = 0.25
+
+
+class FrameCanceller(Protocol):
+    """Noise cancellation applied to the frames of an audio input, one at a time."""
+
+    def process(self, frame: rtc.AudioFrame) -> rtc.AudioFrame: ...
+
+
+class WebRTCNoiseSuppression:
+    """Noise suppression and high-pass filter of the WebRTC audio processing module.
+
+    Runs in the job process on frames of any multiple of 10ms, in place: the
+    samples of the frame are processed through views of its chunks, without
+    copying them.
+    """
+
+    def __init__(self) -> None:
+        self._apm = rtc.AudioProcessingModule(
+            noise_suppression=True, high_pass_filter=True
+        )
+
+    def process(self, frame: rtc.AudioFrame) -> rtc.AudioFrame:
+        for chunk in chunk_views(frame):
+            self._apm.process_stream(chunk)
+        return frame
+
+
+class SNREstimator:
+    """Signal-to-noise ratio of an audio input over the last `window` seconds.
+
+    The level of every 10ms of audio is kept: the noise floor is a low percentile
+    of the levels (the pauses of the speaker) and the signal a high one (their
+    speech). Input with only noise has no gap between the two, so a low ratio.
+    """
+
+    def __init__(self, *, window: float = 3.0, min_duration: float = 1.0) -> None:
+        self._levels: collections.deque[float] = collections.deque(
+            maxlen=round(window / CHUNK_DURATION)
+        )
+        self._min_chunks = round(min_duration / CHUNK_DURATION)
+        self._snr: float | None = None
+        self._new_chunks = 0
+        # squared samples of the last frame, reused from one frame to the next
+        self._squares = np.empty(0, dtype=np.float32)
+
+    def update(self, frame: rtc.AudioFrame) -> None:
+        samples = np.frombuffer(frame.data, dtype=np.int16)
+        if len(self._squares) != len(samples):
+            self._squares = np.empty(len(samples), dtype=np.float32)
+        np.square(samples, out=self._squares, dtype=np.float32)
+        chunk_size = int(frame.sample_rate * CHUNK_DURATION) * frame.num_channels
+        chunks = self._squares[: len(samples) // chunk_size * chunk_size].reshape(
+            -1, chunk_size
+        )
+        self._levels.extend(10 * np.log10(np.mean(chunks, axis=1) + 1.0))
+        self._new_chunks += len(chunks)
+        if len(self._levels) >= self._min_chunks and (
+            self._snr is None or self._new_chunks * CHUNK_DURATION >= _UPDATE_INTERVAL
+        ):
+            noise, signal = np.percentile(self._levels, [10, 95])
+            self._snr = float(signal - noise)
+            self._new_chunks = 0
+
+    @property
+    def snr(self) -> float | None:
+        """Ratio in dB, None until `min_duration` seconds were measured."""
+        return self._snr
+
+
+class AdaptiveNoiseCancellation(rtc.FrameProcessor[rtc.AudioFrame]):
+    """Applies noise cancellation to the audio of a participant only when it's noisy.
+
+    The SNR of the input is measured before the cancellation. The cancellation is
+    switched off once the SNR rises above `disable_above` dB and back on once it
+    falls below `enable_below` dB, the gap between the two keeps it from flapping
+    on input close to a threshold. It's on until the SNR is known.
+
+    The noise is cancelled in place, in the frame of the audio stream: every
+    frame is its own, so the VAD, the STT and the recording of the session get it
+    without any copy, and can keep it as long as they need.
+    """
+
+    def __init__(
+        self,
+        canceller: FrameCanceller,
+        *,
+        enable_below: float = 15.0,
+        disable_above: float = 25.0,
+        window: float = 3.0,
+    ) -> None:
+        if enable_below > disable_above:
+            raise ValueError("enable_below must not be above disable_above")
+
+        self._canceller = canceller
+        self._enable_below = enable_below
+        self._disable_above = disable_above
+        self._estimator = SNREstimator(window=window)
+        self._enabled = True
+        self._participant_identity = ""
+        self.active = True
+        self.switches = 0
+        # seconds of audio processed with and without the cancellation
+        self.cancelled_duration = 0.0
+        self.bypassed_duration = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value: bool) -> None:
+        self._enabled = value
+
+    @property
+    def snr(self) -> float | None:
+        return self._estimator.snr
+
+    def _on_stream_info_updated(
+        self, *, room_name: str, participant_identity: str, publication_sid: str
+    ) -> None:
+        self._participant_identity = participant_identity
+
+    def _process(self, frame: rtc.AudioFrame) -> rtc.AudioFrame:
+        self._estimator.update(frame)
+        snr = self._estimator.snr
+        if snr is not None:
+            active = (
+                snr < self._disable_above if self.active else snr < self._enable_below
+            )
+            if active != self.active:
+                self.active = active
+                self.switches += 1
+                logger.debug(
+                    "noise cancellation %s",
+                    "enabled" if active else "disabled",
+                    extra={"participant": self._participant_identity, "snr": snr},
+                )
+
+        if not self.active:
+            self.bypassed_duration += frame.duration
+            return frame
+
+        self.cancelled_duration += frame.duration
+        return self._canceller.process(frame)
+
+    def _close(self) -> None:
+        logger.debug(
+            "adaptive noise cancellation closed",
+            extra={
+                "participant": self._participant_identity,
+                "cancelled_duration": self.cancelled_duration,
+                "bypassed_duration": self.bypassed_duration,
+                "switches": self.switches,
+            },
+        )
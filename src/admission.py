@@ -0,0 +1,173 @@
+import asyncio
+import atexit
+import collections
+import contextlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from livekit.agents import AgentServer, utils
+from livekit.agents.utils.hw import CPUMonitor, get_cpu_monitor
+
+from shared_models import shared_memory_dir
+
+logger = logging.getLogger("agent")
+
+# Environment variable used to hand the load report directory from the agent
+# server to its job processes
+LOAD_REPORT_DIR_ENV = "AGENT_LOAD_REPORT_DIR"
+
+# reports older than this are from processes that died without cleaning up
+_STALE_REPORT_AGE = 10.0
+
+
+def publish_load_report_dir(directory: Path | str | None = None) -> Path:
+    """Create the directory where job processes report their load.
+
+    Must be called in the parent process before any job process is started.
+    """
+    path = Path(
+        tempfile.mkdtemp(prefix="agent-load-", dir=directory or shared_memory_dir())
+    )
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    os.environ[LOAD_REPORT_DIR_ENV] = str(path)
+    return path
+
+
+class LoadReporter:
+    """Reports the event loop lag and inference calls in flight of a job process.
+
+    The lag is how late the event loop wakes up a task sleeping for `interval`,
+    the report holds the worst lag of the last `window` seconds so the agent server
+    doesn't miss a spike between two load updates. Reports are small JSON files
+    rewritten in the directory published by `publish_load_report_dir`.
+    """
+
+    def __init__(
+        self,
+        directory: Path | str,
+        *,
+        in_flight: Callable[[], int] = lambda: 0,
+        interval: float = 0.25,
+        window: float = 3.0,
+    ) -> None:
+        self._path = Path(directory) / f"{os.getpid()}.json"
+        self._in_flight = in_flight
+        self._interval = interval
+        self._lags: collections.deque[float] = collections.deque(
+            maxlen=max(1, round(window / interval))
+        )
+        self._task: asyncio.Task[None] | None = None
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "LoadReporter | None":
+        directory = os.getenv(LOAD_REPORT_DIR_ENV)
+        if not directory or not Path(directory).is_dir():
+            return None
+        return cls(directory, **kwargs)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self._interval)
+            self._lags.append(
+                max(0.0, time.perf_counter() - started_at - self._interval)
+            )
+            try:
+                self._write()
+            except OSError as e:
+                logger.debug("failed to write load report", exc_info=e)
+
+    def _write(self) -> None:
+        report = {
+            "event_loop_lag": max(self._lags),
+            "in_flight": self._in_flight(),
+            "updated_at": time.time(),
+        }
+        tmp_path = self._path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(report))
+        os.replace(tmp_path, self._path)
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            await utils.aio.cancel_and_wait(self._task)
+            self._task = None
+
+        with contextlib.suppress(FileNotFoundError):
+            self._path.unlink()
+
+
+class AdaptiveLoad:
+    """Load function of the agent server combining CPU, event loop lag and inference.
+
+    Each signal is scaled to [0, 1], with the event loop lag relative to `max_lag`
+    and the inference calls in flight (summed over the job processes) relative to
+    `max_in_flight`. The reported load is the highest of them, so the server stops
+    accepting jobs once any of them crosses its `load_threshold`, before the rooms
+    it already hosts start to stutter.
+    """
+
+    def __init__(
+        self,
+        directory: Path | str | None = None,
+        *,
+        max_lag: float = 0.1,
+        max_in_flight: int | None = None,
+        cpu_monitor: CPUMonitor | None = None,
+    ) -> None:
+        self._directory = directory
+        self._max_lag = max_lag
+        self._cpu_monitor = cpu_monitor or get_cpu_monitor()
+        self._max_in_flight = max_in_flight or max(
+            1, round(self._cpu_monitor.cpu_count())
+        )
+        self._cpu_avg = utils.MovingAverage(3)
+        self._lock = threading.Lock()
+
+    def _reports(self) -> list[dict]:
+        directory = self._directory or os.getenv(LOAD_REPORT_DIR_ENV)
+        if not directory:
+            return []
+
+        reports = []
+        now = time.time()
+        for path in Path(directory).glob("*.json"):
+            try:
+                report = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if now - report.get("updated_at", 0) < _STALE_REPORT_AGE:
+                reports.append(report)
+        return reports
+
+    def __call__(self, server: AgentServer | None = None) -> float:
+        # called from a thread of the agent server, every few seconds
+        cpu = self._cpu_monitor.cpu_percent(interval=0.5)
+        with self._lock:
+            self._cpu_avg.add_sample(cpu)
+            cpu = self._cpu_avg.get_avg()
+
+        reports = self._reports()
+        lag = max((r["event_loop_lag"] for r in reports), default=0.0)
+        in_flight = sum(r["in_flight"] for r in reports)
+
+        load = max(cpu, lag / self._max_lag, in_flight / self._max_in_flight)
+        logger.debug(
+            "worker load",
+            extra={
+                "cpu": round(cpu, 3),
+                "event_loop_lag": round(lag, 4),
+                "in_flight": in_flight,
+                "load": round(load, 3),
+            },
+        )
+        return min(load, 1.0)
@@ -1,35 +1,252 @@
+import asyncio
+import functools
 import logging
+import math
+import os
+import sys
+from collections.abc import AsyncIterable
+from datetime import datetime, timezone
+from pathlib import Path
 
+import aiohttp
 from dotenv import load_dotenv
 from livekit import rtc
 from livekit.agents import (
+    NOT_GIVEN,
     Agent,
     AgentServer,
     AgentSession,
     JobContext,
     JobProcess,
+    ModelSettings,
+    Plugin,
     cli,
     inference,
+    llm,
     room_io,
+    tokenize,
 )
-from livekit.plugins import noise_cancellation, silero, deepgram, openai, cartesia
+from livekit.agents import stt as agents_stt
+from livekit.agents import tts as agents_tts
+from livekit.agents.inference import tts as inference_tts
+from livekit.agents.voice.room_io.types import NoiseCancellationParams
+from livekit.agents.worker import ServerEnvOption
+from livekit.plugins import deepgram, noise_cancellation, openai
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
+import loadtest
+from adaptive_nc import AdaptiveNoiseCancellation, WebRTCNoiseSuppression
+from admission import AdaptiveLoad, LoadReporter, publish_load_report_dir
+from audio_format import OUTPUT_SAMPLE_RATES
+from circuit_breaker import (
+    CIRCUIT_DIR_ENV,
+    ProviderHealth,
+    failover_llm,
+    failover_stt,
+    failover_tts,
+    publish_circuit_dir,
+)
+from context_compaction import ContextCompactor
+from hedging import HedgedLLM, HedgingStats
+from latency import LatencyCollector
+from local_stt import LocalSTT, VoskRecognizer
+from local_tts import LocalTTS, PiperVoice
+from phrase_cache import PhraseCache, PhraseCachePlugin
+from pipeline_config import PipelineConfig, PipelineConfigFile
+from prompt_layout import PromptCacheStats, PromptLayout, canonicalize
+from provider_clients import ProviderClients
+from response_cache import ResponseCache, ResponseCacheNodes, openai_embedder
+from session_profile import WEBRTC_PROFILE, job_participant_kind, profile_for
+from shared_models import load_vad, publish_vad_model
+from speculation import SpeculativeTTS
+from tts_chunking import AdaptiveChunker
+from turn_detection import load_turn_detector
+
 logger = logging.getLogger("agent")
-import os
 
 load_dotenv(".env.local")
 
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+DEEPGRAM_URL = "https://api.deepgram.com/v1/listen"
+# Gateway of the LiveKit Inference TTS (Cartesia) and the fallback models
+INFERENCE_URL = os.getenv("LIVEKIT_INFERENCE_URL", inference_tts.DEFAULT_BASE_URL)
+
+# Models, voice and turn settings of the sessions, reloaded by every job process
+# when the file changes, see `PipelineConfigFile`
+PIPELINE_CONFIG = os.getenv(
+    "PIPELINE_CONFIG", str(Path(__file__).parent / "pipeline.toml")
+)
+pipeline_config = PipelineConfigFile(PIPELINE_CONFIG)
+
+# Audio of the fixed phrases (greetings, fillers, ...) is synthesized once by the
+# `download-files` command and streamed from disk in every call
+PHRASE_CACHE_DIR = os.getenv("PHRASE_CACHE_DIR")
+PHRASES_PATH = os.getenv(
+    "PHRASE_CACHE_PHRASES", str(Path(__file__).parent / "phrases.txt")
+)
+
+# OpenAI compatible endpoint the LLM requests are sent to when Groq is slow to
+# answer, see `HedgedLLM`
+LLM_HEDGE_BASE_URL = os.getenv("LLM_HEDGE_BASE_URL")
+
+# LiveKit Inference models the turns move to while the circuit of Deepgram, Groq or
+# Cartesia is open, see `CircuitBreaker`
+STT_FALLBACK_MODEL = os.getenv("STT_FALLBACK_MODEL")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL")
+TTS_FALLBACK_MODEL = os.getenv("TTS_FALLBACK_MODEL")
+
+# Vosk model recognizing the user on the CPU of the host when Deepgram is degraded,
+# or in every call with LOCAL_STT=force
+LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL")
+LOCAL_STT = os.getenv("LOCAL_STT", "fallback")
+
+# Piper voice synthesized on the CPU of the host when Cartesia is degraded, or for
+# every reply with LOCAL_TTS=force
+LOCAL_TTS_MODEL = os.getenv("LOCAL_TTS_MODEL")
+LOCAL_TTS = os.getenv("LOCAL_TTS", "fallback")
+
+# SIP callers get the telephony profile of the pipeline (narrowband STT and TTS,
+# VAD and endpointing tuned for calls), or the WebRTC one with SIP_PROFILE=0
+SIP_PROFILE = os.getenv("SIP_PROFILE", "1") != "0"
+# The kind of participant is decided before joining the room, from the job when it
+# was dispatched for a participant. Set SIP_ROOM_PREFIX to the room prefix of the
+# SIP dispatch rule to also recognize the calls of jobs without a participant
+SIP_ROOM_PREFIX = os.getenv("SIP_ROOM_PREFIX")
+
+# With NOISE_CANCELLATION=adaptive, noise is only suppressed from the audio of the
+# participants while it's noisy, see `AdaptiveNoiseCancellation`. It's experimental
+# until its word error rate is measured against BVC on recorded calls (see
+# benchmarks/noise_cancellation_corpus.py), and also needs
+# NOISE_CANCELLATION_EXPERIMENTAL=1
+NOISE_CANCELLATION = os.getenv("NOISE_CANCELLATION", "bvc")
+if (
+    NOISE_CANCELLATION == "adaptive"
+    and os.getenv("NOISE_CANCELLATION_EXPERIMENTAL") != "1"
+):
+    logger.warning(
+        "adaptive noise cancellation is experimental, set "
+        "NOISE_CANCELLATION_EXPERIMENTAL=1 to use it, using BVC instead"
+    )
+    NOISE_CANCELLATION = "bvc"
+
+# The LLM is only told the current time by default. With CALL_CONTEXT_CALLER_NUMBER=1
+# it's also sent the phone number of SIP callers, which then reaches the provider.
+# The response cache skips the turns sent with a call context, CALL_CONTEXT_TIME=0
+# leaves the time out
+CALL_CONTEXT_TIME = os.getenv("CALL_CONTEXT_TIME", "1") != "0"
+CALL_CONTEXT_CALLER_NUMBER = os.getenv("CALL_CONTEXT_CALLER_NUMBER") == "1"
+
 
 class Assistant(Agent):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        *,
+        response_cache: ResponseCacheNodes | None = None,
+        phrase_cache: PhraseCache | None = None,
+        speculation: SpeculativeTTS | None = None,
+        chunker: AdaptiveChunker | None = None,
+        compactor: ContextCompactor | None = None,
+        prompt_layout: PromptLayout | None = None,
+    ) -> None:
         super().__init__(
-            instructions="""You are a helpful voice AI assistant. The user is interacting with you via voice, even if you perceive the conversation as text.
+            instructions=canonicalize(
+                """You are a helpful voice AI assistant. The user is interacting with you via voice, even if you perceive the conversation as text.
             You eagerly assist users with their questions by providing information from your extensive knowledge.
             Your responses are concise, to the point, and without any complex formatting or punctuation including emojis, asterisks, or other symbols.
-            You are curious, friendly, and have a sense of humor.""",
+            You are curious, friendly, and have a sense of humor."""
+            ),
+        )
+        self._response_cache = response_cache
+        self._phrase_cache = phrase_cache
+        self._speculation = speculation
+        self._chunker = chunker
+        self._compactor = compactor
+        self._prompt_layout = prompt_layout
+
+    async def on_user_turn_completed(
+        self, turn_ctx: llm.ChatContext, new_message: llm.ChatMessage
+    ) -> None:
+        if self._speculation is not None:
+            self._speculation.turn_committed()
+
+    def llm_node(
+        self,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool],
+        model_settings: ModelSettings,
+    ):
+        # Send the last turns and a summary of the older ones
+        if self._compactor is not None:
+            chat_ctx = self._compactor.compact(chat_ctx)
+
+        # Keep the prompt prefix identical across requests for the provider cache
+        request_ctx = chat_ctx
+        if self._prompt_layout is not None:
+            request_ctx, tools = self._prompt_layout.layout(chat_ctx, tools)
+
+        llm_stream = Agent.default.llm_node(self, request_ctx, tools, model_settings)
+        # Answer repeated questions from the cache, without calling the LLM. The
+        # replies to requests sent with a call context may depend on it
+        if self._response_cache is not None:
+            return self._response_cache.llm_node(
+                self.instructions,
+                chat_ctx,
+                llm_stream,
+                cacheable=not (
+                    self._prompt_layout and self._prompt_layout.volatile_context
+                ),
+            )
+        return llm_stream
+
+    def _tts_stream(self) -> agents_tts.SynthesizeStream:
+        # The stream Agent.default.tts_node synthesizes in
+        activity = self._get_activity_or_raise()
+        assert activity.tts is not None
+        wrapped_tts = activity.tts
+        if not wrapped_tts.capabilities.streaming:
+            wrapped_tts = agents_tts.StreamAdapter(
+                tts=wrapped_tts,
+                sentence_tokenizer=tokenize.blingfire.SentenceTokenizer(
+                    retain_format=True
+                ),
+            )
+        return wrapped_tts.stream(
+            conn_options=activity.session.conn_options.tts_conn_options
         )
 
+    def tts_node(self, text: AsyncIterable[str], model_settings: ModelSettings):
+        def _synthesize(text: AsyncIterable[str]) -> AsyncIterable[rtc.AudioFrame]:
+            return Agent.default.tts_node(self, text, model_settings)
+
+        def _chunked(text: AsyncIterable[str]) -> AsyncIterable[rtc.AudioFrame]:
+            # Start speaking after the first clause instead of the first sentence
+            if self._chunker is not None:
+                # the fallback adapter ends the stream of its TTS on a flush
+                return self._chunker.tts_node(
+                    text,
+                    self._tts_stream,
+                    flush=not isinstance(self.session.tts, agents_tts.FallbackAdapter),
+                )
+            return _synthesize(text)
+
+        def _phrases(text: AsyncIterable[str]) -> AsyncIterable[rtc.AudioFrame]:
+            # Stream the phrase a reply starts with from the phrase cache, it sees
+            # the reply before it's split into chunks
+            if self._phrase_cache is not None:
+                return self._phrase_cache.tts_node(text, _chunked)
+            return _chunked(text)
+
+        def _cached(text: AsyncIterable[str]) -> AsyncIterable[rtc.AudioFrame]:
+            # Replay the audio of cached responses instead of synthesizing it again
+            if self._response_cache is not None:
+                return self._response_cache.tts_node(text, _phrases)
+            return _phrases(text)
+
+        # Bound what is synthesized before the end of the user turn is confirmed
+        if self._speculation is not None:
+            return self._speculation.tts_node(text, _cached)
+        return _cached(text)
+
     # To add tools, use the @function_tool decorator.
     # Here's an example that adds a simple weather tool.
     # You also have to add `from livekit.agents import function_tool, RunContext` to the top of this file
@@ -48,11 +265,185 @@ class Assistant(Agent):
     #     return "sunny with a temperature of 70 degrees."
 
 
-server = AgentServer()
+def _build_tts(
+    http_session: aiohttp.ClientSession,
+    *,
+    sample_rate: int = 24000,
+    config: PipelineConfig | None = None,
+) -> inference.TTS:
+    config = config or pipeline_config.current()
+    return inference.TTS(
+        model=config.tts_model,
+        voice=config.tts_voice,
+        sample_rate=sample_rate,
+        http_session=http_session,
+    )
+
+
+def _build_llm(
+    providers: ProviderClients,
+    config: PipelineConfig,
+    hedging_stats: HedgingStats | None = None,
+) -> llm.LLM:
+    groq = openai.LLM(
+        model=config.llm_model,
+        client=providers.openai_client(
+            base_url=GROQ_BASE_URL, api_key=os.getenv("GROQ_API_KEY")
+        ),
+    )
+    if not LLM_HEDGE_BASE_URL:
+        return groq
+
+    return HedgedLLM(
+        groq,
+        openai.LLM(
+            model=os.getenv("LLM_HEDGE_MODEL", config.llm_model),
+            client=providers.openai_client(
+                base_url=LLM_HEDGE_BASE_URL, api_key=os.getenv("LLM_HEDGE_API_KEY")
+            ),
+        ),
+        quantile=float(os.getenv("LLM_HEDGE_QUANTILE", 0.95)),
+        stats=hedging_stats,
+    )
+
+
+def _noise_cancellation(
+    params: NoiseCancellationParams,
+    *,
+    participant_kind: rtc.ParticipantKind.ValueType,
+) -> rtc.NoiseCancellationOptions | rtc.FrameProcessor[rtc.AudioFrame]:
+    if NOISE_CANCELLATION == "adaptive":
+        # BVC runs in the native audio stream for the whole track, the WebRTC
+        # noise suppression can be bypassed frame by frame
+        return AdaptiveNoiseCancellation(
+            WebRTCNoiseSuppression(),
+            enable_below=float(os.getenv("NOISE_CANCELLATION_ENABLE_SNR", 15.0)),
+            disable_above=float(os.getenv("NOISE_CANCELLATION_DISABLE_SNR", 25.0)),
+        )
+    # the kind the profile of the session was chosen for
+    if participant_kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP:
+        return noise_cancellation.BVCTelephony()
+    return noise_cancellation.BVC()
+
+
+def _phrase_cache(
+    tts: inference.TTS, config: PipelineConfig | None = None
+) -> PhraseCache:
+    assert PHRASE_CACHE_DIR is not None
+    config = config or pipeline_config.current()
+    return PhraseCache(
+        PHRASE_CACHE_DIR,
+        model=config.tts_model,
+        voice=config.tts_voice,
+        sample_rate=tts.sample_rate,
+        num_channels=tts.num_channels,
+    )
+
+
+if PHRASE_CACHE_DIR:
+    # the phrases are synthesized at every rate a session can play them at
+    for output_rate in OUTPUT_SAMPLE_RATES:
+        Plugin.register_plugin(
+            PhraseCachePlugin(
+                tts_factory=functools.partial(_build_tts, sample_rate=output_rate),
+                cache_factory=_phrase_cache,
+                phrases_path=PHRASES_PATH,
+            )
+        )
+
+
+# Expose the Prometheus metrics of the agent server and its job processes (turn
+# latencies included) on :PROMETHEUS_PORT/metrics
+prometheus_port = os.getenv("PROMETHEUS_PORT")
+# Stop accepting jobs once the CPU, the event loop lag of the job processes or the
+# turn detector backlog gets close to saturation, see `AdaptiveLoad`
+adaptive_load = os.getenv("ADAPTIVE_LOAD", "1") != "0"
+# With TURN_DETECTOR_PREWARM=1, every job process loads a copy of the turn detector
+# in `prewarm` instead of using the inference process shared by the agent server
+turn_detector_prewarm = os.getenv("TURN_DETECTOR_PREWARM", "0") == "1"
+server = AgentServer(
+    prometheus_port=int(prometheus_port) if prometheus_port else None,
+    prometheus_multiproc_dir=(
+        os.getenv("PROMETHEUS_MULTIPROC_DIR", "/tmp/agent-prometheus")
+        if prometheus_port
+        else None
+    ),
+    load_fnc=(
+        AdaptiveLoad(
+            max_lag=float(os.getenv("LOAD_MAX_EVENT_LOOP_LAG", 0.1)),
+            max_in_flight=int(os.getenv("LOAD_MAX_INFERENCE_IN_FLIGHT", 0)) or None,
+        )
+        if adaptive_load
+        else None
+    ),
+    load_threshold=ServerEnvOption(
+        dev_default=math.inf, prod_default=float(os.getenv("LOAD_THRESHOLD", 0.7))
+    ),
+    # loading the model and running a first prediction takes longer than the 10s
+    # a process has to initialize by default
+    initialize_process_timeout=(
+        float(os.getenv("TURN_DETECTOR_PREWARM_TIMEOUT", 60.0))
+        if turn_detector_prewarm
+        else 10.0
+    ),
+)
 
 
 def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+    # Uses the VAD model published by the agent server when available,
+    # see `publish_vad_model` below
+    proc.userdata["vad"] = load_vad()
+    # Load the turn detector and run a first prediction now, so the first
+    # end-of-turn decision of a call doesn't go through the inference process
+    if turn_detector_prewarm:
+        proc.userdata["turn_detector"] = load_turn_detector(
+            token_cache=os.getenv("TURN_DETECTOR_TOKEN_CACHE") == "1"
+        )
+
+    # Keep-alive provider clients shared by the sessions of this process
+    providers = ProviderClients(warm_urls=[DEEPGRAM_URL, INFERENCE_URL])
+    # used by every job of the process, closed when the process exits
+    providers.close_at_exit()
+    providers.openai_client(base_url=GROQ_BASE_URL, api_key=os.getenv("GROQ_API_KEY"))
+    if LLM_HEDGE_BASE_URL:
+        providers.openai_client(
+            base_url=LLM_HEDGE_BASE_URL, api_key=os.getenv("LLM_HEDGE_API_KEY")
+        )
+        # the hedging deadline is learned over all the calls of this process
+        proc.userdata["llm_hedging_stats"] = HedgingStats()
+    proc.userdata["providers"] = providers
+
+    if LOCAL_STT_MODEL:
+        proc.userdata["local_recognizer"] = VoskRecognizer.load(LOCAL_STT_MODEL)
+    if LOCAL_TTS_MODEL:
+        proc.userdata["local_voice"] = PiperVoice.load(LOCAL_TTS_MODEL)
+
+    # Health of the providers, shared with the other processes of the host
+    proc.userdata["provider_health"] = ProviderHealth(
+        failure_rate=float(os.getenv("CIRCUIT_FAILURE_RATE", 0.5)),
+        open_duration=float(os.getenv("CIRCUIT_OPEN_DURATION", 30.0)),
+        directory=os.getenv(CIRCUIT_DIR_ENV),
+    )
+
+    # Responses and their audio cached across the calls handled by this host
+    if cache_path := os.getenv("RESPONSE_CACHE_PATH"):
+        embedder = None
+        if embedding_model := os.getenv("RESPONSE_CACHE_EMBEDDING_MODEL"):
+            embedder = openai_embedder(
+                providers.openai_client(
+                    base_url=os.getenv(
+                        "RESPONSE_CACHE_EMBEDDING_URL", "https://api.openai.com/v1"
+                    ),
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                ),
+                embedding_model,
+            )
+        proc.userdata["response_cache"] = ResponseCache(
+            cache_path,
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", 24 * 3600)),
+            embedder=embedder,
+        )
 
 
 server.setup_fnc = prewarm
@@ -66,31 +457,190 @@ async def my_agent(ctx: JobContext):
         "room": ctx.room.name,
     }
 
+    # Open the provider connections while the rest of the session is set up
+    providers: ProviderClients = ctx.proc.userdata["providers"]
+    warm_task = asyncio.create_task(providers.warm())
+
+    # Every stage of the session runs at the rates of the participant's audio, so
+    # it's resampled once on the way in and not at all on the way out, and phone
+    # calls get a pipeline tuned for telephony
+    participant_kind = job_participant_kind(ctx.job, sip_room_prefix=SIP_ROOM_PREFIX)
+    # The models and settings of the config file as of the start of this session
+    config = pipeline_config.current()
+    profile = config.profile(
+        profile_for(participant_kind) if SIP_PROFILE else WEBRTC_PROFILE
+    )
+    audio_format = profile.audio
+    vad = profile.vad(ctx.proc.userdata["vad"])
+
+    turn_detector = ctx.proc.userdata.get("turn_detector")
+    tts = _build_tts(
+        providers.http_session(), sample_rate=audio_format.output_rate, config=config
+    )
+
+    # Move the turns to the fallback models while a provider is unhealthy
+    health: ProviderHealth = ctx.proc.userdata["provider_health"]
+    stt_model: agents_stt.STT = deepgram.STT(
+        model=profile.stt_model,
+        sample_rate=audio_format.input_rate,
+        http_session=providers.http_session(),
+    )
+    stt_fallbacks: list[agents_stt.STT] = []
+    if STT_FALLBACK_MODEL:
+        stt_fallbacks.append(
+            inference.STT(model=STT_FALLBACK_MODEL, sample_rate=audio_format.input_rate)
+        )
+    # The model loaded in `prewarm` is the last resort, or the only STT if forced
+    if local_recognizer := ctx.proc.userdata.get("local_recognizer"):
+        local_stt = LocalSTT(local_recognizer, vad=vad)
+        ctx.add_shutdown_callback(local_stt.aclose)
+        stt_fallbacks.append(local_stt)
+    if LOCAL_STT == "force" and local_recognizer:
+        stt_model = stt_fallbacks[-1]
+    elif stt_fallbacks:
+        stt_model = failover_stt(stt_model, health.breaker("deepgram"), *stt_fallbacks)
+    llm_model = _build_llm(
+        providers, config, ctx.proc.userdata.get("llm_hedging_stats")
+    )
+    if LLM_FALLBACK_MODEL:
+        llm_model = failover_llm(
+            llm_model,
+            health.breaker(
+                "groq", slow_threshold=float(os.getenv("LLM_SLOW_THRESHOLD", 3.0))
+            ),
+            inference.LLM(model=LLM_FALLBACK_MODEL),
+        )
+    tts_fallbacks: list[agents_tts.TTS] = []
+    if TTS_FALLBACK_MODEL:
+        tts_fallbacks.append(
+            inference.TTS(
+                model=TTS_FALLBACK_MODEL,
+                voice=os.getenv("TTS_FALLBACK_VOICE", NOT_GIVEN),
+                sample_rate=audio_format.output_rate,
+                http_session=providers.http_session(),
+            )
+        )
+    # The voice loaded in `prewarm` is the last resort, or the only TTS if forced
+    if local_voice := ctx.proc.userdata.get("local_voice"):
+        local_tts = LocalTTS(local_voice, sample_rate=audio_format.output_rate)
+        ctx.add_shutdown_callback(local_tts.aclose)
+        tts_fallbacks.append(local_tts)
+    local_tts_forced = LOCAL_TTS == "force" and local_voice is not None
+    if local_tts_forced:
+        tts_model = tts_fallbacks[-1]
+    elif tts_fallbacks:
+        tts_model = failover_tts(
+            tts,
+            health.breaker(
+                "cartesia", slow_threshold=float(os.getenv("TTS_SLOW_THRESHOLD", 2.0))
+            ),
+            *tts_fallbacks,
+            sample_rate=audio_format.output_rate,
+        )
+    else:
+        tts_model = tts
+
+    # Cached responses are only replayed with the voice they were synthesized with
+    response_cache = None
+    if cache := ctx.proc.userdata.get("response_cache"):
+        voice = (
+            f"local:{LOCAL_TTS_MODEL}"
+            if local_tts_forced
+            else f"{config.tts_model}:{config.tts_voice}"
+        )
+        response_cache = ResponseCacheNodes(
+            cache,
+            voice=f"{voice}:{audio_format.output_rate}",
+            lookup_timeout=float(os.getenv("RESPONSE_CACHE_LOOKUP_TIMEOUT", 0.3)),
+        )
+        if isinstance(tts_model, agents_tts.FallbackAdapter):
+            response_cache.watch_fallback(tts_model)
+        ctx.add_shutdown_callback(response_cache.aclose)
+
+    # Report the event loop lag of this process to the load function of the server
+    if load_reporter := LoadReporter.from_env(
+        in_flight=lambda: turn_detector.in_flight if turn_detector else 0
+    ):
+        load_reporter.start()
+        ctx.add_shutdown_callback(load_reporter.aclose)
+
     # Set up a voice AI pipeline using OpenAI, Cartesia, Deepgram, and the LiveKit turn detector
     session = AgentSession(
         # Speech-to-text (STT) is your agent's ears, turning the user's speech into text that the LLM can understand
         # See all available models at https://docs.livekit.io/agents/models/stt/
-        stt=deepgram.STT(model="nova-2"),
+        stt=stt_model,
         # A Large Language Model (LLM) is your agent's brain, processing user input and generating a response
         # See all available models at https://docs.livekit.io/agents/models/llm/
-        llm=openai.LLM(
-            model="llama-3.3-70b-versatile",
-            base_url="https://api.groq.com/openai/v1",
-            api_key=os.getenv("GROQ_API_KEY"),
-        ),
+        # When LLM_HEDGE_BASE_URL is set, slow requests are also sent to a second
+        # provider and the first to answer is used
+        llm=llm_model,
         # Text-to-speech (TTS) is your agent's voice, turning the LLM's text into speech that the user can hear
         # See all available models as well as voice selections at https://docs.livekit.io/agents/models/tts/
-        tts=inference.TTS(
-            model="cartesia/sonic-3", voice="9626c31c-bec5-4cca-baa8-f8ba9e84c8bc"
-        ),
+        tts=tts_model,
         # VAD and turn detection are used to determine when the user is speaking and when the agent should respond
         # See more at https://docs.livekit.io/agents/build/turns
-        turn_detection=MultilingualModel(),
-        vad=ctx.proc.userdata["vad"],
+        turn_detection=(
+            turn_detector.model() if turn_detector else MultilingualModel()
+        ),
+        vad=vad,
+        min_endpointing_delay=profile.min_endpointing_delay,
+        max_endpointing_delay=profile.max_endpointing_delay,
         # allow the LLM to generate a response while waiting for the end of turn
         # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
-        preemptive_generation=True,
+        preemptive_generation=config.preemptive_generation,
+    )
+
+    # Record the timing breakdown of every turn (end of speech, end of turn
+    # decision, LLM first token, TTS first byte and first audio published)
+    latency = LatencyCollector(
+        ctx.room.name, per_room=os.getenv("LATENCY_METRICS_PER_ROOM") == "1"
     )
+    latency.attach(session)
+
+    # Count the preemptive replies used and discarded, and the latency saved
+    speculation = SpeculativeTTS(mode=os.getenv("SPECULATIVE_TTS", "full"))
+    speculation.attach(session)
+    ctx.add_shutdown_callback(speculation.log_summary)
+    ctx.add_shutdown_callback(latency.log_summary)
+
+    # Keep the prompt size bounded in long calls, older turns are summarized by a
+    # small model in the background
+    compactor = None
+    if os.getenv("CONTEXT_COMPACTION", "1") != "0":
+        compactor = ContextCompactor(
+            openai.LLM(
+                model=os.getenv("CONTEXT_SUMMARY_MODEL", "llama-3.1-8b-instant"),
+                client=providers.openai_client(
+                    base_url=GROQ_BASE_URL, api_key=os.getenv("GROQ_API_KEY")
+                ),
+            ),
+            keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", 6)),
+            fold_turns=int(os.getenv("CONTEXT_FOLD_TURNS", 4)),
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", 2000)),
+        )
+        ctx.add_shutdown_callback(compactor.aclose)
+
+    # Report the prompt tokens cached by the LLM provider
+    prompt_cache = PromptCacheStats()
+    prompt_cache.attach(session)
+    ctx.add_shutdown_callback(prompt_cache.log_summary)
+
+    def _call_context() -> dict[str, str]:
+        # changes every minute, sent after the cached prefix of the prompt
+        context: dict[str, str] = {}
+        if CALL_CONTEXT_TIME:
+            context["time"] = datetime.now(timezone.utc).strftime(
+                "%A %d %B %Y %H:%M UTC"
+            )
+        if not CALL_CONTEXT_CALLER_NUMBER:
+            return context
+
+        participant = session.room_io.linked_participant
+        if participant is not None and (
+            phone_number := participant.attributes.get("sip.phoneNumber")
+        ):
+            context["caller phone number"] = phone_number
+        return context
 
     # To use a realtime model instead of a voice pipeline, use the following session setup instead.
     # (Note: This is for the OpenAI Realtime API. For other providers, see https://docs.livekit.io/agents/models/realtime/))
@@ -112,16 +662,38 @@ async def my_agent(ctx: JobContext):
 
     # Start the session, which initializes the voice pipeline and warms up the models
     await session.start(
-        agent=Assistant(),
+        agent=Assistant(
+            response_cache=response_cache,
+            # the phrases of the cache are in the voice of Cartesia
+            phrase_cache=(
+                _phrase_cache(tts, config)
+                if PHRASE_CACHE_DIR and not local_tts_forced
+                else None
+            ),
+            speculation=speculation,
+            chunker=(
+                AdaptiveChunker(
+                    min_first_words=int(os.getenv("TTS_FIRST_CHUNK_MIN_WORDS", 2)),
+                    max_first_words=int(os.getenv("TTS_FIRST_CHUNK_MAX_WORDS", 8)),
+                )
+                if os.getenv("TTS_CHUNKING", "1") != "0"
+                else None
+            ),
+            compactor=compactor,
+            prompt_layout=PromptLayout(volatile=_call_context),
+        ),
         room=ctx.room,
         room_options=room_io.RoomOptions(
             audio_input=room_io.AudioInputOptions(
-                noise_cancellation=lambda params: (
-                    noise_cancellation.BVCTelephony()
-                    if params.participant.kind
-                    == rtc.ParticipantKind.PARTICIPANT_KIND_SIP
-                    else noise_cancellation.BVC()
+                sample_rate=audio_format.input_rate,
+                frame_size_ms=profile.frame_size_ms,
+                noise_cancellation=functools.partial(
+                    _noise_cancellation, participant_kind=participant_kind
                 ),
+                pre_connect_audio=profile.pre_connect_audio,
+            ),
+            audio_output=room_io.AudioOutputOptions(
+                sample_rate=audio_format.output_rate
             ),
         ),
     )
@@ -129,6 +701,24 @@ async def my_agent(ctx: JobContext):
     # Join the room and connect to the user
     await ctx.connect()
 
+    await warm_task
+
 
 if __name__ == "__main__":
-    cli.run_app(server)
+    # Optimize the VAD model once in the agent server and cache it for the job
+    # processes, so each of them loads the pre-optimized model instead of
+    # optimizing the bundled one again. Only the subcommands running an agent
+    # server start job processes
+    if (
+        sys.argv[1:2] in (["start"], ["dev"], ["connect"])
+        and os.getenv("SHARED_VAD_MODEL", "1") != "0"
+    ):
+        publish_vad_model()
+    if adaptive_load:
+        publish_load_report_dir()
+    publish_circuit_dir()
+
+    if sys.argv[1:2] == ["loadtest"]:
+        loadtest.main(sys.argv[2:], agent_factory=Assistant)
+    else:
+        cli.run_app(server)
@@ -0,0 +1,63 @@
+import dataclasses
+from typing import Any
+
+from livekit import rtc
+from livekit.plugins import silero
+
+# rate the audio of a participant is captured at: telephony is narrowband, the
+# Opus tracks of WebRTC are fullband
+SIP_SAMPLE_RATE = 8000
+WEBRTC_SAMPLE_RATE = 48000
+
+# rates all the stages of the input run at: Silero only supports these two,
+# Deepgram and the STT of LiveKit Inference take any rate
+INPUT_SAMPLE_RATES = (8000, 16000)
+# rates the TTS is synthesized at, the voices of Cartesia are 24kHz at most
+OUTPUT_SAMPLE_RATES = (8000, 24000)
+
+
+@dataclasses.dataclass(frozen=True)
+class AudioFormat:
+    """Sample rates of the audio of a session, chosen once before it starts.
+
+    Every stage of the session is configured at these rates, so the audio of the
+    participant is only resampled once, by the audio stream receiving it, and the
+    audio of the agent is played as synthesized.
+    """
+
+    input_rate: int
+    """Rate of the room input, the noise cancellation, the VAD and the STT."""
+    output_rate: int
+    """Rate of the TTS and the room output."""
+
+
+def negotiate(kind: rtc.ParticipantKind.ValueType) -> AudioFormat:
+    """Audio format of a session with a participant of the given kind.
+
+    The highest rate of each direction not above the rate the participant's audio
+    is captured at: there is nothing to gain in upsampling telephony audio.
+    """
+    source_rate = (
+        SIP_SAMPLE_RATE
+        if kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP
+        else WEBRTC_SAMPLE_RATE
+    )
+    return AudioFormat(
+        input_rate=max(rate for rate in INPUT_SAMPLE_RATES if rate <= source_rate),
+        output_rate=max(rate for rate in OUTPUT_SAMPLE_RATES if rate <= source_rate),
+    )
+
+
+def vad_at(vad: silero.VAD, sample_rate: int, **options: Any) -> silero.VAD:
+    """The VAD of the process running its inferences at `sample_rate`.
+
+    Shares the ONNX session of `vad`, only the windows of the streams are sized for the other rate. `options` replace
+    the other options of the VAD (thresholds, durations).
+    """
+    if vad._opts.sample_rate == sample_rate and not options:
+        return vad
+
+    return silero.VAD(
+        session=vad._onnx_session,
+        opts=dataclasses.replace(vad._opts, sample_rate=sample_rate, **options),
+    )
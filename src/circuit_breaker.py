@@ -0,0 +1,516 @@
+import asyncio
+import atexit
+import collections
+import contextlib
+import dataclasses
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import AsyncIterable
+from pathlib import Path
+from typing import Any, Literal
+
+import prometheus_client
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectionError,
+    APIConnectOptions,
+    NotGivenOr,
+    llm,
+    stt,
+    tts,
+    utils,
+)
+from livekit.agents.metrics import LLMMetrics, TTSMetrics
+
+from shared_models import shared_memory_dir
+
+logger = logging.getLogger("agent")
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+_STATE_VALUES: dict[CircuitState, int] = {"closed": 0, "half_open": 1, "open": 2}
+
+CIRCUIT_STATE = prometheus_client.Gauge(
+    "lk_agent_provider_circuit_state",
+    "State of the circuit of a provider: 0 closed, 1 half-open, 2 open",
+    ["provider", "nodename"],
+    multiprocess_mode="livemax",
+)
+
+PROVIDER_REQUESTS = prometheus_client.Counter(
+    "lk_agent_provider_requests",
+    "Requests sent to a provider, by outcome",
+    ["provider", "outcome", "nodename"],
+)
+
+
+# Environment variable used to hand the directory of the circuit states from the
+# agent server to its job processes
+CIRCUIT_DIR_ENV = "AGENT_CIRCUIT_DIR"
+
+
+def publish_circuit_dir(directory: Path | str | None = None) -> Path:
+    """Create the directory where job processes share the health of the providers.
+
+    Must be called in the parent process before any job process is started.
+    """
+    path = Path(
+        tempfile.mkdtemp(prefix="agent-circuits-", dir=directory or shared_memory_dir())
+    )
+    atexit.register(shutil.rmtree, path, ignore_errors=True)
+    os.environ[CIRCUIT_DIR_ENV] = str(path)
+    return path
+
+
+class CircuitBreaker:
+    """Health of a provider, as seen by the requests of the job processes of a host.
+
+    Requests are recorded as successes or failures, a request slower than
+    `slow_threshold` (time to first token or byte) counts as a failure. When at
+    least `min_requests` were recorded in the last `window` seconds and the share
+    of failures reaches `failure_rate`, the circuit opens: requests are refused
+    right away so the sessions switch to their fallback without waiting for a
+    timeout. After `open_duration` seconds the circuit is half-open and lets a
+    single probe request through, which closes the circuit if it succeeds and
+    opens it again if it fails.
+
+    A job process hosts a single call, on its own a breaker only sees the requests
+    of that call. With a `directory` (see `publish_circuit_dir`), the breaker of
+    every process writes its outcomes and the times it opened and closed the
+    circuit to a file there, and reads the ones of the other processes: the
+    failure rate is the one of the requests of the whole host, and a circuit
+    opened in a process is open in all of them. Each process sends its own probe.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        *,
+        failure_rate: float = 0.5,
+        min_requests: int = 5,
+        window: float = 60.0,
+        slow_threshold: float | None = None,
+        open_duration: float = 30.0,
+        directory: Path | str | None = None,
+    ) -> None:
+        self._provider = provider
+        self._failure_rate = failure_rate
+        self._min_requests = min_requests
+        self._window = window
+        self._slow_threshold = slow_threshold
+        self._open_duration = open_duration
+        self._directory = Path(directory) if directory else None
+        self._path = (
+            self._directory / f"{provider}.{utils.shortuuid()}.json"
+            if self._directory
+            else None
+        )
+        # wall clock times, compared with the ones of the other processes
+        self._outcomes: collections.deque[tuple[float, bool]] = collections.deque()
+        self._opened_at = 0.0
+        self._closed_at = 0.0
+        self._state: CircuitState = "closed"
+        self._probe_started_at: float | None = None
+        self._set_state("closed")
+
+    @property
+    def provider(self) -> str:
+        return self._provider
+
+    @property
+    def state(self) -> CircuitState:
+        _, opened_at, closed_at = self._shared()
+        state: CircuitState = "closed"
+        if opened_at > closed_at:
+            state = (
+                "open" if time.time() - opened_at < self._open_duration else "half_open"
+            )
+        if state != self._state:
+            self._set_state(state)
+        return state
+
+    def allow(self) -> bool:
+        """Whether a request can be sent to the provider."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+
+        # a probe that never reported back (e.g. cancelled) doesn't block the next
+        now = time.time()
+        if (
+            self._probe_started_at is None
+            or now - self._probe_started_at >= self._open_duration
+        ):
+            self._probe_started_at = now
+            return True
+        return False
+
+    def record_success(self, latency: float | None = None) -> None:
+        if (
+            self._slow_threshold is not None
+            and latency is not None
+            and latency > self._slow_threshold
+        ):
+            self._record(False, outcome="slow")
+            return
+
+        self._record(True, outcome="success")
+
+    def record_failure(self) -> None:
+        self._record(False, outcome="failure")
+
+    def _record(self, success: bool, *, outcome: str) -> None:
+        PROVIDER_REQUESTS.labels(
+            provider=self._provider, outcome=outcome, nodename=utils.nodename()
+        ).inc()
+
+        now = time.time()
+        state = self.state
+        if state == "half_open":
+            self._probe_started_at = None
+            self._outcomes.clear()
+            if success:
+                logger.info("provider recovered", extra={"provider": self._provider})
+                self._closed_at = now
+                self._set_state("closed")
+            else:
+                self._opened_at = now
+                self._set_state("open")
+            self._write(now)
+            return
+
+        self._outcomes.append((now, success))
+        while self._outcomes and now - self._outcomes[0][0] > self._window:
+            self._outcomes.popleft()
+        self._write(now)
+        if state != "closed":
+            return
+
+        outcomes, opened_at, closed_at = self._shared()
+        # the outcomes before the circuit last opened or closed are over
+        since = max(now - self._window, opened_at, closed_at)
+        recent = [ok for at, ok in outcomes if at > since]
+        failures = recent.count(False)
+        if (
+            len(recent) >= self._min_requests
+            and failures / len(recent) >= self._failure_rate
+        ):
+            logger.warning(
+                "provider unhealthy, opening its circuit",
+                extra={"provider": self._provider, "failures": failures},
+            )
+            self._outcomes.clear()
+            self._opened_at = now
+            self._set_state("open")
+            self._write(now)
+
+    def _shared(self) -> tuple[list[tuple[float, bool]], float, float]:
+        """Outcomes and the last open and close times, of every process."""
+        outcomes = list(self._outcomes)
+        opened_at, closed_at = self._opened_at, self._closed_at
+        if self._directory is None:
+            return outcomes, opened_at, closed_at
+
+        now = time.time()
+        for path in self._directory.glob(f"{self._provider}.*.json"):
+            if path == self._path:
+                continue
+            try:
+                report = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            # from a process that's gone, every job runs in a new process
+            if now - report["updated_at"] > max(self._window, self._open_duration):
+                with contextlib.suppress(FileNotFoundError):
+                    path.unlink()
+                continue
+
+            outcomes += [(at, ok) for at, ok in report["outcomes"]]
+            opened_at = max(opened_at, report["opened_at"])
+            closed_at = max(closed_at, report["closed_at"])
+        return outcomes, opened_at, closed_at
+
+    def _write(self, now: float) -> None:
+        if self._path is None:
+            return
+
+        report = {
+            "outcomes": list(self._outcomes),
+            "opened_at": self._opened_at,
+            "closed_at": self._closed_at,
+            "updated_at": now,
+        }
+        tmp_path = self._path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(json.dumps(report))
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            logger.debug("failed to write the circuit state", exc_info=e)
+
+    def _set_state(self, state: CircuitState) -> None:
+        self._state = state
+        CIRCUIT_STATE.labels(provider=self._provider, nodename=utils.nodename()).set(
+            _STATE_VALUES[state]
+        )
+
+    def watch(self, instance: llm.LLM | stt.STT | tts.TTS) -> None:
+        """Record the outcome of the requests of a plugin from its events."""
+        instance.on("error", lambda _: self.record_failure())
+        instance.on("metrics_collected", self._on_metrics_collected)
+
+    def _on_metrics_collected(self, metrics: Any) -> None:
+        if isinstance(metrics, LLMMetrics):
+            self.record_success(metrics.ttft if metrics.ttft >= 0 else None)
+        elif isinstance(metrics, TTSMetrics):
+            self.record_success(metrics.ttfb if metrics.ttfb >= 0 else None)
+        else:
+            self.record_success()
+
+    def check(self) -> None:
+        if not self.allow():
+            raise APIConnectionError(
+                f"circuit of {self._provider} is open", retryable=False
+            )
+
+
+class ProviderHealth:
+    """Circuit breakers of the providers of a job process, by name.
+
+    Created in `prewarm` and stored in `proc.userdata`, so that the STT, LLM and
+    TTS instances of the call (fallbacks and helpers included) share the breaker
+    of a provider. Pass the `directory` of `publish_circuit_dir` to share it with
+    the other processes of the host.
+    """
+
+    def __init__(self, **breaker_options: Any) -> None:
+        self._breaker_options = breaker_options
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker(self, provider: str, **options: Any) -> CircuitBreaker:
+        if provider not in self._breakers:
+            self._breakers[provider] = CircuitBreaker(
+                provider, **{**self._breaker_options, **options}
+            )
+        return self._breakers[provider]
+
+
+class GuardedLLM(llm.LLM):
+    """LLM refusing requests while the circuit of its provider is open.
+
+    Meant to be the primary of an `llm.FallbackAdapter`, which moves the turn to
+    the next LLM when a request is refused or fails.
+    """
+
+    def __init__(self, wrapped: llm.LLM, breaker: CircuitBreaker) -> None:
+        super().__init__()
+        self._wrapped = wrapped
+        self._breaker = breaker
+        self._label = wrapped.label
+        breaker.watch(wrapped)
+        wrapped.on("metrics_collected", self._on_metrics_collected)
+
+    @property
+    def model(self) -> str:
+        return self._wrapped.model
+
+    @property
+    def provider(self) -> str:
+        return self._wrapped.provider
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool] | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs: Any,
+    ) -> llm.LLMStream:
+        self._breaker.check()
+        return self._wrapped.chat(
+            chat_ctx=chat_ctx, tools=tools, conn_options=conn_options, **kwargs
+        )
+
+    def _on_metrics_collected(self, *args: Any, **kwargs: Any) -> None:
+        self.emit("metrics_collected", *args, **kwargs)
+
+
+class GuardedSTT(stt.STT):
+    """STT refusing requests while the circuit of its provider is open."""
+
+    def __init__(self, wrapped: stt.STT, breaker: CircuitBreaker) -> None:
+        super().__init__(capabilities=wrapped.capabilities)
+        self._wrapped = wrapped
+        self._breaker = breaker
+        self._label = wrapped.label
+        breaker.watch(wrapped)
+        wrapped.on("metrics_collected", self._on_metrics_collected)
+
+    @property
+    def model(self) -> str:
+        return self._wrapped.model
+
+    @property
+    def provider(self) -> str:
+        return self._wrapped.provider
+
+    async def recognize(
+        self,
+        buffer: utils.AudioBuffer,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> stt.SpeechEvent:
+        self._breaker.check()
+        return await self._wrapped.recognize(
+            buffer, language=language, conn_options=conn_options
+        )
+
+    async def _recognize_impl(
+        self,
+        buffer: utils.AudioBuffer,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions,
+    ) -> stt.SpeechEvent:
+        return await self._wrapped._recognize_impl(
+            buffer, language=language, conn_options=conn_options
+        )
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> stt.RecognizeStream:
+        # `stt.FallbackAdapter` doesn't expect `stream` to raise, the stream fails
+        # instead when the circuit is open
+        return _GuardedRecognizeStream(
+            self, language=language, conn_options=conn_options
+        )
+
+    def _on_metrics_collected(self, *args: Any, **kwargs: Any) -> None:
+        self.emit("metrics_collected", *args, **kwargs)
+
+
+class _GuardedRecognizeStream(stt.RecognizeStream):
+    """Stream of the wrapped STT, failing from the start while the circuit is open."""
+
+    _stt: GuardedSTT
+
+    def __init__(
+        self,
+        guarded: GuardedSTT,
+        *,
+        language: NotGivenOr[str],
+        conn_options: APIConnectOptions,
+    ) -> None:
+        # the stream of the wrapped STT retries on its own
+        super().__init__(
+            stt=guarded, conn_options=dataclasses.replace(conn_options, max_retry=0)
+        )
+        self._language = language
+        self._wrapped_conn_options = conn_options
+
+    async def _run(self) -> None:
+        self._stt._breaker.check()
+        stream = self._stt._wrapped.stream(
+            language=self._language, conn_options=self._wrapped_conn_options
+        )
+
+        async def _forward_input() -> None:
+            async for data in self._input_ch:
+                if isinstance(data, self._FlushSentinel):
+                    stream.flush()
+                else:
+                    stream.push_frame(data)
+            stream.end_input()
+
+        forward_task = asyncio.create_task(_forward_input())
+        try:
+            async with stream:
+                async for ev in stream:
+                    self._event_ch.send_nowait(ev)
+        finally:
+            await utils.aio.cancel_and_wait(forward_task)
+
+    async def _metrics_monitor_task(self, event_aiter: AsyncIterable[Any]) -> None:
+        # the metrics of the wrapped stream are forwarded by `GuardedSTT`
+        async for _ in event_aiter:
+            pass
+
+
+class GuardedTTS(tts.TTS):
+    """TTS refusing requests while the circuit of its provider is open."""
+
+    def __init__(self, wrapped: tts.TTS, breaker: CircuitBreaker) -> None:
+        super().__init__(
+            capabilities=wrapped.capabilities,
+            sample_rate=wrapped.sample_rate,
+            num_channels=wrapped.num_channels,
+        )
+        self._wrapped = wrapped
+        self._breaker = breaker
+        self._label = wrapped.label
+        breaker.watch(wrapped)
+        wrapped.on("metrics_collected", self._on_metrics_collected)
+
+    @property
+    def model(self) -> str:
+        return self._wrapped.model
+
+    @property
+    def provider(self) -> str:
+        return self._wrapped.provider
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> tts.ChunkedStream:
+        self._breaker.check()
+        return self._wrapped.synthesize(text, conn_options=conn_options)
+
+    def stream(
+        self, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS
+    ) -> tts.SynthesizeStream:
+        self._breaker.check()
+        return self._wrapped.stream(conn_options=conn_options)
+
+    def prewarm(self) -> None:
+        self._wrapped.prewarm()
+
+    def _on_metrics_collected(self, *args: Any, **kwargs: Any) -> None:
+        self.emit("metrics_collected", *args, **kwargs)
+
+
+def failover_stt(
+    primary: stt.STT, breaker: CircuitBreaker, *fallbacks: stt.STT
+) -> stt.STT:
+    return stt.FallbackAdapter([GuardedSTT(primary, breaker), *fallbacks])
+
+
+def failover_llm(
+    primary: llm.LLM, breaker: CircuitBreaker, *fallbacks: llm.LLM
+) -> llm.LLM:
+    return llm.FallbackAdapter([GuardedLLM(primary, breaker), *fallbacks])
+
+
+def failover_tts(
+    primary: tts.TTS,
+    breaker: CircuitBreaker,
+    *fallbacks: tts.TTS,
+    sample_rate: int | None = None,
+) -> tts.TTS:
+    # the audio of every TTS is resampled to `sample_rate`, the highest of their
+    # rates by default
+    return tts.FallbackAdapter(
+        [GuardedTTS(primary, breaker), *fallbacks], sample_rate=sample_rate
+    )
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from collections.abc import Sequence
+
+from livekit.agents import llm, utils
+
+logger = logging.getLogger("agent")
+
+SUMMARY_INSTRUCTIONS = """You maintain the summary of a conversation between a user and a voice assistant.
+Update the summary with the new messages. Keep the facts the assistant may need later: what the user asked for, names, numbers, dates, decisions and open questions.
+Answer with the updated summary only, in a few short sentences."""
+
+# rough number of characters per token of the English text the LLM sees
+_CHARS_PER_TOKEN = 4
+# role, separators, ... of every message
+_TOKENS_PER_ITEM = 4
+
+
+def estimate_tokens(item: llm.ChatItem) -> int:
+    if isinstance(item, llm.ChatMessage):
+        text = item.text_content or ""
+    elif isinstance(item, llm.FunctionCall):
+        text = item.name + item.arguments
+    elif isinstance(item, llm.FunctionCallOutput):
+        text = item.output
+    else:
+        text = ""
+    return len(text) // _CHARS_PER_TOKEN + _TOKENS_PER_ITEM
+
+
+def _transcript(items: Sequence[llm.ChatItem]) -> str:
+    lines = []
+    for item in items:
+        if isinstance(item, llm.ChatMessage) and item.text_content:
+            lines.append(f"{item.role}: {item.text_content}")
+        elif isinstance(item, llm.FunctionCallOutput):
+            lines.append(f"tool {item.name}: {item.output}")
+    return "\n".join(lines)
+
+
+def _split_turns(items: Sequence[llm.ChatItem]) -> list[list[llm.ChatItem]]:
+    """Group the items in turns, each starting with a user message."""
+    turns: list[list[llm.ChatItem]] = []
+    for item in items:
+        if not turns or (isinstance(item, llm.ChatMessage) and item.role == "user"):
+            turns.append([])
+        turns[-1].append(item)
+    return turns
+
+
+class ContextCompactor:
+    """Bounds the chat context sent to the LLM in long calls.
+
+    The last `keep_turns` turns are sent verbatim. Older turns are folded into a
+    rolling summary by `summarizer`, a small and fast LLM, in a background task:
+    the reply never waits for it, and until the summary is ready the turns it
+    folds are still sent verbatim. On top of that, the oldest turns are left out
+    while the estimated size of the context exceeds `max_tokens`.
+
+    The summary follows the instructions, so every new summary invalidates the
+    prompt cache of the provider from there on. Turns are folded `fold_turns` at
+    a time, once `keep_turns + fold_turns` turns are waiting, or as soon as the
+    context exceeds `max_tokens`: between two folds, the requests only append to
+    the previous one and their prefix stays cached.
+
+    Only the context of the LLM requests is compacted, the history of the session
+    stays complete.
+    """
+
+    def __init__(
+        self,
+        summarizer: llm.LLM | None,
+        *,
+        keep_turns: int = 6,
+        fold_turns: int = 4,
+        max_tokens: int = 2000,
+    ) -> None:
+        self._summarizer = summarizer
+        self._keep_turns = keep_turns
+        self._fold_turns = fold_turns
+        self._max_tokens = max_tokens
+        self._summary = ""
+        # id of the last item folded into the summary
+        self._summarized_until: str | None = None
+        self._fold_task: asyncio.Task[None] | None = None
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    def compact(self, chat_ctx: llm.ChatContext) -> llm.ChatContext:
+        items = chat_ctx.items
+        # the instructions of the agent
+        head_len = 0
+        while (
+            head_len < len(items)
+            and isinstance(items[head_len], llm.ChatMessage)
+            and items[head_len].role in ("system", "developer")
+        ):
+            head_len += 1
+        head, rest = items[:head_len], items[head_len:]
+
+        ids = [item.id for item in rest]
+        if self._summarized_until in ids:
+            rest = rest[ids.index(self._summarized_until) + 1 :]
+
+        turns = _split_turns(rest)
+        summary = []
+        if self._summary:
+            summary.append(
+                llm.ChatMessage(
+                    role="system",
+                    content=[f"Summary of the earlier conversation: {self._summary}"],
+                )
+            )
+
+        budget = self._max_tokens - sum(
+            estimate_tokens(item) for item in [*head, *summary]
+        )
+        over_budget = sum(estimate_tokens(item) for item in rest) > budget
+        if len(turns) > self._keep_turns and (
+            len(turns) >= self._keep_turns + self._fold_turns or over_budget
+        ):
+            self._start_fold(
+                [item for turn in turns[: -self._keep_turns] for item in turn]
+            )
+
+        kept: list[list[llm.ChatItem]] = []
+        for turn in reversed(turns):
+            budget -= sum(estimate_tokens(item) for item in turn)
+            # the last turn is always sent
+            if budget < 0 and kept:
+                break
+            kept.insert(0, turn)
+
+        return llm.ChatContext(
+            [*head, *summary, *(item for turn in kept for item in turn)]
+        )
+
+    def _start_fold(self, items: list[llm.ChatItem]) -> None:
+        if self._summarizer is None or (
+            self._fold_task is not None and not self._fold_task.done()
+        ):
+            return
+
+        self._fold_task = asyncio.create_task(self._fold(items))
+
+    async def _fold(self, items: list[llm.ChatItem]) -> None:
+        chat_ctx = llm.ChatContext.empty()
+        chat_ctx.add_message(role="system", content=SUMMARY_INSTRUCTIONS)
+        chat_ctx.add_message(
+            role="user",
+            content=f"Summary so far:\n{self._summary or '(empty)'}\n\n"
+            f"New messages:\n{_transcript(items)}",
+        )
+        assert self._summarizer is not None
+        try:
+            text = []
+            async with self._summarizer.chat(chat_ctx=chat_ctx) as stream:
+                async for chunk in stream:
+                    if chunk.delta and chunk.delta.content:
+                        text.append(chunk.delta.content)
+        except Exception as e:
+            # the turns are folded again with the next ones
+            logger.warning("failed to summarize the conversation", exc_info=e)
+            return
+
+        self._summary = "".join(text).strip()
+        self._summarized_until = items[-1].id
+
+    async def aclose(self) -> None:
+        if self._fold_task is not None:
+            await utils.aio.cancel_and_wait(self._fold_task)
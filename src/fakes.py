@@ -0,0 +1,617 @@
+import asyncio
+import collections
+import random
+import time
+from collections.abc import Iterator, Sequence
+from itertools import cycle
+from typing import Any
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    APIConnectOptions,
+    NotGivenOr,
+    io,
+    llm,
+    stt,
+    tts,
+    utils,
+    vad,
+)
+from livekit.agents.utils import aio
+
+# duration of the audio frames produced and consumed by the fakes
+FRAME_DURATION = 0.02
+SAMPLE_RATE = 24000
+
+
+def _sample(rng: random.Random, mean: float, jitter: float) -> float:
+    return max(0.0, rng.gauss(mean, jitter)) if jitter else mean
+
+
+def speech_frames(
+    duration: float,
+    *,
+    sample_rate: int = SAMPLE_RATE,
+    frame_duration: float = FRAME_DURATION,
+) -> Iterator[rtc.AudioFrame]:
+    """A tone standing in for user speech, in 20ms frames by default."""
+    samples_per_frame = int(sample_rate * frame_duration)
+    t = np.arange(samples_per_frame) / sample_rate
+    tone = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16).tobytes()
+    for _ in range(round(duration / frame_duration)):
+        yield rtc.AudioFrame(tone, sample_rate, 1, samples_per_frame)
+
+
+def silence_frames(
+    duration: float,
+    *,
+    sample_rate: int = SAMPLE_RATE,
+    frame_duration: float = FRAME_DURATION,
+) -> Iterator[rtc.AudioFrame]:
+    samples_per_frame = int(sample_rate * frame_duration)
+    silence = bytes(samples_per_frame * 2)
+    for _ in range(round(duration / frame_duration)):
+        yield rtc.AudioFrame(silence, sample_rate, 1, samples_per_frame)
+
+
+class FakeSTT(stt.STT):
+    """Streaming STT transcribing any non-silent audio as the next scripted transcript.
+
+    An utterance starts with the first non-silent frame and ends after `endpointing`
+    seconds of silence. The interim transcript is emitted `latency` seconds after the
+    start of the utterance and the final transcript `latency` seconds after its end,
+    with gaussian `jitter`. The sampled delays are kept in `interim_delays` and
+    `final_delays`, and the time every utterance ended (`time.perf_counter()`) in
+    `utterance_end_times`.
+    """
+
+    def __init__(
+        self,
+        transcripts: Sequence[str],
+        *,
+        latency: float = 0.1,
+        jitter: float = 0.0,
+        endpointing: float = 0.2,
+        seed: int = 0,
+    ) -> None:
+        super().__init__(
+            capabilities=stt.STTCapabilities(streaming=True, interim_results=True)
+        )
+        self._transcripts = cycle(transcripts)
+        self._latency = latency
+        self._jitter = jitter
+        self._endpointing = endpointing
+        self._rng = random.Random(seed)
+        self.interim_delays: list[float] = []
+        self.final_delays: list[float] = []
+        self.utterance_end_times: list[float] = []
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def _next_utterance(self) -> tuple[str, float, float]:
+        interim_delay = _sample(self._rng, self._latency, self._jitter)
+        final_delay = _sample(self._rng, self._latency, self._jitter)
+        self.interim_delays.append(interim_delay)
+        self.final_delays.append(final_delay)
+        return next(self._transcripts), interim_delay, final_delay
+
+    async def _recognize_impl(
+        self,
+        buffer: utils.AudioBuffer,
+        *,
+        language: NotGivenOr[str],
+        conn_options: APIConnectOptions,
+    ) -> stt.SpeechEvent:
+        transcript, _, delay = self._next_utterance()
+        await asyncio.sleep(delay)
+        return _speech_event(stt.SpeechEventType.FINAL_TRANSCRIPT, transcript)
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = "",
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "FakeRecognizeStream":
+        return FakeRecognizeStream(stt=self, conn_options=conn_options)
+
+
+class FakeRecognizeStream(stt.RecognizeStream):
+    _stt: FakeSTT
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        # events are scheduled in order, jitter can delay but not reorder them
+        last_due = loop.time()
+
+        def _emit_later(delay: float, *events: stt.SpeechEvent) -> None:
+            nonlocal last_due
+            last_due = max(last_due, loop.time() + delay)
+            for ev in events:
+                loop.call_at(last_due, self._event_ch.send_nowait, ev)
+
+        utterance: tuple[str, float, float] | None = None
+        silence = 0.0
+        async for frame in self._input_ch:
+            if isinstance(frame, self._FlushSentinel):
+                continue
+
+            if np.any(np.frombuffer(frame.data, dtype=np.int16)):
+                silence = 0.0
+                if utterance is None:
+                    utterance = self._stt._next_utterance()
+                    transcript, interim_delay, _ = utterance
+                    self._event_ch.send_nowait(
+                        _speech_event(stt.SpeechEventType.START_OF_SPEECH)
+                    )
+                    _emit_later(
+                        interim_delay,
+                        _speech_event(
+                            stt.SpeechEventType.INTERIM_TRANSCRIPT, transcript
+                        ),
+                    )
+            elif utterance is not None:
+                silence += frame.duration
+                if silence >= self._stt._endpointing:
+                    self._stt.utterance_end_times.append(time.perf_counter())
+                    transcript, _, final_delay = utterance
+                    _emit_later(
+                        final_delay,
+                        _speech_event(stt.SpeechEventType.FINAL_TRANSCRIPT, transcript),
+                        _speech_event(stt.SpeechEventType.END_OF_SPEECH),
+                    )
+                    utterance = None
+
+        await asyncio.sleep(max(0.0, last_due - loop.time()))
+
+
+def _speech_event(event_type: stt.SpeechEventType, text: str = "") -> stt.SpeechEvent:
+    alternatives = [stt.SpeechData(language="en", text=text)] if text else []
+    return stt.SpeechEvent(type=event_type, alternatives=alternatives)
+
+
+class FakeLLM(llm.LLM):
+    """LLM streaming scripted responses word by word.
+
+    The first token arrives after `ttft` seconds, plus `prompt_token_latency` per
+    token of the prompt (about 4 characters), and the following ones every
+    `token_interval` seconds, with gaussian `jitter`. The sampled time to first
+    token and the prompt size of every request are kept in `delays` and
+    `prompt_tokens`.
+    """
+
+    def __init__(
+        self,
+        responses: Sequence[str],
+        *,
+        ttft: float = 0.2,
+        token_interval: float = 0.01,
+        prompt_token_latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        super().__init__()
+        self._responses = cycle(responses)
+        self._ttft = ttft
+        self._token_interval = token_interval
+        self._prompt_token_latency = prompt_token_latency
+        self._jitter = jitter
+        self._rng = random.Random(seed)
+        self.delays: list[float] = []
+        self.prompt_tokens: list[int] = []
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool] | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs: Any,
+    ) -> "FakeLLMStream":
+        prompt_tokens = sum(
+            len(message.text_content or "") // 4 for message in chat_ctx.messages()
+        )
+        ttft = (
+            _sample(self._rng, self._ttft, self._jitter)
+            + prompt_tokens * self._prompt_token_latency
+        )
+        intervals = [
+            _sample(self._rng, self._token_interval, self._jitter / 10)
+            for _ in range(64)
+        ]
+        self.delays.append(ttft)
+        self.prompt_tokens.append(prompt_tokens)
+        return FakeLLMStream(
+            self,
+            chat_ctx=chat_ctx,
+            tools=tools or [],
+            conn_options=conn_options,
+            response=next(self._responses),
+            delays=[ttft, *intervals],
+        )
+
+
+class FakeLLMStream(llm.LLMStream):
+    def __init__(
+        self,
+        fake_llm: FakeLLM,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool],
+        conn_options: APIConnectOptions,
+        response: str,
+        delays: list[float],
+    ) -> None:
+        super().__init__(
+            fake_llm, chat_ctx=chat_ctx, tools=tools, conn_options=conn_options
+        )
+        self._response = response
+        self._delays = delays
+
+    async def _run(self) -> None:
+        request_id = utils.shortuuid()
+        words = self._response.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self._delays[min(i, len(self._delays) - 1)])
+            self._event_ch.send_nowait(
+                llm.ChatChunk(
+                    id=request_id,
+                    delta=llm.ChoiceDelta(
+                        role="assistant", content=word if i == 0 else " " + word
+                    ),
+                )
+            )
+
+
+class FakeTTS(tts.TTS):
+    """TTS producing silence, `seconds_per_char` of audio per character.
+
+    The first audio of every segment is produced `ttfb` seconds after its first
+    text, with gaussian `jitter`. The sampled time to first byte of every request
+    is kept in `delays`, its streams in `streams` (`synthesize` goes through a
+    stream too).
+    """
+
+    def __init__(
+        self,
+        *,
+        ttfb: float = 0.15,
+        jitter: float = 0.0,
+        seconds_per_char: float = 0.06,
+        sample_rate: int = SAMPLE_RATE,
+        seed: int = 0,
+    ) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=True),
+            sample_rate=sample_rate,
+            num_channels=1,
+        )
+        self._ttfb = ttfb
+        self._jitter = jitter
+        self._seconds_per_char = seconds_per_char
+        self._rng = random.Random(seed)
+        self.delays: list[float] = []
+        self.streams: list[FakeSynthesizeStream] = []
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "FakeChunkedStream":
+        return FakeChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def stream(
+        self, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS
+    ) -> "FakeSynthesizeStream":
+        ttfb = _sample(self._rng, self._ttfb, self._jitter)
+        self.delays.append(ttfb)
+        stream = FakeSynthesizeStream(tts=self, conn_options=conn_options, ttfb=ttfb)
+        self.streams.append(stream)
+        return stream
+
+
+class FakeSynthesizeStream(tts.SynthesizeStream):
+    """Keeps the text received between two flushes in `segments`."""
+
+    _tts: FakeTTS
+
+    def __init__(
+        self, *, tts: FakeTTS, conn_options: APIConnectOptions, ttfb: float
+    ) -> None:
+        super().__init__(tts=tts, conn_options=conn_options)
+        self._ttfb = ttfb
+        self.segments: list[str] = []
+
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=self._tts.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+            frame_size_ms=int(FRAME_DURATION * 1000),
+            stream=True,
+        )
+
+        started = False
+        segment = ""
+        async for data in self._input_ch:
+            if isinstance(data, self._FlushSentinel):
+                if segment:
+                    self.segments.append(segment)
+                    segment = ""
+                continue
+
+            segment += data
+
+            if not started:
+                started = True
+                self._mark_started()
+                output_emitter.start_segment(segment_id=utils.shortuuid())
+                await asyncio.sleep(self._ttfb)
+
+            num_samples = int(
+                len(data) * self._tts._seconds_per_char * self._tts.sample_rate
+            )
+            output_emitter.push(bytes(num_samples * 2))
+
+        if segment:
+            self.segments.append(segment)
+        if started:
+            output_emitter.end_segment()
+
+
+class FakeChunkedStream(tts.ChunkedStream):
+    """Synthesizes the text through a stream of the fake TTS, like a single segment."""
+
+    _tts: FakeTTS
+
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=self._tts.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+
+        async with self._tts.stream(conn_options=self._conn_options) as stream:
+            stream.push_text(self.input_text)
+            stream.end_input()
+            async for audio in stream:
+                output_emitter.push(audio.frame.data.tobytes())
+
+        output_emitter.flush()
+
+
+class FakeTurnDetector:
+    """End-of-turn model answering `probability` after `delay` seconds."""
+
+    def __init__(self, *, delay: float = 0.05, probability: float = 1.0) -> None:
+        self._delay = delay
+        self._probability = probability
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    async def unlikely_threshold(self, language: str | None) -> float | None:
+        return 0.5
+
+    async def supports_language(self, language: str | None) -> bool:
+        return True
+
+    async def predict_end_of_turn(
+        self, chat_ctx: llm.ChatContext, *, timeout: float | None = None
+    ) -> float:
+        await asyncio.sleep(self._delay)
+        return self._probability
+
+
+class FakeVAD(vad.VAD):
+    """VAD detecting any audio louder than silence as speech.
+
+    Speech starts with the first non-silent frame and ends after `min_silence`
+    seconds of silence. Like the Silero VAD, every frame is reported in an
+    `INFERENCE_DONE` event, the frames of the speech in `START_OF_SPEECH` and
+    `END_OF_SPEECH`, preceded by `prefix_padding` seconds of the audio before it.
+    """
+
+    def __init__(
+        self, *, min_silence: float = 0.2, prefix_padding: float = 0.0
+    ) -> None:
+        super().__init__(
+            capabilities=vad.VADCapabilities(update_interval=FRAME_DURATION)
+        )
+        self._min_silence = min_silence
+        self._prefix_padding = prefix_padding
+
+    @property
+    def model(self) -> str:
+        return "fake"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def stream(self) -> "FakeVADStream":
+        return FakeVADStream(self)
+
+
+class FakeVADStream(vad.VADStream):
+    _vad: FakeVAD
+
+    async def _main_task(self) -> None:
+        speech: list[rtc.AudioFrame] = []
+        padding: collections.deque[rtc.AudioFrame] = collections.deque()
+        speaking, silence, samples_index = False, 0.0, 0
+
+        def _event(event_type: vad.VADEventType, frames: list[rtc.AudioFrame]):
+            self._event_ch.send_nowait(
+                vad.VADEvent(
+                    type=event_type,
+                    samples_index=samples_index,
+                    timestamp=time.time(),
+                    speech_duration=sum(frame.duration for frame in speech),
+                    silence_duration=silence,
+                    frames=frames,
+                    speaking=speaking,
+                )
+            )
+
+        async for frame in self._input_ch:
+            if isinstance(frame, self._FlushSentinel):
+                continue
+
+            samples_index += frame.samples_per_channel
+            # resampled silence isn't all zeros
+            samples = np.frombuffer(frame.data, dtype=np.int16)
+            voiced = bool(samples.size) and int(np.abs(samples).max()) > 64
+            silence = 0.0 if voiced else silence + frame.duration
+            if speaking:
+                speech.append(frame)
+            _event(vad.VADEventType.INFERENCE_DONE, [frame])
+
+            if voiced and not speaking:
+                speaking, speech = True, [*padding, frame]
+                padding.clear()
+                _event(vad.VADEventType.START_OF_SPEECH, list(speech))
+            elif speaking and silence >= self._vad._min_silence:
+                speaking = False
+                _event(vad.VADEventType.END_OF_SPEECH, speech)
+                speech = []
+            elif not speaking and self._vad._prefix_padding > 0:
+                padding.append(frame)
+                while sum(f.duration for f in padding) > self._vad._prefix_padding:
+                    padding.popleft()
+
+
+class FakeAudioInput(io.AudioInput):
+    """Audio input fed by `push_frames`, e.g. with `speech_frames`.
+
+    Like the audio stream of a room, at most `max_queued` frames are buffered
+    when the session doesn't keep up, older frames are dropped and counted in
+    `dropped_frames`.
+    """
+
+    def __init__(self, *, max_queued: int | None = None) -> None:
+        super().__init__(label="Fake")
+        self._audio_ch = aio.Chan[rtc.AudioFrame]()
+        self._max_queued = max_queued
+        self.pushed_frames = 0
+        self.dropped_frames = 0
+
+    async def push_frames(
+        self, frames: Iterator[rtc.AudioFrame], *, realtime: bool = True
+    ) -> None:
+        # paced on the wall clock, so a late wakeup doesn't slow the input down
+        next_at = time.perf_counter()
+        for frame in frames:
+            if self._max_queued and self._audio_ch.qsize() >= self._max_queued:
+                self._audio_ch.recv_nowait()
+                self.dropped_frames += 1
+
+            self._audio_ch.send_nowait(frame)
+            self.pushed_frames += 1
+            if realtime:
+                next_at += frame.duration
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        return await self._audio_ch.__anext__()
+
+    def close(self) -> None:
+        self._audio_ch.close()
+
+
+class FakeAudioOutput(io.AudioOutput):
+    """Audio output discarding the audio after playing it out in real time.
+
+    The time the first frame of every segment was captured and the time the buffer
+    was cleared by an interruption are kept in `first_frame_times` and
+    `clear_times` (`time.perf_counter()`). With `realtime=False`, segments finish
+    playing as soon as they are flushed.
+    """
+
+    def __init__(
+        self, *, realtime: bool = True, sample_rate: int = SAMPLE_RATE
+    ) -> None:
+        super().__init__(
+            label="Fake",
+            capabilities=io.AudioOutputCapabilities(pause=False),
+            sample_rate=sample_rate,
+        )
+        self._realtime = realtime
+        self._pushed_duration = 0.0
+        self._playout_task: asyncio.Task[None] | None = None
+        self._interrupted = asyncio.Event()
+        self.first_frame_times: list[float] = []
+        self.clear_times: list[float] = []
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        if self._playout_task is not None:
+            await self._playout_task
+
+        if not self._pushed_duration:
+            self.first_frame_times.append(time.perf_counter())
+            self._interrupted.clear()
+            self.on_playback_started(created_at=time.time())
+
+        self._pushed_duration += frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        if self._pushed_duration:
+            self._playout_task = asyncio.create_task(self._playout())
+
+    def clear_buffer(self) -> None:
+        if self._pushed_duration:
+            self.clear_times.append(time.perf_counter())
+            self._interrupted.set()
+
+    async def _playout(self) -> None:
+        started_at = self.first_frame_times[-1]
+        remaining = (
+            started_at + self._pushed_duration - time.perf_counter()
+            if self._realtime
+            else 0.0
+        )
+        interrupted = False
+        if remaining > 0:
+            try:
+                await asyncio.wait_for(self._interrupted.wait(), remaining)
+                interrupted = True
+            except asyncio.TimeoutError:
+                pass
+
+        played = min(self._pushed_duration, time.perf_counter() - started_at)
+        self._pushed_duration = 0.0
+        self._playout_task = None
+        self.on_playback_finished(playback_position=played, interrupted=interrupted)
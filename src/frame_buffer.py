@@ -0,0 +1,40 @@
+import ctypes
+
+import numpy as np
+from livekit import rtc
+
+# duration of the chunks of the frames, the frame size of the WebRTC audio processing
+CHUNK_DURATION = 0.01
+
+
+def frame_view(
+    samples: np.ndarray, sample_rate: int, num_channels: int = 1
+) -> rtc.AudioFrame:
+    """An audio frame over the int16 `samples`, without copying them.
+
+    The frame and the array share their memory: writes to one show in the other.
+    `rtc.AudioFrame()` copies the data it's given.
+    """
+    frame = rtc.AudioFrame.__new__(rtc.AudioFrame)
+    frame._data = (ctypes.c_int16 * samples.size).from_buffer(samples)
+    frame._sample_rate = sample_rate
+    frame._num_channels = num_channels
+    frame._samples_per_channel = samples.size // num_channels
+    frame._userdata = {}
+    return frame
+
+
+def chunk_views(frame: rtc.AudioFrame) -> list[rtc.AudioFrame]:
+    """The 10ms chunks of `frame`, sharing its samples.
+
+    Processing the chunks in place processes the frame without copying it. A
+    partial chunk at the end of the frame is left out.
+    """
+    samples = np.frombuffer(frame.data, dtype=np.int16)
+    chunk_size = int(frame.sample_rate * CHUNK_DURATION) * frame.num_channels
+    return [
+        frame_view(
+            samples[start : start + chunk_size], frame.sample_rate, frame.num_channels
+        )
+        for start in range(0, len(samples) - chunk_size + 1, chunk_size)
+    ]
@@ -0,0 +1,284 @@
+import asyncio
+import collections
+import logging
+import time
+from collections.abc import AsyncIterable
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+import prometheus_client
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectionError,
+    APIConnectOptions,
+    NotGivenOr,
+    llm,
+    utils,
+)
+
+logger = logging.getLogger("agent")
+
+HEDGED_REQUESTS = prometheus_client.Counter(
+    "lk_agent_llm_hedged_requests",
+    "LLM requests by provider that answered first, hedged or not",
+    ["winner", "hedged", "nodename"],
+)
+
+
+class TTFTStats:
+    """Times to first token of the last `window` requests sent to a provider."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._samples: collections.deque[float] = collections.deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, ttft: float) -> None:
+        self._samples.append(ttft)
+
+    def quantile(self, q: float) -> float | None:
+        if not self._samples:
+            return None
+        return float(np.quantile(self._samples, q))
+
+
+@dataclass
+class HedgingStats:
+    """Times to first token of the two providers of a `HedgedLLM`.
+
+    A session only sends a few requests, too few to learn a quantile from. Create
+    the stats once per process in `prewarm` and pass them to the `HedgedLLM` of
+    every session, so the deadline is learned over all the calls of the process.
+    """
+
+    primary: TTFTStats = field(default_factory=TTFTStats)
+    secondary: TTFTStats = field(default_factory=TTFTStats)
+
+
+class HedgedLLM(llm.LLM):
+    """Sends a request to a second provider when the first one is slow to answer.
+
+    The request goes to `primary` first. If it hasn't streamed its first token
+    after the deadline, or failed, the same chat context is sent to `secondary`
+    and the reply of whichever answers first is streamed, the other request is
+    cancelled.
+
+    The deadline is the `quantile` of the recent times to first token of the
+    primary, between `min_deadline` and `max_deadline`, and `initial_deadline`
+    until `min_samples` requests were measured. The time waited for a cancelled
+    primary request is counted as its time to first token, a lower bound that
+    keeps the slow requests in the statistics, which are the ones of `stats` when
+    given, or start empty otherwise.
+    """
+
+    def __init__(
+        self,
+        primary: llm.LLM,
+        secondary: llm.LLM,
+        *,
+        quantile: float = 0.95,
+        initial_deadline: float = 1.0,
+        min_deadline: float = 0.2,
+        max_deadline: float = 2.0,
+        min_samples: int = 20,
+        stats: HedgingStats | None = None,
+    ) -> None:
+        super().__init__()
+        self._primary = primary
+        self._secondary = secondary
+        self._quantile = quantile
+        self._initial_deadline = initial_deadline
+        self._min_deadline = min_deadline
+        self._max_deadline = max_deadline
+        self._min_samples = min_samples
+        self.stats = stats or HedgingStats()
+
+        for instance in (primary, secondary):
+            instance.on("metrics_collected", self._on_metrics_collected)
+
+    @property
+    def model(self) -> str:
+        return self._primary.model
+
+    @property
+    def provider(self) -> str:
+        return self._primary.provider
+
+    @property
+    def primary(self) -> llm.LLM:
+        return self._primary
+
+    @property
+    def secondary(self) -> llm.LLM:
+        return self._secondary
+
+    def stats_of(self, instance: llm.LLM) -> TTFTStats:
+        return self.stats.primary if instance is self._primary else self.stats.secondary
+
+    def deadline(self) -> float:
+        stats = self.stats.primary
+        if len(stats) < self._min_samples:
+            return self._initial_deadline
+
+        ttft = stats.quantile(self._quantile) or self._initial_deadline
+        return min(max(ttft, self._min_deadline), self._max_deadline)
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool] | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
+        tool_choice: NotGivenOr[llm.ToolChoice] = NOT_GIVEN,
+        extra_kwargs: NotGivenOr[dict[str, Any]] = NOT_GIVEN,
+    ) -> "HedgedLLMStream":
+        return HedgedLLMStream(
+            self,
+            chat_ctx=chat_ctx,
+            tools=tools or [],
+            conn_options=conn_options,
+            chat_kwargs={
+                "parallel_tool_calls": parallel_tool_calls,
+                "tool_choice": tool_choice,
+                "extra_kwargs": extra_kwargs,
+            },
+        )
+
+    def _on_metrics_collected(self, *args: Any, **kwargs: Any) -> None:
+        self.emit("metrics_collected", *args, **kwargs)
+
+    async def aclose(self) -> None:
+        for instance in (self._primary, self._secondary):
+            instance.off("metrics_collected", self._on_metrics_collected)
+
+
+class _Attempt:
+    """A request streaming its chunks into a queue, until the end or cancelled."""
+
+    def __init__(self, stream: llm.LLMStream, stats: TTFTStats) -> None:
+        self.stream = stream
+        self.chunks: asyncio.Queue[llm.ChatChunk | None] = asyncio.Queue()
+        # resolved when the first chunk arrives
+        self.answered = asyncio.get_running_loop().create_future()
+        self._stats = stats
+        self._started_at = time.perf_counter()
+        self.task = asyncio.create_task(self._run())
+
+    @property
+    def failed(self) -> bool:
+        return self.task.done() and (
+            self.task.cancelled() or self.task.exception() is not None
+        )
+
+    @property
+    def done(self) -> bool:
+        """Whether the request answered or ended, successfully or not."""
+        return self.answered.done() or self.task.done()
+
+    async def wait(self, timeout: float | None = None) -> None:
+        await asyncio.wait(
+            [self.answered, self.task],
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+
+    async def _run(self) -> None:
+        try:
+            async with self.stream:
+                async for chunk in self.stream:
+                    if not self.answered.done():
+                        self._stats.add(time.perf_counter() - self._started_at)
+                        self.answered.set_result(None)
+                    self.chunks.put_nowait(chunk)
+        finally:
+            self.chunks.put_nowait(None)
+
+    async def cancel(self) -> None:
+        if not self.answered.done():
+            self._stats.add(time.perf_counter() - self._started_at)
+        await utils.aio.cancel_and_wait(self.task)
+
+
+class HedgedLLMStream(llm.LLMStream):
+    def __init__(
+        self,
+        hedged_llm: HedgedLLM,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: list[llm.Tool],
+        conn_options: APIConnectOptions,
+        chat_kwargs: dict[str, Any],
+    ) -> None:
+        super().__init__(
+            hedged_llm, chat_ctx=chat_ctx, tools=tools, conn_options=conn_options
+        )
+        self._hedged_llm = hedged_llm
+        self._chat_kwargs = chat_kwargs
+
+    def _attempt(self, instance: llm.LLM) -> _Attempt:
+        stream = instance.chat(
+            chat_ctx=self._chat_ctx,
+            tools=self._tools,
+            conn_options=self._conn_options,
+            **self._chat_kwargs,
+        )
+        return _Attempt(stream, self._hedged_llm.stats_of(instance))
+
+    async def _run(self) -> None:
+        primary = self._attempt(self._hedged_llm.primary)
+        attempts = {primary: self._hedged_llm.primary}
+        try:
+            await primary.wait(timeout=self._hedged_llm.deadline())
+            if not primary.done or primary.failed:
+                logger.debug(
+                    "LLM slow to answer, hedging the request",
+                    extra={"failed": primary.failed},
+                )
+                attempts[self._attempt(self._hedged_llm.secondary)] = (
+                    self._hedged_llm.secondary
+                )
+
+            winner = await self._first_answer(list(attempts))
+            for attempt in attempts:
+                if attempt is not winner:
+                    await attempt.cancel()
+
+            HEDGED_REQUESTS.labels(
+                winner=attempts[winner].label,
+                hedged=str(len(attempts) > 1).lower(),
+                nodename=utils.nodename(),
+            ).inc()
+            while (chunk := await winner.chunks.get()) is not None:
+                self._event_ch.send_nowait(chunk)
+            # raises the error of the request, if any
+            await winner.task
+        finally:
+            for attempt in attempts:
+                await utils.aio.cancel_and_wait(attempt.task)
+
+    async def _first_answer(self, attempts: list[_Attempt]) -> _Attempt:
+        pending = list(attempts)
+        while pending:
+            await asyncio.wait(
+                [f for attempt in pending for f in (attempt.answered, attempt.task)],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for attempt in list(pending):
+                if attempt.failed:
+                    pending.remove(attempt)
+                elif attempt.done:
+                    return attempt
+
+        # every request failed, surface the error of the last one
+        await attempts[-1].task
+        raise APIConnectionError("every LLM request failed")
+
+    async def _metrics_monitor_task(self, event_aiter: AsyncIterable[Any]) -> None:
+        # the metrics are reported by the LLMs the requests were sent to, the
+        # events are still drained so the tee of the stream doesn't keep them
+        async for _ in event_aiter:
+            pass
@@ -0,0 +1,131 @@
+import logging
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import prometheus_client
+from livekit.agents import AgentSession, ConversationItemAddedEvent, llm, utils
+
+logger = logging.getLogger("agent")
+
+_BUCKETS = [0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0]
+
+TURN_STAGE_LATENCY = prometheus_client.Histogram(
+    "lk_agent_turn_stage_seconds",
+    "Latency of each stage of a conversation turn",
+    ["stage", "nodename"],
+    buckets=_BUCKETS,
+)
+
+ROOM_TURN_STAGE_LATENCY = prometheus_client.Histogram(
+    "lk_agent_room_turn_stage_seconds",
+    "Latency of each stage of a conversation turn, per room",
+    ["stage", "room"],
+    buckets=_BUCKETS,
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+@dataclass
+class TurnTimeline:
+    """Timing breakdown of a turn, from the end of the user's speech.
+
+    The delays are in seconds. The framework doesn't report every stage for every
+    turn (e.g. no STT delay for text input), missing stages are None.
+    """
+
+    message_id: str
+    stopped_speaking_at: float | None
+    transcription_delay: float | None
+    end_of_turn_delay: float | None
+    on_user_turn_completed_delay: float | None
+    llm_ttft: float | None
+    tts_ttfb: float | None
+    e2e_latency: float | None
+
+    @classmethod
+    def from_messages(
+        cls, user: llm.ChatMessage | None, assistant: llm.ChatMessage
+    ) -> "TurnTimeline":
+        user_metrics = user.metrics if user is not None else {}
+        metrics = assistant.metrics
+        return cls(
+            message_id=assistant.id,
+            stopped_speaking_at=user_metrics.get("stopped_speaking_at"),
+            transcription_delay=user_metrics.get("transcription_delay"),
+            end_of_turn_delay=user_metrics.get("end_of_turn_delay"),
+            on_user_turn_completed_delay=user_metrics.get(
+                "on_user_turn_completed_delay"
+            ),
+            llm_ttft=metrics.get("llm_node_ttft"),
+            tts_ttfb=metrics.get("tts_node_ttfb"),
+            e2e_latency=metrics.get("e2e_latency"),
+        )
+
+    def stages(self) -> dict[str, float]:
+        stages = asdict(self)
+        del stages["message_id"], stages["stopped_speaking_at"]
+        return {stage: value for stage, value in stages.items() if value is not None}
+
+
+class LatencyCollector:
+    """Records the timing breakdown of every turn of an `AgentSession`.
+
+    Each turn is observed in the `lk_agent_turn_stage_seconds` histogram, exported
+    by the agent server on `/metrics` when a Prometheus port is configured. With
+    `per_room`, turns are also observed in a histogram labelled by room (one time
+    series per room, keep it off on busy deployments).
+    """
+
+    def __init__(self, room: str, *, per_room: bool = False) -> None:
+        self._room = room
+        self._per_room = per_room
+        self._last_user_message: llm.ChatMessage | None = None
+        self.turns: list[TurnTimeline] = []
+
+    def attach(self, session: AgentSession) -> None:
+        session.on("conversation_item_added", self._on_conversation_item_added)
+
+    def _on_conversation_item_added(self, ev: ConversationItemAddedEvent) -> None:
+        item = ev.item
+        if not isinstance(item, llm.ChatMessage):
+            return
+
+        if item.role == "user":
+            self._last_user_message = item
+        elif item.role == "assistant":
+            self.record(TurnTimeline.from_messages(self._last_user_message, item))
+            self._last_user_message = None
+
+    def record(self, turn: TurnTimeline) -> None:
+        self.turns.append(turn)
+        nodename = utils.nodename()
+        for stage, value in turn.stages().items():
+            TURN_STAGE_LATENCY.labels(stage=stage, nodename=nodename).observe(value)
+            if self._per_room:
+                ROOM_TURN_STAGE_LATENCY.labels(stage=stage, room=self._room).observe(
+                    value
+                )
+
+        logger.debug("turn latency", extra=turn.stages())
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """p50/p95/p99 of every stage over the turns recorded so far."""
+        values: dict[str, list[float]] = {}
+        for turn in self.turns:
+            for stage, value in turn.stages().items():
+                values.setdefault(stage, []).append(value)
+
+        return {
+            stage: {
+                f"p{int(q * 100)}": float(np.quantile(samples, q)) for q in QUANTILES
+            }
+            for stage, samples in values.items()
+        }
+
+    async def log_summary(self) -> None:
+        if self.turns:
+            logger.info(
+                "session latency summary",
+                extra={"turns": len(self.turns), "latency": self.summary()},
+            )
@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import wave
+from collections.abc import Callable, Iterator, Sequence
+from pathlib import Path
+
+import numpy as np
+import psutil
+from livekit import rtc
+from livekit.agents import Agent, AgentSession, vad
+
+from fakes import (
+    FRAME_DURATION,
+    FakeAudioInput,
+    FakeAudioOutput,
+    FakeLLM,
+    FakeSTT,
+    FakeTTS,
+    silence_frames,
+    speech_frames,
+)
+from session_profile import SIP_PROFILE, WEBRTC_PROFILE, SessionProfile
+from shared_models import load_vad
+from turn_detection import PrewarmedTurnDetector
+
+logger = logging.getLogger("agent")
+
+TRANSCRIPTS = [
+    "Hi, I'd like to know your opening hours.",
+    "Do you have any availability tomorrow afternoon?",
+    "Thanks, that's all I needed.",
+]
+RESPONSES = [
+    "Of course! We're open from nine to six, Monday to Friday.",
+    "Let me check. Yes, we have a slot at three in the afternoon.",
+    "You're welcome, have a great day!",
+]
+
+# frames buffered by the input of a room before older ones are dropped
+_MAX_QUEUED_FRAMES = 10
+_LAG_PROBE_INTERVAL = 0.05
+
+PROFILES = {"webrtc": WEBRTC_PROFILE, "sip": SIP_PROFILE}
+
+
+def wav_frames(
+    path: Path | str,
+    *,
+    sample_rate: int | None = None,
+    frame_duration: float = FRAME_DURATION,
+) -> list[rtc.AudioFrame]:
+    """Read a 16-bit mono WAV file as 20ms frames, resampled to `sample_rate`."""
+    with wave.open(str(path), "rb") as f:
+        if f.getsampwidth() != 2 or f.getnchannels() != 1:
+            raise ValueError(f"{path} must be a 16-bit mono WAV file")
+        file_rate = f.getframerate()
+        audio = f.readframes(f.getnframes())
+
+    if sample_rate is not None and sample_rate != file_rate:
+        resampler = rtc.AudioResampler(file_rate, sample_rate)
+        frame = rtc.AudioFrame(audio, file_rate, 1, len(audio) // 2)
+        audio = b"".join(
+            bytes(out.data) for out in [*resampler.push(frame), *resampler.flush()]
+        )
+    sample_rate = sample_rate or file_rate
+
+    samples_per_frame = int(sample_rate * frame_duration)
+    bytes_per_frame = samples_per_frame * 2
+    return [
+        rtc.AudioFrame(
+            audio[offset : offset + bytes_per_frame],
+            sample_rate,
+            1,
+            samples_per_frame,
+        )
+        for offset in range(0, len(audio) - bytes_per_frame + 1, bytes_per_frame)
+    ]
+
+
+class _LagProbe:
+    """Measures how late the event loop wakes up a sleeping task."""
+
+    def __init__(self) -> None:
+        self.lags: list[float] = []
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(_LAG_PROBE_INTERVAL)
+            self.lags.append(time.perf_counter() - started_at - _LAG_PROBE_INTERVAL)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+async def _simulate_room(
+    index: int,
+    *,
+    agent_factory: Callable[[], Agent],
+    utterance: Sequence[rtc.AudioFrame],
+    vad_model: vad.VAD,
+    turn_detector: PrewarmedTurnDetector | None,
+    profile: SessionProfile,
+    duration: float,
+    inputs: list[FakeAudioInput],
+    response_latencies: list[float],
+) -> None:
+    rng = random.Random(index)
+    audio_input = FakeAudioInput(max_queued=_MAX_QUEUED_FRAMES)
+    inputs.append(audio_input)
+    session = AgentSession(
+        stt=FakeSTT(TRANSCRIPTS, latency=0.15, jitter=0.03, seed=index),
+        llm=FakeLLM(RESPONSES, ttft=0.3, jitter=0.05, seed=index),
+        tts=FakeTTS(
+            ttfb=0.2, jitter=0.03, sample_rate=profile.audio.output_rate, seed=index
+        ),
+        vad=profile.vad(vad_model),
+        turn_detection=turn_detector.model() if turn_detector else "stt",
+        min_endpointing_delay=profile.min_endpointing_delay,
+        max_endpointing_delay=profile.max_endpointing_delay,
+        preemptive_generation=True,
+    )
+    audio_output = FakeAudioOutput(realtime=True, sample_rate=profile.audio.output_rate)
+    session.input.audio = audio_input
+    session.output.audio = audio_output
+
+    def _silence(duration: float) -> Iterator[rtc.AudioFrame]:
+        return silence_frames(
+            duration,
+            sample_rate=profile.audio.input_rate,
+            frame_duration=profile.frame_size_ms / 1000,
+        )
+
+    async with session:
+        await session.start(agent_factory())
+        # stagger the rooms so they don't all speak at the same time
+        await audio_input.push_frames(_silence(rng.uniform(0.0, 2.0)))
+
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            await audio_input.push_frames(iter(utterance))
+            ended_at = time.perf_counter()
+            await audio_input.push_frames(_silence(rng.uniform(3.0, 5.0)))
+            # the first reply played after the end of the utterance, if any
+            replies = [t for t in audio_output.first_frame_times if t > ended_at]
+            if replies:
+                response_latencies.append(replies[0] - ended_at)
+
+        audio_input.close()
+
+
+def _utterance(audio_path: str | None, profile: SessionProfile) -> list[rtc.AudioFrame]:
+    sample_rate = profile.audio.input_rate
+    frame_duration = profile.frame_size_ms / 1000
+    if audio_path:
+        return wav_frames(
+            audio_path, sample_rate=sample_rate, frame_duration=frame_duration
+        )
+
+    logger.warning(
+        "no recording given, VAD won't detect the synthetic speech and the turns "
+        "are only driven by the STT"
+    )
+    return list(
+        speech_frames(1.5, sample_rate=sample_rate, frame_duration=frame_duration)
+    )
+
+
+async def _run_stage(
+    num_sessions: int,
+    *,
+    agent_factory: Callable[[], Agent],
+    utterance: Sequence[rtc.AudioFrame],
+    vad_model: vad.VAD,
+    turn_detector: PrewarmedTurnDetector | None,
+    profile: SessionProfile,
+    duration: float,
+) -> dict:
+    process = psutil.Process(os.getpid())
+    rss_before = process.memory_info().rss
+    cpu_before = process.cpu_times()
+    started_at = time.perf_counter()
+
+    probe = _LagProbe()
+    probe.start()
+    inputs: list[FakeAudioInput] = []
+    response_latencies: list[float] = []
+    await asyncio.gather(
+        *(
+            _simulate_room(
+                i,
+                agent_factory=agent_factory,
+                utterance=utterance,
+                vad_model=vad_model,
+                turn_detector=turn_detector,
+                profile=profile,
+                duration=duration,
+                inputs=inputs,
+                response_latencies=response_latencies,
+            )
+            for i in range(num_sessions)
+        )
+    )
+    await probe.stop()
+
+    elapsed = time.perf_counter() - started_at
+    cpu_after = process.cpu_times()
+    cpu = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    pushed = sum(audio_input.pushed_frames for audio_input in inputs)
+    dropped = sum(audio_input.dropped_frames for audio_input in inputs)
+    return {
+        "sessions": num_sessions,
+        "cpu_percent_per_session": cpu / elapsed / num_sessions * 100,
+        "rss_mb_per_session": (process.memory_info().rss - rss_before)
+        / num_sessions
+        / 2**20,
+        "event_loop_lag_ms": {
+            "p50": float(np.quantile(probe.lags, 0.5)) * 1000,
+            "p99": float(np.quantile(probe.lags, 0.99)) * 1000,
+            "max": max(probe.lags) * 1000,
+        },
+        "frame_drop_rate": dropped / pushed if pushed else 0.0,
+        "response_latency_ms": {
+            "p50": float(np.quantile(response_latencies, 0.5)) * 1000,
+            "p95": float(np.quantile(response_latencies, 0.95)) * 1000,
+        }
+        if response_latencies
+        else None,
+    }
+
+
+async def _run(
+    args: argparse.Namespace, agent_factory: Callable[[], Agent]
+) -> list[dict]:
+    profile = PROFILES[args.profile]
+    utterance = _utterance(args.audio, profile)
+    vad_model = load_vad()
+    turn_detector = None if args.no_turn_detector else PrewarmedTurnDetector.load()
+
+    results = []
+    for num_sessions in args.sessions:
+        stage = await _run_stage(
+            num_sessions,
+            agent_factory=agent_factory,
+            utterance=utterance,
+            vad_model=vad_model,
+            turn_detector=turn_detector,
+            profile=profile,
+            duration=args.duration,
+        )
+        logger.info("load test stage done", extra=stage)
+        results.append(stage)
+
+    return results
+
+
+def main(argv: Sequence[str], *, agent_factory: Callable[[], Agent]) -> None:
+    """Entry point of the `loadtest` subcommand of `agent.py`.
+
+    A single-process stress test: every stage runs all its sessions in this
+    process, on a single event loop. The agent server runs each session in a job
+    process of its own, so the results measure the per-session cost of the
+    pipeline and when an event loop saturates, not the capacity of a host (they
+    leave out the memory of a process per session, its prewarmed models and the
+    IPC with the server).
+    """
+    parser = argparse.ArgumentParser(
+        prog="agent.py loadtest",
+        description="Single-process stress test: run simulated rooms against mocked "
+        "providers on one event loop and report the resources used per session as "
+        "the number of sessions grows.",
+    )
+    parser.add_argument(
+        "--sessions",
+        type=lambda value: [int(n) for n in value.split(",")],
+        default=[1, 5, 10, 20],
+        help="comma separated number of concurrent sessions of every stage",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30.0, help="seconds every stage runs for"
+    )
+    parser.add_argument("--audio", help="16-bit mono WAV recording of a user utterance")
+    parser.add_argument(
+        "--no-turn-detector",
+        action="store_true",
+        help="detect the end of turns with the STT instead of the turn detector",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=sorted(PROFILES),
+        default="webrtc",
+        help="pipeline profile of the sessions, as for participants of this kind",
+    )
+    parser.add_argument("--output", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    results = asyncio.run(_run(args, agent_factory))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,307 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Protocol, TypeVar
+
+from livekit import rtc
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectOptions,
+    NotGivenOr,
+    stt,
+    utils,
+    vad,
+)
+
+logger = logging.getLogger("agent")
+
+_T = TypeVar("_T")
+
+
+class LocalUtterance(Protocol):
+    """Recognition of one utterance, fed with its audio while it's spoken."""
+
+    def accept(self, pcm: bytes) -> str:
+        """Transcript so far, after the 16-bit mono PCM `pcm` (blocking)."""
+        ...
+
+    def finish(self) -> str:
+        """Final transcript of the utterance (blocking)."""
+        ...
+
+
+class LocalRecognizer(Protocol):
+    """Speech recognition engine running on the CPU of the host."""
+
+    @property
+    def sample_rate(self) -> int: ...
+
+    def utterance(self) -> LocalUtterance: ...
+
+
+class _VoskUtterance:
+    def __init__(self, recognizer) -> None:
+        self._recognizer = recognizer
+        # parts of the utterance Vosk already finalized, after a short pause
+        self._segments: list[str] = []
+
+    def accept(self, pcm: bytes) -> str:
+        partial = ""
+        if self._recognizer.AcceptWaveform(pcm):
+            self._segments.append(json.loads(self._recognizer.Result())["text"])
+        else:
+            partial = json.loads(self._recognizer.PartialResult())["partial"]
+        return " ".join(text for text in [*self._segments, partial] if text)
+
+    def finish(self) -> str:
+        self._segments.append(json.loads(self._recognizer.FinalResult())["text"])
+        return " ".join(text for text in self._segments if text)
+
+
+class VoskRecognizer:
+    """Vosk (Kaldi) streaming recognizer, with partial results while the user speaks.
+
+    Requires the `local-stt` extra (`uv sync --extra local-stt`) and a model, for
+    example `vosk-model-small-en-us-0.15`. The model is shared read-only by the
+    utterances of every session of the process.
+    """
+
+    def __init__(self, model, *, sample_rate: int = 16000) -> None:
+        from vosk import KaldiRecognizer
+
+        self._model = model
+        self._sample_rate = sample_rate
+        self._kaldi_recognizer = KaldiRecognizer
+
+    @classmethod
+    def load(cls, model_path: Path | str) -> "VoskRecognizer":
+        """Load the model and recognize a first utterance (blocking, call from `prewarm`)."""
+        try:
+            import vosk
+        except ImportError as e:
+            raise RuntimeError(
+                "the local STT requires vosk, install the `local-stt` extra"
+            ) from e
+
+        started_at = time.perf_counter()
+        vosk.SetLogLevel(-1)
+        recognizer = cls(vosk.Model(str(model_path)))
+        utterance = recognizer.utterance()
+        utterance.accept(bytes(recognizer.sample_rate))
+        utterance.finish()
+
+        logger.info(
+            "local STT model loaded",
+            extra={
+                "model": str(model_path),
+                "duration": round(time.perf_counter() - started_at, 3),
+            },
+        )
+        return recognizer
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sample_rate
+
+    def utterance(self) -> _VoskUtterance:
+        return _VoskUtterance(self._kaldi_recognizer(self._model, self._sample_rate))
+
+
+class LocalSTT(stt.STT):
+    """Streaming STT running a `LocalRecognizer` on the host, for when the remote STT
+    is degraded.
+
+    Only the speech detected by `vad` is recognized, so silence costs no CPU:
+    interim transcripts are emitted while the user speaks and the final transcript
+    at the end of the speech. Recognition runs on a thread of the instance.
+    """
+
+    def __init__(
+        self, recognizer: LocalRecognizer, *, vad: vad.VAD, language: str = "en"
+    ) -> None:
+        super().__init__(
+            capabilities=stt.STTCapabilities(streaming=True, interim_results=True)
+        )
+        self._recognizer = recognizer
+        self._vad = vad
+        self._language = language
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-stt")
+
+    @property
+    def model(self) -> str:
+        return type(self._recognizer).__name__
+
+    @property
+    def provider(self) -> str:
+        return "local"
+
+    async def _run_in_pool(self, fnc: Callable[..., _T], *args) -> _T:
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fnc, *args)
+
+    def _language_or_default(self, language: NotGivenOr[str]) -> str:
+        return language if utils.is_given(language) else self._language
+
+    async def _recognize_impl(
+        self,
+        buffer: utils.AudioBuffer,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> stt.SpeechEvent:
+        frame = rtc.combine_audio_frames(buffer)
+        frames = [frame]
+        if frame.sample_rate != self._recognizer.sample_rate:
+            resampler = rtc.AudioResampler(
+                frame.sample_rate,
+                self._recognizer.sample_rate,
+                quality=rtc.AudioResamplerQuality.HIGH,
+            )
+            frames = [*resampler.push(frame), *resampler.flush()]
+
+        def _recognize(pcm: bytes) -> str:
+            utterance = self._recognizer.utterance()
+            utterance.accept(pcm)
+            return utterance.finish()
+
+        text = await self._run_in_pool(_recognize, _pcm(frames))
+        return _speech_event(
+            stt.SpeechEventType.FINAL_TRANSCRIPT,
+            text,
+            self._language_or_default(language),
+        )
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "LocalSpeechStream":
+        return LocalSpeechStream(
+            stt=self,
+            conn_options=conn_options,
+            sample_rate=self._recognizer.sample_rate,
+            language=self._language_or_default(language),
+        )
+
+    async def aclose(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class LocalSpeechStream(stt.RecognizeStream):
+    _stt: LocalSTT
+
+    def __init__(
+        self,
+        *,
+        stt: LocalSTT,
+        conn_options: APIConnectOptions,
+        sample_rate: int,
+        language: str,
+    ) -> None:
+        super().__init__(stt=stt, conn_options=conn_options, sample_rate=sample_rate)
+        self._language = language
+
+    async def _run(self) -> None:
+        vad_stream = self._stt._vad.stream()
+
+        async def _forward_input() -> None:
+            async for frame in self._input_ch:
+                if isinstance(frame, self._FlushSentinel):
+                    vad_stream.flush()
+                    continue
+                vad_stream.push_frame(frame)
+            vad_stream.end_input()
+
+        async def _recognize() -> None:
+            utterance: LocalUtterance | None = None
+            interim = ""
+
+            async def _finish() -> None:
+                assert utterance is not None
+                if text := await self._stt._run_in_pool(utterance.finish):
+                    self._send(stt.SpeechEventType.FINAL_TRANSCRIPT, text)
+                self._send(stt.SpeechEventType.END_OF_SPEECH)
+
+            async def _accept(frames: Sequence[rtc.AudioFrame]) -> None:
+                nonlocal interim
+                assert utterance is not None
+                text = await self._stt._run_in_pool(utterance.accept, _pcm(frames))
+                if text and text != interim:
+                    interim = text
+                    self._send(stt.SpeechEventType.INTERIM_TRANSCRIPT, text)
+
+            async for ev in vad_stream:
+                if ev.type == vad.VADEventType.START_OF_SPEECH:
+                    utterance, interim = self._stt._recognizer.utterance(), ""
+                    self._send(stt.SpeechEventType.START_OF_SPEECH)
+                    # the frames of the speech detected so far and the padding
+                    # before it, reported before the utterance started
+                    await _accept(ev.frames)
+                elif ev.type == vad.VADEventType.END_OF_SPEECH and utterance:
+                    await _finish()
+                    utterance = None
+                elif ev.type == vad.VADEventType.INFERENCE_DONE and utterance:
+                    await _accept(ev.frames)
+
+            # the input ended while the user was speaking
+            if utterance is not None:
+                await _finish()
+
+        tasks = [
+            asyncio.create_task(_forward_input(), name="forward_input"),
+            asyncio.create_task(_recognize(), name="recognize"),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await utils.aio.cancel_and_wait(*tasks)
+            await vad_stream.aclose()
+
+    def _send(self, event_type: stt.SpeechEventType, text: str = "") -> None:
+        self._event_ch.send_nowait(_speech_event(event_type, text, self._language))
+
+
+def _speech_event(
+    event_type: stt.SpeechEventType, text: str, language: str
+) -> stt.SpeechEvent:
+    alternatives = [stt.SpeechData(language=language, text=text)] if text else []
+    return stt.SpeechEvent(type=event_type, alternatives=alternatives)
+
+
+def _pcm(frames: Sequence[rtc.AudioFrame]) -> bytes:
+    return b"".join(frame.data.tobytes() for frame in frames)
+
+
+def _words(text: str) -> list[str]:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word substitutions, deletions and insertions over the words of `reference`.
+
+    Case and punctuation are ignored.
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+
+    # edit distance between the first i words of `ref` and the words of `hyp`
+    distances = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, distances[j] = (
+                distances[j],
+                min(
+                    distances[j] + 1,
+                    distances[j - 1] + 1,
+                    previous + (ref_word != hyp_word),
+                ),
+            )
+    return distances[-1] / len(ref)
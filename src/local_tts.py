@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Protocol
+
+from livekit import rtc
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    APIConnectOptions,
+    tts,
+    utils,
+)
+
+logger = logging.getLogger("agent")
+
+_WARMUP_TEXT = "Hello, how can I help you today?"
+
+
+class LocalVoice(Protocol):
+    """Speech synthesis engine running on the CPU of the host."""
+
+    @property
+    def sample_rate(self) -> int: ...
+
+    def synthesize(self, text: str) -> Iterator[bytes]:
+        """16-bit mono PCM of `text`, yielded as it's synthesized (blocking)."""
+        ...
+
+
+class PiperVoice:
+    """Piper voice (VITS exported to ONNX), yielding the audio sentence by sentence.
+
+    Requires the `local-tts` extra (`uv sync --extra local-tts`) and a voice model,
+    for example `en_US-lessac-medium.onnx` with its `.onnx.json` config next to it.
+    """
+
+    def __init__(self, voice) -> None:
+        self._voice = voice
+
+    @classmethod
+    def load(cls, model_path: Path | str) -> "PiperVoice":
+        """Load the model and synthesize a first sentence (blocking, call from `prewarm`)."""
+        try:
+            from piper import PiperVoice as _PiperVoice
+        except ImportError as e:
+            raise RuntimeError(
+                "the local TTS requires piper-tts, install the `local-tts` extra"
+            ) from e
+
+        started_at = time.perf_counter()
+        voice = cls(_PiperVoice.load(str(model_path)))
+        for _ in voice.synthesize(_WARMUP_TEXT):
+            pass
+
+        logger.info(
+            "local TTS voice loaded",
+            extra={
+                "model": str(model_path),
+                "duration": round(time.perf_counter() - started_at, 3),
+            },
+        )
+        return voice
+
+    @property
+    def sample_rate(self) -> int:
+        return self._voice.config.sample_rate
+
+    def synthesize(self, text: str) -> Iterator[bytes]:
+        for chunk in self._voice.synthesize(text):
+            yield chunk.audio_int16_bytes
+
+
+class LocalTTS(tts.TTS):
+    """TTS running a `LocalVoice` on the host, for when the remote TTS is degraded.
+
+    Synthesis runs on a thread of the instance, `max_concurrency` sentences at a
+    time, and every chunk of audio is pushed as soon as the voice yields it.
+    Text is synthesized sentence by sentence (the framework wraps non-streaming TTS
+    in a `StreamAdapter`). The audio is resampled to `sample_rate`, the rate of the
+    voice by default.
+    """
+
+    def __init__(
+        self,
+        voice: LocalVoice,
+        *,
+        sample_rate: int | None = None,
+        max_concurrency: int = 1,
+    ) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=sample_rate or voice.sample_rate,
+            num_channels=1,
+        )
+        self._voice = voice
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="local-tts"
+        )
+
+    @property
+    def model(self) -> str:
+        return type(self._voice).__name__
+
+    @property
+    def provider(self) -> str:
+        return "local"
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "LocalChunkedStream":
+        return LocalChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    async def aclose(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class LocalChunkedStream(tts.ChunkedStream):
+    _tts: LocalTTS
+
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=self._tts.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+            frame_size_ms=20,
+        )
+
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue[bytes | Exception | None] = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def _synthesize() -> None:
+            # runs on a thread of the pool, hands the chunks to the event loop
+            try:
+                for chunk in self._tts._voice.synthesize(self._input_text):
+                    if cancelled.is_set():
+                        return
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+        voice_rate = self._tts._voice.sample_rate
+        resampler = (
+            rtc.AudioResampler(voice_rate, self._tts.sample_rate)
+            if voice_rate != self._tts.sample_rate
+            else None
+        )
+        loop.run_in_executor(self._tts._pool, _synthesize)
+        try:
+            while (chunk := await chunks.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if resampler is None:
+                    output_emitter.push(chunk)
+                    continue
+                frame = rtc.AudioFrame(chunk, voice_rate, 1, len(chunk) // 2)
+                for resampled in resampler.push(frame):
+                    output_emitter.push(resampled.data.tobytes())
+            if resampler is not None:
+                for resampled in resampler.flush():
+                    output_emitter.push(resampled.data.tobytes())
+            output_emitter.flush()
+        finally:
+            # the thread stops after the chunk it's synthesizing
+            cancelled.set()
@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import tempfile
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable
+from pathlib import Path
+
+import aiohttp
+from livekit import rtc
+from livekit.agents import Plugin, tts, utils
+
+from response_cache import normalize_text
+
+logger = logging.getLogger("agent")
+
+_INDEX_FILE = "index.json"
+# duration of the audio frames streamed from the cache
+_FRAME_DURATION = 0.02
+# end of a phrase the rest of a reply can follow
+_PHRASE_END = re.compile(r"[.!?,;:](?=\s|$)")
+
+
+class PhraseCache:
+    """On-disk cache of the audio of phrases the agent says in every call.
+
+    Each phrase is stored as raw 16-bit PCM in its own file, keyed on the TTS model,
+    voice, sample rate and normalized text. Cached audio is memory-mapped and
+    streamed in 20ms frames, so a hit starts playing without any TTS round trip.
+    A reply starting with a phrase (a greeting or a filler before the answer)
+    plays the phrase from the cache while the rest is synthesized.
+    """
+
+    def __init__(
+        self,
+        directory: Path | str,
+        *,
+        model: str,
+        voice: str,
+        sample_rate: int,
+        num_channels: int = 1,
+    ) -> None:
+        self._directory = Path(directory)
+        self._model = model
+        self._voice = voice
+        self._sample_rate = sample_rate
+        self._num_channels = num_channels
+
+        self._phrases: dict[str, str] = {}  # normalized text -> file name
+        index_path = self._directory / _INDEX_FILE
+        if index_path.is_file():
+            with open(index_path) as f:
+                for file_name, entry in json.load(f).items():
+                    if self._matches(entry):
+                        self._phrases[normalize_text(entry["text"])] = file_name
+
+    def _matches(self, entry: dict) -> bool:
+        return (
+            entry["model"] == self._model
+            and entry["voice"] == self._voice
+            and entry["sample_rate"] == self._sample_rate
+            and entry["num_channels"] == self._num_channels
+        )
+
+    def _file_name(self, text: str) -> str:
+        key = "\0".join(
+            [
+                self._model,
+                self._voice,
+                str(self._sample_rate),
+                str(self._num_channels),
+                normalize_text(text),
+            ]
+        )
+        return hashlib.sha256(key.encode()).hexdigest() + ".pcm"
+
+    def __contains__(self, text: str) -> bool:
+        return normalize_text(text) in self._phrases
+
+    def is_prefix(self, text: str) -> bool:
+        """Whether the text is the beginning of a cached phrase."""
+        prefix = normalize_text(text)
+        return any(phrase.startswith(prefix) for phrase in self._phrases)
+
+    def frames(self, text: str) -> Iterable[rtc.AudioFrame] | None:
+        file_name = self._phrases.get(normalize_text(text))
+        if file_name is None:
+            return None
+
+        try:
+            with open(self._directory / file_name, "rb") as f:
+                audio = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        return self._iter_frames(audio)
+
+    def _iter_frames(self, audio: mmap.mmap) -> Iterable[rtc.AudioFrame]:
+        samples_per_frame = int(self._sample_rate * _FRAME_DURATION)
+        bytes_per_frame = samples_per_frame * self._num_channels * 2
+        with audio, memoryview(audio) as view:
+            for offset in range(0, len(view), bytes_per_frame):
+                chunk = view[offset : offset + bytes_per_frame]
+                yield rtc.AudioFrame(
+                    data=chunk,
+                    sample_rate=self._sample_rate,
+                    num_channels=self._num_channels,
+                    samples_per_channel=len(chunk) // (2 * self._num_channels),
+                )
+                chunk.release()
+
+    def put(self, text: str, frames: Iterable[rtc.AudioFrame]) -> None:
+        file_name = self._file_name(text)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        _atomic_write(
+            self._directory / file_name,
+            b"".join(bytes(frame.data) for frame in frames),
+        )
+
+        index_path = self._directory / _INDEX_FILE
+        index = {}
+        if index_path.is_file():
+            with open(index_path) as f:
+                index = json.load(f)
+        index[file_name] = {
+            "model": self._model,
+            "voice": self._voice,
+            "sample_rate": self._sample_rate,
+            "num_channels": self._num_channels,
+            "text": text,
+        }
+        _atomic_write(index_path, json.dumps(index, indent=2).encode())
+        self._phrases[normalize_text(text)] = file_name
+
+    async def populate(self, tts_engine: tts.TTS, phrases: Iterable[str]) -> None:
+        """Synthesize the phrases that aren't cached yet."""
+        for text in phrases:
+            if text in self:
+                continue
+
+            frames = []
+            async with tts_engine.stream() as stream:
+                stream.push_text(text)
+                stream.end_input()
+                async for ev in stream:
+                    frames.append(ev.frame)
+
+            if frames and frames[0].sample_rate != self._sample_rate:
+                raise ValueError(
+                    f"TTS produced {frames[0].sample_rate}Hz audio, "
+                    f"expected {self._sample_rate}Hz"
+                )
+
+            self.put(text, frames)
+            logger.info("cached phrase audio", extra={"text": text})
+
+    def cached_prefix(self, text: str) -> int:
+        """Length of the longest cached phrase `text` starts with, 0 if none.
+
+        Phrases only end at a punctuation mark followed by a space or the end of
+        the text, the rest of the text starts a new clause.
+        """
+        for match in reversed(list(_PHRASE_END.finditer(text))):
+            if normalize_text(text[: match.end()]) in self._phrases:
+                return match.end()
+        return 0
+
+    async def tts_node(
+        self,
+        text: AsyncIterable[str],
+        synthesize: Callable[[AsyncIterable[str]], AsyncIterable[rtc.AudioFrame]],
+    ) -> AsyncIterator[rtc.AudioFrame]:
+        """TTS node streaming the cached phrase a reply starts with, if any.
+
+        The rest of the reply is synthesized, e.g. "Sure, one moment." is streamed
+        from the cache and "The store opens at nine." sent to the TTS. Text is only
+        held back while it could still be a cached phrase, so responses that don't
+        start with one reach the TTS without added latency.
+        """
+        text_iter = text.__aiter__()
+        buffered = ""
+        ended = False
+        while self._phrases:
+            try:
+                buffered += await text_iter.__anext__()
+            except StopAsyncIteration:
+                ended = True
+                break
+
+            if not self.is_prefix(buffered):
+                break
+
+        async def _replay(buffered: str) -> AsyncIterator[str]:
+            if buffered:
+                yield buffered
+            if not ended:
+                async for chunk in text_iter:
+                    yield chunk
+
+        split = self.cached_prefix(buffered) if self._phrases else 0
+        frames = self.frames(buffered[:split]) if split else None
+        if frames is None:
+            async for frame in synthesize(_replay(buffered)):
+                yield frame
+            return
+
+        rest = buffered[split:].lstrip()
+        if ended and not rest:
+            for frame in frames:
+                yield frame
+            return
+
+        # the rest is synthesized while the phrase plays
+        synthesized = utils.aio.Chan[rtc.AudioFrame]()
+
+        async def _synthesize_rest() -> None:
+            try:
+                async for frame in synthesize(_replay(rest)):
+                    synthesized.send_nowait(frame)
+            finally:
+                synthesized.close()
+
+        synthesize_task = asyncio.create_task(_synthesize_rest())
+        try:
+            for frame in frames:
+                yield frame
+            async for frame in synthesized:
+                yield frame
+            # raises the error of the synthesis, if any
+            await synthesize_task
+        finally:
+            await utils.aio.cancel_and_wait(synthesize_task)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_phrases(path: Path | str) -> list[str]:
+    """Read a phrase list, one phrase per line, empty lines and # comments skipped."""
+    with open(path) as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+class PhraseCachePlugin(Plugin):
+    """Synthesizes the phrase list when running the `download-files` command."""
+
+    def __init__(
+        self,
+        *,
+        tts_factory: Callable[[aiohttp.ClientSession], tts.TTS],
+        cache_factory: Callable[[tts.TTS], PhraseCache],
+        phrases_path: Path | str,
+    ) -> None:
+        super().__init__("phrase_cache", "1.0.0", "phrase_cache", logger)
+        self._tts_factory = tts_factory
+        self._cache_factory = cache_factory
+        self._phrases_path = phrases_path
+
+    def download_files(self) -> None:
+        async def _populate() -> None:
+            async with aiohttp.ClientSession() as http_session:
+                tts_engine = self._tts_factory(http_session)
+                try:
+                    await self._cache_factory(tts_engine).populate(
+                        tts_engine, load_phrases(self._phrases_path)
+                    )
+                finally:
+                    await tts_engine.aclose()
+
+        asyncio.run(_populate())
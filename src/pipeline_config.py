@@ -0,0 +1,180 @@
+import dataclasses
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Any
+
+from session_profile import SIP_PROFILE, SessionProfile
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+logger = logging.getLogger("agent")
+
+
+@dataclasses.dataclass(frozen=True)
+class PipelineConfig:
+    """Providers, voice and turn settings of the sessions, read from a TOML file.
+
+    The turn settings left unset are the ones of the profile of the session, see
+    `profile`.
+    """
+
+    stt_model: str = "nova-2"
+    """Deepgram model of the WebRTC participants."""
+    stt_sip_model: str = "nova-2-phonecall"
+    """Deepgram model of the SIP participants, with the telephony profile."""
+    llm_model: str = "llama-3.3-70b-versatile"
+    tts_model: str = "cartesia/sonic-3"
+    tts_voice: str = "9626c31c-bec5-4cca-baa8-f8ba9e84c8bc"
+    min_endpointing_delay: float | None = None
+    max_endpointing_delay: float | None = None
+    preemptive_generation: bool = True
+
+    def profile(self, profile: SessionProfile) -> SessionProfile:
+        """`profile` with the STT model and the turn settings of this config.
+
+        A delay set alone can contradict the other one of the profile (a minimum
+        above its maximum): the delays of the config are then logged and ignored.
+        """
+        min_delay = (
+            profile.min_endpointing_delay
+            if self.min_endpointing_delay is None
+            else self.min_endpointing_delay
+        )
+        max_delay = (
+            profile.max_endpointing_delay
+            if self.max_endpointing_delay is None
+            else self.max_endpointing_delay
+        )
+        if not 0 < min_delay <= max_delay:
+            logger.warning(
+                "invalid endpointing delays, keeping the ones of the profile",
+                extra={
+                    "min_endpointing_delay": min_delay,
+                    "max_endpointing_delay": max_delay,
+                },
+            )
+            min_delay = profile.min_endpointing_delay
+            max_delay = profile.max_endpointing_delay
+
+        return dataclasses.replace(
+            profile,
+            stt_model=self.stt_sip_model if profile is SIP_PROFILE else self.stt_model,
+            min_endpointing_delay=min_delay,
+            max_endpointing_delay=max_delay,
+        )
+
+
+# TOML table and key of every field, with the types it accepts
+_FIELDS: dict[str, tuple[str, str, tuple[type, ...]]] = {
+    "stt_model": ("stt", "model", (str,)),
+    "stt_sip_model": ("stt", "sip_model", (str,)),
+    "llm_model": ("llm", "model", (str,)),
+    "tts_model": ("tts", "model", (str,)),
+    "tts_voice": ("tts", "voice", (str,)),
+    "min_endpointing_delay": ("turn", "min_endpointing_delay", (int, float)),
+    "max_endpointing_delay": ("turn", "max_endpointing_delay", (int, float)),
+    "preemptive_generation": ("turn", "preemptive_generation", (bool,)),
+}
+
+
+def parse_config(data: dict[str, Any]) -> PipelineConfig:
+    """Validate the tables of a config file, raises `ValueError` on any mistake."""
+    known: dict[str, set[str]] = {}
+    for table, key, _ in _FIELDS.values():
+        known.setdefault(table, set()).add(key)
+    for table, values in data.items():
+        if table not in known or not isinstance(values, dict):
+            raise ValueError(f"unknown table [{table}]")
+        for key in values:
+            if key not in known[table]:
+                raise ValueError(f"unknown key {table}.{key}")
+
+    fields: dict[str, Any] = {}
+    for name, (table, key, types) in _FIELDS.items():
+        if key not in data.get(table, {}):
+            continue
+        value = data[table][key]
+        # bool is an int, but not a delay
+        if not isinstance(value, types) or (
+            isinstance(value, bool) and bool not in types
+        ):
+            raise ValueError(f"{table}.{key} must be a {types[0].__name__}")
+        fields[name] = value
+
+    config = PipelineConfig(**fields)
+    min_delay = config.min_endpointing_delay
+    max_delay = config.max_endpointing_delay
+    if (min_delay is not None and min_delay <= 0) or (
+        max_delay is not None and max_delay <= 0
+    ):
+        raise ValueError("the endpointing delays must be positive")
+    if min_delay is not None and max_delay is not None and min_delay > max_delay:
+        raise ValueError(
+            "turn.min_endpointing_delay must not be above turn.max_endpointing_delay"
+        )
+    return config
+
+
+def load_config(path: Path | str) -> PipelineConfig:
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    try:
+        return parse_config(data)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
+
+
+class PipelineConfigFile:
+    """The config of a TOML file, reloaded when the file changes.
+
+    Every session reads the config with `current` when it starts: the file is only
+    parsed again when its modification time or size changed since the last call,
+    otherwise it costs a `stat`. Each job process keeps its own copy, so an edited
+    file applies to the next session of every process, prewarmed ones included,
+    without restarting the agent server.
+
+    A file that doesn't parse or validate is logged and the last valid config is
+    kept, only the first load raises.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self._path = Path(path)
+        self._stamp = self._stat()
+        self._config = load_config(self._path)
+        self.reloads = 0
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def current(self) -> PipelineConfig:
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return self._config
+
+        self._stamp = stamp
+        try:
+            config = load_config(self._path)
+        except (OSError, ValueError, tomllib.TOMLDecodeError):
+            logger.exception(
+                "invalid pipeline config, keeping the previous one",
+                extra={"path": str(self._path)},
+            )
+            return self._config
+
+        if config != self._config:
+            logger.info(
+                "pipeline config reloaded",
+                extra={"path": str(self._path), **dataclasses.asdict(config)},
+            )
+            self._config = config
+            self.reloads += 1
+        return self._config
@@ -0,0 +1,129 @@
+import logging
+import re
+import textwrap
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import prometheus_client
+from livekit.agents import AgentSession, MetricsCollectedEvent, llm, utils
+from livekit.agents.metrics import LLMMetrics
+
+logger = logging.getLogger("agent")
+
+PROMPT_TOKENS = prometheus_client.Counter(
+    "lk_agent_llm_prompt_tokens",
+    "Prompt tokens sent to the LLM, cached by the provider or not",
+    ["cached", "nodename"],
+)
+
+
+def canonicalize(text: str) -> str:
+    """Same text, byte for byte, however it was indented or wrapped in the code.
+
+    Lines are dedented and stripped, runs of spaces and blank lines collapsed.
+    """
+    lines = [
+        re.sub(r"[ \t]+", " ", line).strip()
+        for line in textwrap.dedent(text.replace("\r\n", "\n")).split("\n")
+    ]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+class PromptLayout:
+    """Lays out the LLM requests so the provider can reuse its prompt cache.
+
+    Providers cache the longest prefix a request shares with the previous ones, so
+    what never changes comes first and is kept byte-identical: the canonical
+    instructions, then the tools sorted by id. The conversation follows, it only
+    grows. What changes every request (the time, metadata of the caller, ...) is
+    returned by `volatile` and goes last, in a system message after the user
+    message, so it never invalidates the cached prefix of the next request.
+
+    `volatile_context` is the context added to the last request laid out, empty if
+    there was none.
+    """
+
+    def __init__(self, *, volatile: Callable[[], dict[str, str]] | None = None):
+        self._volatile = volatile
+        self.volatile_context: dict[str, str] = {}
+
+    def layout(
+        self, chat_ctx: llm.ChatContext, tools: list[llm.Tool]
+    ) -> tuple[llm.ChatContext, list[llm.Tool]]:
+        items = chat_ctx.copy().items
+        for i, item in enumerate(items):
+            if not isinstance(item, llm.ChatMessage) or item.role not in (
+                "system",
+                "developer",
+            ):
+                break
+            items[i] = item.model_copy(
+                update={"content": [canonicalize(item.text_content or "")]}
+            )
+
+        context = self._volatile() if self._volatile is not None else {}
+        self.volatile_context = context
+        if context:
+            items.append(
+                llm.ChatMessage(
+                    role="system",
+                    content=[
+                        "Context of this call:\n"
+                        + "\n".join(
+                            f"- {key}: {value}" for key, value in context.items()
+                        )
+                    ],
+                )
+            )
+
+        return llm.ChatContext(items), sorted(tools, key=lambda tool: tool.id)
+
+
+@dataclass
+class _PromptUsage:
+    prompt_tokens: int
+    cached_tokens: int
+
+
+class PromptCacheStats:
+    """Reports the prompt tokens of every LLM request the provider had cached."""
+
+    def __init__(self) -> None:
+        self.requests: list[_PromptUsage] = []
+
+    def attach(self, session: AgentSession) -> None:
+        session.on("metrics_collected", self._on_metrics_collected)
+
+    def _on_metrics_collected(self, ev: MetricsCollectedEvent) -> None:
+        metrics = ev.metrics
+        if not isinstance(metrics, LLMMetrics) or not metrics.prompt_tokens:
+            return
+
+        self.record(metrics.prompt_tokens, metrics.prompt_cached_tokens)
+
+    def record(self, prompt_tokens: int, cached_tokens: int) -> None:
+        self.requests.append(_PromptUsage(prompt_tokens, cached_tokens))
+        nodename = utils.nodename()
+        PROMPT_TOKENS.labels(cached="true", nodename=nodename).inc(cached_tokens)
+        PROMPT_TOKENS.labels(cached="false", nodename=nodename).inc(
+            prompt_tokens - cached_tokens
+        )
+        logger.debug(
+            "LLM prompt tokens",
+            extra={"prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens},
+        )
+
+    def hit_ratio(self) -> float:
+        prompt_tokens = sum(usage.prompt_tokens for usage in self.requests)
+        cached_tokens = sum(usage.cached_tokens for usage in self.requests)
+        return cached_tokens / prompt_tokens if prompt_tokens else 0.0
+
+    async def log_summary(self) -> None:
+        if self.requests:
+            logger.info(
+                "prompt cache summary",
+                extra={
+                    "requests": len(self.requests),
+                    "cached_ratio": round(self.hit_ratio(), 3),
+                },
+            )
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import multiprocessing.util
+from collections.abc import Sequence
+
+import aiohttp
+import httpx
+import openai
+
+logger = logging.getLogger("agent")
+
+
+class ProviderClients:
+    """Keep-alive HTTP clients for the STT, LLM and TTS providers of a job process.
+
+    Created in `prewarm` and stored in `proc.userdata`. Sessions borrow the clients
+    instead of letting every plugin open its own connections, and `warm` opens the
+    TCP/TLS connections to the providers in the background as soon as a job starts,
+    so the first turn of a call doesn't pay for the handshakes.
+
+    The aiohttp session is bound to the job event loop, it is created lazily the
+    first time it's requested from a coroutine. The clients outlive the jobs of
+    the process, `close_at_exit` closes them when the process exits.
+    """
+
+    def __init__(
+        self,
+        *,
+        warm_urls: Sequence[str] = (),
+        keepalive_timeout: float = 120.0,
+        limit_per_host: int = 16,
+    ) -> None:
+        self._warm_urls = list(warm_urls)
+        self._keepalive_timeout = keepalive_timeout
+        self._limit_per_host = limit_per_host
+        self._http_session: aiohttp.ClientSession | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._openai_clients: dict[tuple[str, str | None], openai.AsyncClient] = {}
+
+    def http_session(self) -> aiohttp.ClientSession:
+        """Shared aiohttp session, used for the websockets of the STT and TTS."""
+        if self._http_session is None or self._http_session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self._limit_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._http_session = aiohttp.ClientSession(connector=connector)
+            self._loop = asyncio.get_running_loop()
+
+        return self._http_session
+
+    def openai_client(
+        self, *, base_url: str, api_key: str | None = None
+    ) -> openai.AsyncClient:
+        """OpenAI compatible client with a keep-alive connection pool, one per endpoint."""
+        key = (base_url, api_key)
+        if key not in self._openai_clients:
+            self._openai_clients[key] = openai.AsyncClient(
+                base_url=base_url,
+                api_key=api_key,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    timeout=httpx.Timeout(connect=15.0, read=5.0, write=5.0, pool=5.0),
+                    follow_redirects=True,
+                    limits=httpx.Limits(
+                        max_connections=50,
+                        max_keepalive_connections=50,
+                        keepalive_expiry=self._keepalive_timeout,
+                    ),
+                ),
+            )
+
+        return self._openai_clients[key]
+
+    async def warm(self) -> None:
+        """Open a keep-alive connection to every provider, errors are ignored."""
+        self._loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(self._warm_url(url) for url in self._warm_urls),
+            *(self._warm_openai(client) for client in self._openai_clients.values()),
+        )
+
+    async def _warm_url(self, url: str) -> None:
+        try:
+            async with self.http_session().get(url, allow_redirects=False) as resp:
+                await resp.read()
+        except Exception as e:
+            logger.debug(
+                "failed to warm provider connection", extra={"url": url}, exc_info=e
+            )
+
+    async def _warm_openai(self, client: openai.AsyncClient) -> None:
+        try:
+            await client.models.list()
+        except Exception as e:
+            logger.debug(
+                "failed to warm provider connection",
+                extra={"url": str(client.base_url)},
+                exc_info=e,
+            )
+
+    def close_at_exit(self) -> None:
+        """Close the clients on the loop they were used on, when the process exits."""
+        # job processes exit without running `atexit` handlers, the finalizers of
+        # multiprocessing run in both them and the main process
+        multiprocessing.util.Finalize(None, self._close_at_exit, exitpriority=10)
+
+    def _close_at_exit(self) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed() or loop.is_running():
+            return
+        loop.run_until_complete(self.aclose())
+
+    async def aclose(self) -> None:
+        if self._http_session is not None:
+            await self._http_session.close()
+            self._http_session = None
+
+        for client in self._openai_clients.values():
+            await client.close()
+        self._openai_clients.clear()
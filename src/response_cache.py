@@ -0,0 +1,577 @@
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import openai
+import prometheus_client
+from livekit import rtc
+from livekit.agents import llm, tts, utils
+
+logger = logging.getLogger("agent")
+
+RESPONSE_CACHE_LOOKUPS = prometheus_client.Counter(
+    "lk_agent_response_cache_lookups",
+    "Lookups of the response cache, by result",
+    ["result", "nodename"],
+)
+
+RESPONSE_CACHE_ENTRIES = prometheus_client.Counter(
+    "lk_agent_response_cache_entries",
+    "Entries stored in and evicted from the response cache",
+    ["change", "nodename"],
+)
+
+# label of the counter of each field of `ResponseCacheStats`
+_STAT_LABELS = {
+    "hits": (RESPONSE_CACHE_LOOKUPS, "hit"),
+    "similar_hits": (RESPONSE_CACHE_LOOKUPS, "similar_hit"),
+    "misses": (RESPONSE_CACHE_LOOKUPS, "miss"),
+    "timeouts": (RESPONSE_CACHE_LOOKUPS, "timeout"),
+    "stores": (RESPONSE_CACHE_ENTRIES, "stored"),
+    "evictions": (RESPONSE_CACHE_ENTRIES, "evicted"),
+}
+
+Embedder = Callable[[str], Awaitable[Sequence[float]]]
+
+# duration of the audio frames replayed from the cache
+_FRAME_DURATION = 0.02
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    transcript TEXT NOT NULL,
+    embedding BLOB,
+    text TEXT NOT NULL,
+    audio BLOB NOT NULL,
+    sample_rate INTEGER NOT NULL,
+    num_channels INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and symbols and collapse whitespace."""
+    text = unicodedata.normalize("NFKC", text.lower())
+    text = "".join(
+        ch if not unicodedata.category(ch).startswith(("P", "S")) else " "
+        for ch in text
+    )
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def openai_embedder(client: openai.AsyncClient, model: str) -> Embedder:
+    """Embed transcripts with an OpenAI compatible embeddings endpoint."""
+
+    async def _embed(text: str) -> Sequence[float]:
+        resp = await client.embeddings.create(model=model, input=text)
+        return resp.data[0].embedding
+
+    return _embed
+
+
+@dataclass
+class CachedResponse:
+    text: str
+    frames: list[rtc.AudioFrame]
+
+
+@dataclass
+class ResponseCacheStats:
+    """Counts of the cache of this process, also exported as Prometheus counters."""
+
+    hits: int = 0
+    similar_hits: int = 0
+    misses: int = 0
+    # lookups given up on by `ResponseCacheNodes` to keep the LLM response going
+    timeouts: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    def add(self, name: str, count: int = 1) -> None:
+        if not count:
+            return
+        setattr(self, name, getattr(self, name) + count)
+        counter, label = _STAT_LABELS[name]
+        counter.labels(label, utils.nodename()).inc(count)
+
+
+class ResponseCache:
+    """Cache of assistant responses and their synthesized audio.
+
+    Entries are keyed on the normalized user transcript, and scoped to a hash of the
+    agent instructions, of the `voice` the audio was synthesized with (TTS model,
+    voice and sample rate) and of the `history` of the conversation before the
+    question, so a reply is only replayed after the same conversation. When an embedder is given, a transcript without an exact match is
+    also matched against the cached transcripts by cosine similarity.
+
+    The cache is stored in a SQLite database so every job process of the host shares
+    it. Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once the cache grows over `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        *,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 24 * 3600,
+        embedder: Embedder | None = None,
+        similarity_threshold: float = 0.92,
+    ) -> None:
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._embedder = embedder
+        self._similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        # a miss embeds the transcript twice, in lookup and store
+        self._last_embedding: tuple[str, np.ndarray | None] | None = None
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._db.executescript(_SCHEMA)
+        self.stats = ResponseCacheStats()
+
+    @staticmethod
+    def _scope(instructions: str, voice: str, history: str) -> str:
+        return hashlib.sha256(
+            f"{voice}\n{history}\n{instructions}".encode()
+        ).hexdigest()
+
+    @staticmethod
+    def _key(scope: str, transcript: str) -> str:
+        return hashlib.sha256(f"{scope}:{transcript}".encode()).hexdigest()
+
+    async def lookup(
+        self,
+        instructions: str,
+        transcript: str,
+        *,
+        voice: str = "",
+        history: str = "",
+    ) -> CachedResponse | None:
+        scope = self._scope(instructions, voice, history)
+        transcript = normalize_text(transcript)
+        if not transcript:
+            return None
+
+        response = await asyncio.to_thread(
+            self._get, self._key(scope, transcript), time.time()
+        )
+        if response is not None:
+            self.stats.add("hits")
+            return response
+
+        if self._embedder is not None:
+            embedding = await self._embed(transcript)
+            if embedding is not None:
+                response = await asyncio.to_thread(
+                    self._get_similar, scope, embedding, time.time()
+                )
+                if response is not None:
+                    self.stats.add("similar_hits")
+                    return response
+
+        self.stats.add("misses")
+        return None
+
+    async def store(
+        self,
+        instructions: str,
+        transcript: str,
+        response: CachedResponse,
+        *,
+        voice: str = "",
+        history: str = "",
+    ) -> None:
+        transcript = normalize_text(transcript)
+        if not transcript or not response.frames:
+            return
+
+        embedding = None
+        if self._embedder is not None:
+            embedding = await self._embed(transcript)
+
+        await asyncio.to_thread(
+            self._put,
+            self._scope(instructions, voice, history),
+            transcript,
+            embedding,
+            response,
+            time.time(),
+        )
+        self.stats.add("stores")
+
+    async def _embed(self, transcript: str) -> np.ndarray | None:
+        assert self._embedder is not None
+        if self._last_embedding and self._last_embedding[0] == transcript:
+            return self._last_embedding[1]
+
+        try:
+            embedding = np.asarray(await self._embedder(transcript), dtype=np.float32)
+        except Exception as e:
+            logger.warning("failed to embed transcript", exc_info=e)
+            return None
+
+        norm = np.linalg.norm(embedding)
+        normalized = embedding / norm if norm else None
+        self._last_embedding = (transcript, normalized)
+        return normalized
+
+    def _get(self, key: str, now: float) -> CachedResponse | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text, audio, sample_rate, num_channels FROM responses "
+                "WHERE key = ? AND created_at > ?",
+                (key, now - self._ttl),
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._db.execute(
+                "UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key)
+            )
+            self._db.commit()
+
+        text, audio, sample_rate, num_channels = row
+        return CachedResponse(
+            text=text, frames=_split_frames(audio, sample_rate, num_channels)
+        )
+
+    def _get_similar(
+        self, scope: str, embedding: np.ndarray, now: float
+    ) -> CachedResponse | None:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, embedding FROM responses "
+                "WHERE scope = ? AND embedding IS NOT NULL AND created_at > ?",
+                (scope, now - self._ttl),
+            ).fetchall()
+
+        candidates = [
+            (key, np.frombuffer(blob, dtype=np.float32))
+            for key, blob in rows
+            if len(blob) == embedding.nbytes
+        ]
+        if not candidates:
+            return None
+
+        similarities = np.stack([e for _, e in candidates]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self._similarity_threshold:
+            return None
+
+        return self._get(candidates[best][0], now)
+
+    def _put(
+        self,
+        scope: str,
+        transcript: str,
+        embedding: np.ndarray | None,
+        response: CachedResponse,
+        now: float,
+    ) -> None:
+        first = response.frames[0]
+        audio = b"".join(bytes(frame.data) for frame in response.frames)
+        embedding_blob = embedding.tobytes() if embedding is not None else None
+        size = len(audio) + len(response.text.encode()) + len(embedding_blob or b"")
+        if size > self._max_bytes:
+            return
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self._key(scope, transcript),
+                    scope,
+                    transcript,
+                    embedding_blob,
+                    response.text,
+                    audio,
+                    first.sample_rate,
+                    first.num_channels,
+                    size,
+                    now,
+                    now,
+                ),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now: float) -> None:
+        expired = self._db.execute(
+            "DELETE FROM responses WHERE created_at <= ?", (now - self._ttl,)
+        ).rowcount
+
+        total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        lru: list[str] = []
+        if total > self._max_bytes:
+            for key, size in self._db.execute(
+                "SELECT key, size FROM responses ORDER BY last_used_at"
+            ):
+                lru.append(key)
+                total -= size
+                if total <= self._max_bytes:
+                    break
+
+            self._db.executemany(
+                "DELETE FROM responses WHERE key = ?", [(k,) for k in lru]
+            )
+
+        self.stats.add("evictions", expired + len(lru))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _split_frames(
+    audio: bytes, sample_rate: int, num_channels: int
+) -> list[rtc.AudioFrame]:
+    bytes_per_frame = int(sample_rate * _FRAME_DURATION) * num_channels * 2
+    frames = []
+    for offset in range(0, len(audio), bytes_per_frame):
+        chunk = audio[offset : offset + bytes_per_frame]
+        frames.append(
+            rtc.AudioFrame(
+                data=chunk,
+                sample_rate=sample_rate,
+                num_channels=num_channels,
+                samples_per_channel=len(chunk) // (2 * num_channels),
+            )
+        )
+    return frames
+
+
+def conversation_history(items: Sequence[llm.ChatItem]) -> str:
+    """Hash of the conversation in `items`, the instructions at its start left out."""
+    lines = []
+    for item in items:
+        if isinstance(item, llm.ChatMessage):
+            if not lines and item.role in ("system", "developer"):
+                continue
+            lines.append(f"{item.role}: {item.text_content or ''}")
+        elif isinstance(item, llm.FunctionCall):
+            lines.append(f"call {item.name}: {item.arguments}")
+        elif isinstance(item, llm.FunctionCallOutput):
+            lines.append(f"tool {item.name}: {item.output}")
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+@dataclass
+class _Turn:
+    transcript: str
+    instructions: str
+    history: str
+    hit: CachedResponse | None = None
+    text: list[str] = field(default_factory=list)
+    cacheable: bool = True
+
+
+class ResponseCacheNodes:
+    """Wraps the LLM and TTS nodes of an agent with a `ResponseCache`.
+
+    On a hit the LLM is never called and the cached audio is played instead of
+    synthesizing the response. On a miss, the response text and audio are stored
+    in the background once the TTS has synthesized the whole response.
+
+    Only turns whose reply can't depend on anything but the question are cached:
+    the history of the conversation before the question is part of the scope of
+    the entries, and turns sent with a call context (`cacheable=False`) or in
+    which a tool ran are never looked up nor stored.
+
+    The LLM request starts with the lookup and its first chunks are buffered until
+    the lookup is done, so a miss adds no latency unless the lookup (with the
+    embedding of the transcript) takes longer than the first token. A lookup
+    taking over `lookup_timeout` seconds is given up on and counted as a timeout.
+    `voice` identifies the TTS model, voice and sample rate of the session, the
+    audio is only replayed with the voice it was synthesized with: with
+    `watch_fallback`, replies synthesized while a TTS of the fallback adapter was
+    unavailable (possibly by another voice) aren't stored.
+    """
+
+    def __init__(
+        self, cache: ResponseCache, *, voice: str = "", lookup_timeout: float = 0.3
+    ) -> None:
+        self._cache = cache
+        self._voice = voice
+        self._lookup_timeout = lookup_timeout
+        self._turn: _Turn | None = None
+        self._unavailable: set[tts.TTS] = set()
+        self._synthesizing: list[_Turn] = []
+        self._store_tasks: set[asyncio.Task[None]] = set()
+
+    def watch_fallback(self, adapter: tts.FallbackAdapter) -> None:
+        adapter.on("tts_availability_changed", self._on_availability_changed)
+
+    def _on_availability_changed(self, ev: tts.AvailabilityChangedEvent) -> None:
+        if ev.available:
+            self._unavailable.discard(ev.tts)
+            return
+
+        self._unavailable.add(ev.tts)
+        for turn in self._synthesizing:
+            turn.cacheable = False
+
+    async def llm_node(
+        self,
+        instructions: str,
+        chat_ctx: llm.ChatContext,
+        llm_stream: AsyncIterable[llm.ChatChunk | str],
+        *,
+        cacheable: bool = True,
+    ) -> AsyncIterator[llm.ChatChunk | str]:
+        items = chat_ctx.items
+        last = items[-1] if items else None
+        if (
+            not cacheable
+            or not isinstance(last, llm.ChatMessage)
+            or last.role != "user"
+            or not last.text_content
+        ):
+            # e.g. replies generated after a tool call
+            self._turn = None
+            async for chunk in llm_stream:
+                yield chunk
+            return
+
+        turn = self._turn = _Turn(
+            transcript=last.text_content,
+            instructions=instructions,
+            history=conversation_history(items[:-1]),
+        )
+        chunks: asyncio.Queue[llm.ChatChunk | str | BaseException | None] = (
+            asyncio.Queue()
+        )
+        read_ahead = asyncio.create_task(_read_ahead(llm_stream, chunks))
+        try:
+            try:
+                turn.hit = await asyncio.wait_for(
+                    self._cache.lookup(
+                        instructions,
+                        turn.transcript,
+                        voice=self._voice,
+                        history=turn.history,
+                    ),
+                    self._lookup_timeout,
+                )
+            except asyncio.TimeoutError:
+                self._cache.stats.add("timeouts")
+
+            if turn.hit is not None:
+                await utils.aio.cancel_and_wait(read_ahead)
+                if hasattr(llm_stream, "aclose"):
+                    await llm_stream.aclose()
+                yield turn.hit.text
+                return
+
+            while (chunk := await chunks.get()) is not None:
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                if isinstance(chunk, str):
+                    turn.text.append(chunk)
+                elif chunk.delta is not None:
+                    if chunk.delta.tool_calls:
+                        turn.cacheable = False
+                    if chunk.delta.content:
+                        turn.text.append(chunk.delta.content)
+                yield chunk
+        finally:
+            await utils.aio.cancel_and_wait(read_ahead)
+
+    async def tts_node(
+        self,
+        text: AsyncIterable[str],
+        synthesize: Callable[[AsyncIterable[str]], AsyncIterable[rtc.AudioFrame]],
+    ) -> AsyncIterator[rtc.AudioFrame]:
+        turn, self._turn = self._turn, None
+
+        if turn is not None and turn.hit is not None:
+            spoken = "".join([chunk async for chunk in text])
+            if normalize_text(spoken) == normalize_text(turn.hit.text):
+                for frame in turn.hit.frames:
+                    yield frame
+                return
+
+            # the text doesn't belong to the cached response, synthesize it
+            text, turn = _replay(spoken), None
+
+        frames: list[rtc.AudioFrame] = []
+        spoken_chunks: list[str] = []
+
+        async def _tee_text() -> AsyncIterator[str]:
+            async for chunk in text:
+                spoken_chunks.append(chunk)
+                yield chunk
+
+        if turn is not None:
+            if self._unavailable:
+                turn.cacheable = False
+            self._synthesizing.append(turn)
+        try:
+            async for frame in synthesize(_tee_text()):
+                frames.append(frame)
+                yield frame
+        finally:
+            if turn is not None:
+                self._synthesizing.remove(turn)
+
+        if (
+            turn is not None
+            and turn.cacheable
+            and normalize_text("".join(spoken_chunks))
+            == normalize_text("".join(turn.text))
+        ):
+            # the end of the playout doesn't wait for the embedding and the write
+            task = asyncio.create_task(
+                self._cache.store(
+                    turn.instructions,
+                    turn.transcript,
+                    CachedResponse(text="".join(turn.text), frames=frames),
+                    voice=self._voice,
+                    history=turn.history,
+                )
+            )
+            self._store_tasks.add(task)
+            task.add_done_callback(self._store_done)
+
+    def _store_done(self, task: asyncio.Task[None]) -> None:
+        self._store_tasks.discard(task)
+        if not task.cancelled() and (e := task.exception()) is not None:
+            logger.warning("failed to store the response", exc_info=e)
+
+    async def aclose(self) -> None:
+        """Wait for the responses still being stored."""
+        if self._store_tasks:
+            await asyncio.gather(*self._store_tasks, return_exceptions=True)
+
+
+async def _read_ahead(
+    stream: AsyncIterable[llm.ChatChunk | str],
+    chunks: asyncio.Queue[llm.ChatChunk | str | BaseException | None],
+) -> None:
+    """Put the chunks of `stream` in `chunks`, then its error or None at the end."""
+    try:
+        async for chunk in stream:
+            chunks.put_nowait(chunk)
+    except Exception as e:
+        chunks.put_nowait(e)
+    else:
+        chunks.put_nowait(None)
+
+
+async def _replay(text: str) -> AsyncIterator[str]:
+    yield text
@@ -0,0 +1,89 @@
+import dataclasses
+from typing import Any
+
+from livekit import rtc
+from livekit.plugins import silero
+from livekit.protocol import agent, models
+
+from audio_format import AudioFormat, negotiate, vad_at
+
+
+@dataclasses.dataclass(frozen=True)
+class SessionProfile:
+    """Settings of the pipeline of a session, chosen for the kind of its participant."""
+
+    audio: AudioFormat
+    stt_model: str
+    """Deepgram model."""
+    vad_options: dict[str, Any]
+    """Options of the Silero VAD replacing the ones it was loaded with."""
+    min_endpointing_delay: float
+    max_endpointing_delay: float
+    frame_size_ms: int
+    """Duration of the frames of the room input."""
+    pre_connect_audio: bool
+
+    def vad(self, vad: silero.VAD) -> silero.VAD:
+        """The VAD of the process, at the rate and with the options of the profile."""
+        return vad_at(vad, self.audio.input_rate, **self.vad_options)
+
+
+# The defaults of the plugins and of the room, for participants using WebRTC
+WEBRTC_PROFILE = SessionProfile(
+    audio=negotiate(rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD),
+    stt_model="nova-2",
+    vad_options={},
+    min_endpointing_delay=0.5,
+    max_endpointing_delay=3.0,
+    frame_size_ms=50,
+    pre_connect_audio=True,
+)
+
+# Phone calls are narrowband and their callers take short turns:
+# - the phone call model of Deepgram is trained on 8kHz audio
+# - the VAD starts speech on a higher probability, the line noise left by BVC
+#   telephony triggers false starts at the default, and ends it after a shorter
+#   silence, with less audio buffered before and during the speech
+# - the end of turn is decided sooner
+# - the frames of the input are smaller, every stage gets the audio sooner
+# - phones don't send pre-connect audio, there's nothing to wait for
+SIP_PROFILE = SessionProfile(
+    audio=negotiate(rtc.ParticipantKind.PARTICIPANT_KIND_SIP),
+    stt_model="nova-2-phonecall",
+    vad_options={
+        "activation_threshold": 0.6,
+        "deactivation_threshold": 0.45,
+        "min_silence_duration": 0.4,
+        "prefix_padding_duration": 0.3,
+        "max_buffered_speech": 20.0,
+    },
+    min_endpointing_delay=0.4,
+    max_endpointing_delay=2.5,
+    frame_size_ms=20,
+    pre_connect_audio=False,
+)
+
+
+def profile_for(kind: rtc.ParticipantKind.ValueType) -> SessionProfile:
+    if kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP:
+        return SIP_PROFILE
+    return WEBRTC_PROFILE
+
+
+def job_participant_kind(
+    job: agent.Job, *, sip_room_prefix: str | None = None
+) -> rtc.ParticipantKind.ValueType:
+    """Kind of the participant of a job, known before the agent joins the room.
+
+    Jobs dispatched for a participant carry it. Otherwise the rooms created for the
+    calls of a SIP dispatch rule are recognized by its room prefix, and the other
+    rooms are taken for WebRTC sessions.
+    """
+    if job.HasField("participant"):
+        if job.participant.kind == models.ParticipantInfo.Kind.SIP:
+            return rtc.ParticipantKind.PARTICIPANT_KIND_SIP
+        return rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD
+
+    if sip_room_prefix and job.room.name.startswith(sip_room_prefix):
+        return rtc.ParticipantKind.PARTICIPANT_KIND_SIP
+    return rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD
@@ -0,0 +1,89 @@
+import atexit
+import contextlib
+import importlib.resources
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import onnxruntime
+from livekit.plugins import silero
+
+logger = logging.getLogger("agent")
+
+# Environment variable used to hand the pre-optimized model path from the agent server
+# to its job processes (they inherit the environment of the parent process)
+SHARED_VAD_MODEL_ENV = "AGENT_SHARED_VAD_MODEL"
+
+
+def shared_memory_dir() -> Path:
+    # /dev/shm is memory backed on Linux, files written there never hit the disk
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm
+    return Path(tempfile.gettempdir())
+
+
+def publish_vad_model(directory: Path | str | None = None) -> Path:
+    """Optimize the Silero VAD model once and cache it for the job processes.
+
+    The ONNX graph is optimized a single time in the agent server and saved in the
+    ORT format to a read-only file (in /dev/shm when available). Job processes load
+    that pre-optimized model through `load_vad`, which skips extracting the packaged
+    model and most of the graph optimization, roughly 3x faster than loading the
+    bundled model. Each process still holds its own copy of the model in memory.
+
+    Must be called in the parent process before any job process is started.
+    """
+    directory = Path(directory) if directory else shared_memory_dir()
+    path = directory / f"agent-silero-vad-{os.getpid()}.ort"
+
+    resource = (
+        importlib.resources.files("livekit.plugins.silero.resources")
+        / "silero_vad.onnx"
+    )
+    opts = onnxruntime.SessionOptions()
+    opts.graph_optimization_level = (
+        onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    )
+    # written next to the final path and moved over it, a file left read-only by a
+    # previous server with the same pid can't be overwritten in place
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f"{path.stem}.", suffix=".ort", dir=directory
+    )
+    os.close(fd)
+    try:
+        opts.optimized_model_filepath = tmp_path
+        with importlib.resources.as_file(resource) as onnx_path:
+            onnxruntime.InferenceSession(
+                str(onnx_path), sess_options=opts, providers=["CPUExecutionProvider"]
+            )
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _unpublish(Path(tmp_path))
+        raise
+
+    atexit.register(_unpublish, path)
+    os.environ[SHARED_VAD_MODEL_ENV] = str(path)
+
+    logger.info("published pre-optimized VAD model", extra={"path": str(path)})
+    return path
+
+
+def _unpublish(path: Path) -> None:
+    with contextlib.suppress(FileNotFoundError):
+        path.unlink()
+
+
+def load_vad(**kwargs) -> silero.VAD:
+    """Load the Silero VAD, using the model published by the agent server if any.
+
+    Falls back to the model bundled with the plugin when no pre-optimized model was
+    published (e.g. when running the agent from tests or notebooks).
+    """
+    model_path = os.getenv(SHARED_VAD_MODEL_ENV)
+    if model_path and Path(model_path).is_file():
+        return silero.VAD.load(onnx_file_path=model_path, **kwargs)
+
+    return silero.VAD.load(**kwargs)
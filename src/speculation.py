@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import re
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+from dataclasses import dataclass, field
+from typing import Literal
+
+import prometheus_client
+from livekit import rtc
+from livekit.agents import (
+    AgentSession,
+    SpeechCreatedEvent,
+    UserInputTranscribedEvent,
+    utils,
+)
+from livekit.agents.voice import SpeechHandle
+
+logger = logging.getLogger("agent")
+
+SpeculationMode = Literal["full", "sentence", "off"]
+
+SPECULATIONS = prometheus_client.Counter(
+    "lk_agent_speculative_tts",
+    "Replies synthesized before the end of the user turn was confirmed",
+    ["outcome", "nodename"],
+)
+
+SPECULATION_SAVED_LATENCY = prometheus_client.Histogram(
+    "lk_agent_speculative_tts_saved_seconds",
+    "Response latency saved by the replies synthesized speculatively",
+    ["nodename"],
+    buckets=[0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0],
+)
+
+_SENTENCE_END = re.compile(r"[.!?](\s|$)")
+
+
+@dataclass
+class _Speculation:
+    created_at: float
+    committed: asyncio.Event = field(default_factory=asyncio.Event)
+    committed_at: float | None = None
+    first_audio_at: float | None = None
+    done: bool = False
+
+
+@dataclass
+class SpeculationStats:
+    used: int = 0
+    discarded: int = 0
+    saved: list[float] = field(default_factory=list)
+
+    def summary(self) -> dict[str, float]:
+        total = self.used + self.discarded
+        return {
+            "used": self.used,
+            "discarded": self.discarded,
+            "used_ratio": self.used / total if total else 0.0,
+            "mean_saved": sum(self.saved) / len(self.saved) if self.saved else 0.0,
+        }
+
+
+class SpeculativeTTS:
+    """Controls and measures the synthesis of preemptive replies.
+
+    With preemptive generation, the framework runs the LLM and the TTS of a reply
+    as soon as the final transcript arrives, before the end of the turn is
+    confirmed, and plays the buffered audio once it is. The reply is thrown away
+    if the user keeps speaking.
+
+    `mode` bounds the text synthesized before the turn is confirmed: the whole
+    reply (`full`, the framework behavior), its first sentence (`sentence`) or
+    nothing (`off`), the rest follows once the turn is confirmed.
+
+    Every speculative reply is counted as used or discarded, and for the used ones
+    the time between the start of the reply and the moment its first audio was
+    ready (or the turn confirmed, if earlier) is recorded as the latency saved.
+    """
+
+    def __init__(self, *, mode: SpeculationMode = "full") -> None:
+        if mode not in ("full", "sentence", "off"):
+            raise ValueError(f"unknown speculative TTS mode: {mode}")
+
+        self._mode = mode
+        self._awaiting_turn = False
+        self._latest: _Speculation | None = None
+        self.stats = SpeculationStats()
+
+    def attach(self, session: AgentSession) -> None:
+        session.on("user_input_transcribed", self._on_user_input_transcribed)
+        session.on("speech_created", self._on_speech_created)
+
+    def _on_user_input_transcribed(self, ev: UserInputTranscribedEvent) -> None:
+        # the user is taking a turn, replies created until it's confirmed are
+        # preemptive
+        self._awaiting_turn = True
+
+    def _on_speech_created(self, ev: SpeechCreatedEvent) -> None:
+        if not self._awaiting_turn or ev.source != "generate_reply":
+            return
+
+        speculation = self._latest = _Speculation(created_at=time.perf_counter())
+        ev.speech_handle.add_done_callback(
+            lambda handle: self._on_speech_done(speculation, handle)
+        )
+
+    def turn_committed(self) -> None:
+        """Call from `Agent.on_user_turn_completed`."""
+        self._awaiting_turn = False
+        if self._latest is not None and not self._latest.done:
+            self._latest.committed_at = time.perf_counter()
+            self._latest.committed.set()
+
+    def _on_speech_done(self, speculation: _Speculation, handle: SpeechHandle) -> None:
+        speculation.done = True
+        nodename = utils.nodename()
+        if not handle.scheduled:
+            self.stats.discarded += 1
+            SPECULATIONS.labels(outcome="discarded", nodename=nodename).inc()
+            return
+
+        ready_at = min(
+            speculation.first_audio_at or float("inf"),
+            speculation.committed_at or time.perf_counter(),
+        )
+        saved = max(0.0, ready_at - speculation.created_at)
+        self.stats.used += 1
+        self.stats.saved.append(saved)
+        SPECULATIONS.labels(outcome="used", nodename=nodename).inc()
+        SPECULATION_SAVED_LATENCY.labels(nodename=nodename).observe(saved)
+
+    async def tts_node(
+        self,
+        text: AsyncIterable[str],
+        synthesize: Callable[[AsyncIterable[str]], AsyncIterable[rtc.AudioFrame]],
+    ) -> AsyncIterator[rtc.AudioFrame]:
+        speculation = self._latest
+        if speculation is None or speculation.done or speculation.committed.is_set():
+            async for frame in synthesize(text):
+                yield frame
+            return
+
+        async for frame in synthesize(self._hold_text(text, speculation)):
+            if speculation.first_audio_at is None:
+                speculation.first_audio_at = time.perf_counter()
+            yield frame
+
+    async def _hold_text(
+        self, text: AsyncIterable[str], speculation: _Speculation
+    ) -> AsyncIterator[str]:
+        pushed = ""
+        async for chunk in text:
+            if not speculation.committed.is_set() and (
+                self._mode == "off"
+                or (self._mode == "sentence" and _SENTENCE_END.search(pushed))
+            ):
+                await speculation.committed.wait()
+
+            pushed += chunk
+            yield chunk
+
+    async def log_summary(self) -> None:
+        if self.stats.used or self.stats.discarded:
+            logger.info(
+                "speculative TTS summary", extra={"speculation": self.stats.summary()}
+            )
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import math
+import re
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+
+from livekit import rtc
+from livekit.agents import tts, utils
+
+logger = logging.getLogger("agent")
+
+# end of a clause, where a first chunk can be cut without breaking the prosody
+_CLAUSE_END = re.compile(r"[,;:.!?](?=\s)")
+_SENTENCE_END = re.compile(r"[.!?](?=\s)")
+# a word is complete once followed by a space
+_COMPLETE_WORD = re.compile(r"\S+(?=\s)")
+# seconds of speech per word before any audio was synthesized
+_DEFAULT_SECONDS_PER_WORD = 0.35
+
+
+class AdaptiveChunker:
+    """Splits the LLM output into chunks, where the TTS stream is flushed.
+
+    The first chunk of a reply is short, cut at the first clause or after a few
+    words, so the TTS starts speaking as early as possible. The following chunks
+    are whole sentences. The whole reply goes to a single TTS stream, flushed at
+    the end of every chunk: the TTS keeps the context of the reply for its
+    prosody, and only the first chunk waits for a time to first byte. An end of
+    the reply shorter than `min_first_words` is merged into the chunk before it
+    rather than flushed on its own.
+
+    The length of the first chunk tunes itself: it's the number of words whose
+    audio lasts as long as the TTS takes to answer the first flush (its moving
+    average time to first byte), between `min_first_words` and `max_first_words`.
+    A faster TTS allows a shorter first chunk without a gap in the speech.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_first_words: int = 2,
+        max_first_words: int = 8,
+        min_sentence_len: int = 20,
+        smoothing: float = 0.2,
+    ) -> None:
+        self._min_first_words = min_first_words
+        self._max_first_words = max_first_words
+        self._min_sentence_len = min_sentence_len
+        self._smoothing = smoothing
+        self._ttfb: float | None = None
+        self._seconds_per_word = _DEFAULT_SECONDS_PER_WORD
+
+    @property
+    def first_chunk_words(self) -> int:
+        if self._ttfb is None:
+            return self._max_first_words
+
+        words = math.ceil(self._ttfb / self._seconds_per_word)
+        return min(max(words, self._min_first_words), self._max_first_words)
+
+    def _record(self, ttfb: float, words: int, duration: float) -> None:
+        a = self._smoothing
+        self._ttfb = ttfb if self._ttfb is None else a * ttfb + (1 - a) * self._ttfb
+        if words and duration:
+            self._seconds_per_word = (
+                a * duration / words + (1 - a) * self._seconds_per_word
+            )
+
+    async def chunks(self, text: AsyncIterable[str]) -> AsyncIterator[str]:
+        buffer = ""
+        # a chunk is held until the text after it has `min_first_words` words, a
+        # shorter end of the reply is merged into it instead of being flushed on
+        # its own
+        pending: str | None = None
+        first = True
+        async for delta in text:
+            buffer += delta
+            while True:
+                if pending is not None:
+                    if len(_COMPLETE_WORD.findall(buffer)) < self._min_first_words:
+                        break
+                    yield pending
+                    pending = None
+
+                chunk_end = self._chunk_end(buffer, first=first)
+                if not chunk_end:
+                    break
+                pending = buffer[:chunk_end].strip()
+                buffer = buffer[chunk_end:]
+                first = False
+
+        tail = buffer.strip()
+        if pending is not None and tail and len(tail.split()) < self._min_first_words:
+            yield f"{pending} {tail}"
+            return
+        if pending is not None:
+            yield pending
+        if tail:
+            yield tail
+
+    def _chunk_end(self, text: str, *, first: bool) -> int:
+        if first:
+            min_words = self._min_first_words
+            for match in _CLAUSE_END.finditer(text):
+                if len(text[: match.end()].split()) >= min_words:
+                    return match.end()
+
+            # cut after N complete words
+            words = list(_COMPLETE_WORD.finditer(text))
+            if len(words) >= self.first_chunk_words:
+                return words[self.first_chunk_words - 1].end()
+            return 0
+
+        for match in _SENTENCE_END.finditer(text):
+            if len(text[: match.end()].strip()) >= self._min_sentence_len:
+                return match.end()
+        return 0
+
+    async def tts_node(
+        self,
+        text: AsyncIterable[str],
+        stream: Callable[[], tts.SynthesizeStream],
+        *,
+        flush: bool = True,
+    ) -> AsyncIterator[rtc.AudioFrame]:
+        """Synthesize the reply in a single stream, flushed at the end of every chunk.
+
+        Without `flush`, the chunks are only pushed, for the streams that end on
+        a flush.
+        """
+        async with stream() as synthesis:
+            words = 0
+            flushed_at: float | None = None
+
+            async def _forward() -> None:
+                nonlocal words, flushed_at
+                async for chunk in self.chunks(text):
+                    synthesis.push_text(f"{chunk} ")
+                    if flush:
+                        _flush_chunk(synthesis)
+                    words += len(chunk.split())
+                    if flushed_at is None:
+                        flushed_at = time.perf_counter()
+                synthesis.end_input()
+
+            forward_task = asyncio.create_task(_forward())
+            ttfb, duration = None, 0.0
+            try:
+                async for ev in synthesis:
+                    if ttfb is None and flushed_at is not None:
+                        ttfb = time.perf_counter() - flushed_at
+                    duration += ev.frame.duration
+                    yield ev.frame
+                # raises the error of the text, if any
+                await forward_task
+            finally:
+                await utils.aio.cancel_and_wait(forward_task)
+
+        if ttfb is not None:
+            self._record(ttfb, words, duration)
+
+
+def _flush_chunk(stream: tts.SynthesizeStream) -> None:
+    # `SynthesizeStream.flush()` ends the segment, the text pushed after it is
+    # dropped. The streams synthesize their pending text on the flush sentinel
+    # and keep reading.
+    stream._input_ch.send_nowait(stream._FlushSentinel())
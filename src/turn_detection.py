@@ -0,0 +1,298 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+from livekit.agents import utils
+from livekit.agents.inference_runner import _InferenceRunner
+from livekit.plugins.turn_detector.base import (
+    MAX_HISTORY_TOKENS,
+    EOUModelBase,
+    _download_from_hf_hub,
+    _EUORunnerBase,
+)
+from livekit.plugins.turn_detector.models import HG_MODEL
+from livekit.plugins.turn_detector.multilingual import (
+    MultilingualModel,
+    _EUORunnerMultilingual,
+    _remote_inference_url,
+)
+
+logger = logging.getLogger("agent")
+
+# A short exchange used to run the first prediction while prewarming, so the
+# tokenizer chat template and the ONNX session buffers are ready before a call
+_WARMUP_CHAT_CTX = [
+    {"role": "assistant", "content": "Hi there, how can I help you today?"},
+    {"role": "user", "content": "I was wondering if you could"},
+]
+
+# starts every message in the chat template of the model
+_IM_START = "<|im_start|>"
+
+
+class LocalInferenceExecutor:
+    """Runs inference runners inside the current process.
+
+    Implements the `InferenceExecutor` protocol expected by the turn detector, so a
+    model loaded in `prewarm` answers predictions directly instead of going through
+    the inference process shared by the agent server.
+
+    Predictions run one at a time and aren't batched: a job process hosts a single
+    session, which waits for each prediction before asking for the next one, so a
+    batch would only ever hold one request.
+    """
+
+    def __init__(self, runners: dict[str, _InferenceRunner]) -> None:
+        self._runners = runners
+        # a single thread keeps predictions off the event loop and serialized
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eou")
+        self.in_flight = 0
+
+    async def do_inference(self, method: str, data: bytes) -> bytes | None:
+        runner = self._runners.get(method)
+        if runner is None:
+            raise ValueError(f"no inference runner loaded for {method}")
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, runner.run, data)
+        finally:
+            self.in_flight -= 1
+
+
+@dataclass
+class _SessionTokens:
+    """Conversation of a session up to its last message, formatted and tokenized."""
+
+    committed: list[tuple[str, str]] = field(default_factory=list)
+    last_role: str = ""
+    prefix_text: str = ""
+    prefix_ids: list[int] = field(default_factory=list)
+    # formatted text of the last message up to its content: the header of the
+    # message, and the previous messages of the same role merged with it
+    last_head: str | None = None
+
+
+class CachedEOURunner(_EUORunnerMultilingual):
+    """Multilingual end-of-turn runner keeping the tokens of the conversation.
+
+    The conversation before the last message doesn't change while the user
+    speaks. For requests with a `session_id`, that part of the conversation is
+    kept per session, already normalized, formatted and tokenized, so a call only
+    tokenizes the transcript of the last message. Without one, the tokens of that
+    part are cached by text.
+
+    The predictions must be the ones of the runner of the plugin, which tokenizes
+    the whole conversation every time: `tests/test_turn_detection.py` compares
+    them on the real tokenizer when the model is downloaded.
+    """
+
+    def __init__(
+        self, *, max_cached_prefixes: int = 256, max_sessions: int = 256
+    ) -> None:
+        super().__init__()
+        self._max_cached_prefixes = max_cached_prefixes
+        self._prefix_tokens: OrderedDict[str, list[int]] = OrderedDict()
+        self._max_sessions = max_sessions
+        self._sessions: OrderedDict[str, _SessionTokens] = OrderedDict()
+        self.tokenized_prefixes = 0
+
+    def _tokenize(self, text: str) -> list[int]:
+        return self._tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def _token_ids(self, text: str) -> list[int]:
+        # special tokens are never merged with the text around them, so the tokens
+        # of the prefix followed by the ones of the last message are the tokens of
+        # the whole text
+        split = max(text.rfind(_IM_START), 0)
+        prefix, last_message = text[:split], text[split:]
+        prefix_tokens = self._prefix_tokens.get(prefix)
+        if prefix_tokens is None:
+            prefix_tokens = self._tokenize(prefix) if prefix else []
+            self.tokenized_prefixes += 1
+            self._prefix_tokens[prefix] = prefix_tokens
+            if len(self._prefix_tokens) > self._max_cached_prefixes:
+                self._prefix_tokens.popitem(last=False)
+        else:
+            self._prefix_tokens.move_to_end(prefix)
+
+        # truncated on the left, like the tokenizer of the plugin
+        return (prefix_tokens + self._tokenize(last_message))[-MAX_HISTORY_TOKENS:]
+
+    def _session_tokens(self, session_id: str) -> _SessionTokens:
+        tokens = self._sessions.get(session_id)
+        if tokens is None:
+            tokens = self._sessions[session_id] = _SessionTokens()
+            if len(self._sessions) > self._max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return tokens
+
+    def _session_token_ids(
+        self, tokens: _SessionTokens, chat_ctx: list[dict[str, Any]]
+    ) -> tuple[str, list[int]]:
+        *committed, (role, content) = [(m["role"], m["content"]) for m in chat_ctx]
+        content = self._normalize_text(content)
+
+        if (
+            tokens.last_head is None
+            or committed != tokens.committed
+            or role != tokens.last_role
+        ):
+            # a new turn, the whole conversation is formatted once
+            text = self._format_chat_ctx([dict(m) for m in chat_ctx])
+            split = max(text.rfind(_IM_START), 0)
+            last_message = text[split:]
+            tokens.committed, tokens.last_role = committed, role
+            tokens.prefix_text = text[:split]
+            tokens.prefix_ids = self._tokenize(tokens.prefix_text) if split else []
+            tokens.last_head = (
+                last_message[: len(last_message) - len(content)]
+                if last_message.endswith(content)
+                else None
+            )
+            self.tokenized_prefixes += 1
+        else:
+            last_message = tokens.last_head + content
+
+        ids = tokens.prefix_ids + self._tokenize(last_message)
+        return tokens.prefix_text + last_message, ids[-MAX_HISTORY_TOKENS:]
+
+    def _prepare(self, data: bytes) -> tuple[str, list[int]]:
+        request = json.loads(data)
+        chat_ctx = request.get("chat_ctx")
+        if not chat_ctx:
+            raise ValueError("chat_ctx is required on the inference input data")
+
+        if session_id := request.get("session_id"):
+            return self._session_token_ids(self._session_tokens(session_id), chat_ctx)
+
+        text = self._format_chat_ctx(chat_ctx)
+        return text, self._token_ids(text)
+
+    def run(self, data: bytes) -> bytes | None:
+        started_at = time.perf_counter()
+        text, token_ids = self._prepare(data)
+        outputs = self._session.run(
+            None, {"input_ids": np.array([token_ids], dtype=np.int64)}
+        )
+        return json.dumps(
+            {
+                "eou_probability": float(outputs[0].flatten()[-1]),
+                "duration": round(time.perf_counter() - started_at, 3),
+                "input": text,
+            }
+        ).encode()
+
+
+class PrewarmedTurnDetector:
+    """End-of-turn model and tokenizer loaded once per job process.
+
+    Create it in `prewarm` with `load` and call `model` in the job entrypoint to get
+    a `MultilingualModel` that reuses the warm ONNX session and tokenizer.
+    """
+
+    def __init__(self, runner: _InferenceRunner, languages: dict[str, Any]) -> None:
+        self._languages = languages
+        self._executor = LocalInferenceExecutor({runner.INFERENCE_METHOD: runner})
+
+    @classmethod
+    def load(
+        cls,
+        runner_class: type[_EUORunnerBase] = _EUORunnerMultilingual,
+        *,
+        languages: dict[str, Any] | None = None,
+    ) -> "PrewarmedTurnDetector":
+        """Load the model and run a first prediction (blocking, call from `prewarm`)."""
+        started_at = time.perf_counter()
+
+        runner = runner_class()
+        runner.initialize()
+        runner.run(json.dumps({"chat_ctx": _WARMUP_CHAT_CTX}).encode())
+
+        if languages is None:
+            languages_path = _download_from_hf_hub(
+                HG_MODEL,
+                "languages.json",
+                revision=runner_class.model_revision(),
+                local_files_only=True,
+            )
+            with open(languages_path) as f:
+                languages = json.load(f)
+
+        logger.info(
+            "turn detector prewarmed",
+            extra={"duration": round(time.perf_counter() - started_at, 3)},
+        )
+        return cls(runner, languages)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of predictions running or waiting for the model."""
+        return self._executor.in_flight
+
+    def model(self, *, unlikely_threshold: float | None = None) -> MultilingualModel:
+        return _PrewarmedMultilingualModel(
+            executor=self._executor,
+            languages=self._languages,
+            unlikely_threshold=unlikely_threshold,
+        )
+
+
+class _SessionInferenceExecutor:
+    """Executor of a session, adding its id to the requests of the plugin.
+
+    The runner can then keep the tokens of the conversation of the session, see
+    `CachedEOURunner`. The runner of the plugin ignores it.
+    """
+
+    def __init__(self, executor: LocalInferenceExecutor) -> None:
+        self._executor = executor
+        self._session_id = utils.shortuuid("eou_")
+
+    async def do_inference(self, method: str, data: bytes) -> bytes | None:
+        request = {**json.loads(data), "session_id": self._session_id}
+        return await self._executor.do_inference(method, json.dumps(request).encode())
+
+
+class _PrewarmedMultilingualModel(MultilingualModel):
+    def __init__(
+        self,
+        *,
+        executor: LocalInferenceExecutor,
+        languages: dict[str, Any],
+        unlikely_threshold: float | None = None,
+    ) -> None:
+        # the predictions are the ones of the plugin, run by the executor of the
+        # process instead of the inference process
+        EOUModelBase.__init__(
+            self,
+            model_type="multilingual",
+            inference_executor=_SessionInferenceExecutor(executor),
+            unlikely_threshold=unlikely_threshold,
+            load_languages=False,
+        )
+        # copied since MultilingualModel caches thresholds fetched remotely in it
+        self._languages = dict(languages)
+
+
+def load_turn_detector(*, token_cache: bool = False) -> PrewarmedTurnDetector | None:
+    """Prewarm the multilingual turn detector, unless inference is done remotely.
+
+    With `token_cache`, the predictions run on `CachedEOURunner` instead of the
+    runner of the plugin.
+    """
+    if _remote_inference_url():
+        return None
+
+    return PrewarmedTurnDetector.load(
+        CachedEOURunner if token_cache else _EUORunnerMultilingual
+    )
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from livekit import rtc
+
+from adaptive_nc import AdaptiveNoiseCancellation, WebRTCNoiseSuppression
+
+SAMPLE_RATE = 24000
+
+
+class _CountingCanceller:
+    def __init__(self) -> None:
+        self.frames = 0
+
+    def process(self, frame: rtc.AudioFrame) -> rtc.AudioFrame:
+        self.frames += 1
+        return frame
+
+
+def _frames(duration: float, *, noise: float, seed: int = 0) -> list[rtc.AudioFrame]:
+    """Half a second of speech (a tone) every second, over white noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    speech = np.sin(2 * np.pi * 220 * t) * 8000 * (t % 1.0 < 0.5)
+    samples = (speech + rng.standard_normal(len(t)) * noise).astype(np.int16)
+    frame_size = SAMPLE_RATE // 20
+    return [
+        rtc.AudioFrame(
+            samples[i : i + frame_size].tobytes(), SAMPLE_RATE, 1, frame_size
+        )
+        for i in range(0, len(samples), frame_size)
+    ]
+
+
+def test_cancellation_is_bypassed_while_the_input_is_clean() -> None:
+    canceller = _CountingCanceller()
+    processor = AdaptiveNoiseCancellation(canceller)
+
+    for frame in _frames(4.0, noise=0.0):
+        processor._process(frame)
+
+    assert not processor.active
+    assert processor.switches == 1
+    # the SNR is known after a second, with the 20th frame
+    assert canceller.frames == 19
+    assert processor.bypassed_duration == pytest.approx(3.05)
+
+    for frame in _frames(6.0, noise=3000.0):
+        processor._process(frame)
+
+    assert processor.active
+    assert processor.switches == 2
+    assert processor.snr is not None and processor.snr < 15.0
+
+
+def test_hysteresis_keeps_the_state_between_the_thresholds() -> None:
+    processor = AdaptiveNoiseCancellation(
+        _CountingCanceller(), enable_below=5.0, disable_above=80.0
+    )
+    for frame in _frames(4.0, noise=0.0):
+        processor._process(frame)
+    # the SNR of clean input is below `disable_above`
+    assert processor.active and processor.switches == 0
+
+    processor = AdaptiveNoiseCancellation(
+        _CountingCanceller(), enable_below=5.0, disable_above=30.0
+    )
+    for frame in [*_frames(4.0, noise=0.0), *_frames(4.0, noise=400.0)]:
+        processor._process(frame)
+    # the SNR of the noisy input is between the thresholds
+    assert 5.0 < processor.snr < 30.0
+    assert not processor.active and processor.switches == 1
+
+
+def test_frames_are_cancelled_in_place() -> None:
+    frames = _frames(0.5, noise=3000.0)
+    inputs = [bytes(frame.data) for frame in frames]
+    processor = AdaptiveNoiseCancellation(WebRTCNoiseSuppression())
+
+    # kept like the recorder of the session keeps them
+    kept = [processor._process(frame) for frame in frames]
+
+    assert all(out is frame for out, frame in zip(kept, frames))
+    assert [bytes(out.data) for out in kept] != inputs
+
+
+def test_webrtc_noise_suppression_reduces_noise() -> None:
+    suppression = WebRTCNoiseSuppression()
+    noise = _frames(2.0, noise=1000.0)
+    noise_only = [frame for i, frame in enumerate(noise) if i % 20 >= 10]
+    level_before = np.std(
+        np.concatenate([np.frombuffer(f.data, np.int16) for f in noise_only])
+    )
+
+    for frame in noise:
+        suppression.process(frame)
+
+    level_after = np.std(
+        np.concatenate([np.frombuffer(f.data, np.int16) for f in noise_only[-5:]])
+    )
+    assert level_after < level_before / 2
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import pytest
+from livekit.agents.utils.hw import CPUMonitor
+
+from admission import AdaptiveLoad, LoadReporter
+
+
+class _FixedCPU(CPUMonitor):
+    def __init__(self, percent: float) -> None:
+        self._percent = percent
+
+    def cpu_count(self) -> float:
+        return 4.0
+
+    def cpu_percent(self, interval: float = 0.5) -> float:
+        return self._percent
+
+
+def _report(directory: Path, name: str, *, lag: float, in_flight: int, age=0.0):
+    (directory / f"{name}.json").write_text(
+        json.dumps(
+            {
+                "event_loop_lag": lag,
+                "in_flight": in_flight,
+                "updated_at": time.time() - age,
+            }
+        )
+    )
+
+
+def test_load_is_cpu_when_processes_are_idle(tmp_path: Path) -> None:
+    _report(tmp_path, "1", lag=0.001, in_flight=0)
+    load = AdaptiveLoad(tmp_path, cpu_monitor=_FixedCPU(0.3))
+    assert load() == pytest.approx(0.3)
+
+
+def test_event_loop_lag_drives_the_load(tmp_path: Path) -> None:
+    _report(tmp_path, "1", lag=0.002, in_flight=0)
+    _report(tmp_path, "2", lag=0.08, in_flight=0)
+    load = AdaptiveLoad(tmp_path, max_lag=0.1, cpu_monitor=_FixedCPU(0.3))
+    assert load() == pytest.approx(0.8)
+
+
+def test_inference_in_flight_is_summed(tmp_path: Path) -> None:
+    _report(tmp_path, "1", lag=0.0, in_flight=2)
+    _report(tmp_path, "2", lag=0.0, in_flight=1)
+    # from a process that died without removing its report
+    _report(tmp_path, "3", lag=1.0, in_flight=5, age=60.0)
+    load = AdaptiveLoad(tmp_path, cpu_monitor=_FixedCPU(0.1))
+    assert load() == pytest.approx(0.75)
+
+
+def test_load_is_capped(tmp_path: Path) -> None:
+    _report(tmp_path, "1", lag=2.0, in_flight=0)
+    load = AdaptiveLoad(tmp_path, cpu_monitor=_FixedCPU(0.1))
+    assert load() == 1.0
+
+
+async def test_reporter_writes_and_removes_its_report(tmp_path: Path) -> None:
+    reporter = LoadReporter(tmp_path, in_flight=lambda: 3, interval=0.01)
+    reporter.start()
+    await asyncio.sleep(0.1)
+
+    (path,) = tmp_path.glob("*.json")
+    report = json.loads(path.read_text())
+    assert report["in_flight"] == 3
+    assert report["event_loop_lag"] >= 0.0
+
+    await reporter.aclose()
+    assert not list(tmp_path.glob("*.json"))
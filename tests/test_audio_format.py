@@ -0,0 +1,34 @@
+from livekit import rtc
+from livekit.agents import vad
+
+from audio_format import AudioFormat, negotiate, vad_at
+from fakes import speech_frames
+from shared_models import load_vad
+
+
+def test_negotiate_rates_by_participant_kind() -> None:
+    assert negotiate(rtc.ParticipantKind.PARTICIPANT_KIND_SIP) == AudioFormat(
+        input_rate=8000, output_rate=8000
+    )
+    assert negotiate(rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD) == AudioFormat(
+        input_rate=16000, output_rate=24000
+    )
+
+
+async def test_vad_at_another_rate_shares_the_model() -> None:
+    vad_model = load_vad()
+    assert vad_at(vad_model, 16000) is vad_model
+
+    narrowband_vad = vad_at(vad_model, 8000)
+    assert narrowband_vad._onnx_session is vad_model._onnx_session
+
+    stream = narrowband_vad.stream()
+    for frame in speech_frames(0.5, sample_rate=8000):
+        stream.push_frame(frame)
+    stream.end_input()
+    inferences = [
+        ev async for ev in stream if ev.type == vad.VADEventType.INFERENCE_DONE
+    ]
+
+    # 32ms windows of 256 samples, without any resampling
+    assert len(inferences) == 15
@@ -0,0 +1,134 @@
+import asyncio
+
+from livekit.agents import llm, stt
+
+from circuit_breaker import CircuitBreaker, GuardedLLM, ProviderHealth, failover_stt
+from fakes import FakeLLM, FakeSTT, silence_frames, speech_frames
+
+
+def test_circuit_opens_on_failure_rate() -> None:
+    breaker = CircuitBreaker("groq", failure_rate=0.5, min_requests=4)
+    for _ in range(2):
+        breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_slow_requests_count_as_failures() -> None:
+    breaker = CircuitBreaker("groq", min_requests=2, slow_threshold=1.0)
+    breaker.record_success(0.5)
+    breaker.record_success(2.0)
+
+    assert breaker.state == "open"
+
+
+async def test_half_open_probe_restores_the_circuit() -> None:
+    breaker = CircuitBreaker("groq", min_requests=1, open_duration=0.05)
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    await asyncio.sleep(0.05)
+    assert breaker.state == "half_open"
+    # a single probe at a time
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    await asyncio.sleep(0.05)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+async def test_circuit_is_shared_by_the_processes(tmp_path) -> None:
+    # the breakers of two job processes
+    first = CircuitBreaker(
+        "groq", min_requests=4, open_duration=0.05, directory=tmp_path
+    )
+    second = CircuitBreaker(
+        "groq", min_requests=4, open_duration=0.05, directory=tmp_path
+    )
+    other = CircuitBreaker("cartesia", min_requests=1, directory=tmp_path)
+
+    first.record_success()
+    first.record_failure()
+    second.record_failure()
+    assert second.state == "closed"
+
+    # the 4th request of the host, half of them failed
+    second.record_failure()
+    assert first.state == "open"
+    assert not first.allow()
+    assert other.state == "closed"
+
+    await asyncio.sleep(0.05)
+    assert first.allow()
+    first.record_success()
+    assert second.state == "closed"
+    # the outcomes from before the circuit opened are over
+    second.record_failure()
+    assert second.state == "closed"
+
+
+def test_breakers_are_shared_by_name() -> None:
+    health = ProviderHealth(min_requests=3)
+    assert health.breaker("groq") is health.breaker("groq")
+    assert health.breaker("groq") is not health.breaker("cartesia")
+
+
+async def _reply(fallback: llm.LLM) -> str:
+    async with fallback.chat(chat_ctx=llm.ChatContext.empty()) as stream:
+        return "".join([chunk.delta.content async for chunk in stream if chunk.delta])
+
+
+async def test_open_circuit_moves_requests_to_the_fallback() -> None:
+    breaker = CircuitBreaker("groq", min_requests=1)
+    primary = FakeLLM(["From the primary"], ttft=0.0)
+    fallback = llm.FallbackAdapter(
+        [GuardedLLM(primary, breaker), FakeLLM(["From the fallback"], ttft=0.0)]
+    )
+
+    assert await _reply(fallback) == "From the primary"
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert await _reply(fallback) == "From the fallback"
+    # refused without sending a request
+    assert len(primary.delays) == 1
+
+
+async def _transcribe(adapter: stt.STT) -> list[str]:
+    stream = adapter.stream()
+    for frame in [*speech_frames(0.5), *silence_frames(0.5)]:
+        stream.push_frame(frame)
+        await asyncio.sleep(0)
+    stream.end_input()
+    transcripts = [
+        ev.alternatives[0].text
+        async for ev in stream
+        if ev.type == stt.SpeechEventType.FINAL_TRANSCRIPT
+    ]
+    await stream.aclose()
+    return transcripts
+
+
+async def test_open_circuit_moves_streams_to_the_fallback() -> None:
+    breaker = CircuitBreaker("deepgram", min_requests=1)
+    primary = FakeSTT(["From the primary"], latency=0.0)
+    adapter = failover_stt(
+        primary, breaker, FakeSTT(["From the fallback"], latency=0.0)
+    )
+
+    assert await _transcribe(adapter) == ["From the primary"]
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert await _transcribe(adapter) == ["From the fallback"]
+    # refused without opening a stream
+    assert len(primary.final_delays) == 1
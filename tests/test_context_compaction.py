@@ -0,0 +1,104 @@
+import asyncio
+
+from livekit.agents import llm
+
+from context_compaction import ContextCompactor
+from fakes import FakeLLM
+
+
+def _conversation(
+    turns: int, chat_ctx: llm.ChatContext | None = None
+) -> llm.ChatContext:
+    if chat_ctx is None:
+        chat_ctx = llm.ChatContext.empty()
+        chat_ctx.add_message(role="system", content="You are a helpful assistant.")
+
+    start = len(chat_ctx.messages()) // 2
+    for i in range(start, start + turns):
+        chat_ctx.add_message(role="user", content=f"Question {i}")
+        chat_ctx.add_message(role="assistant", content=f"Answer {i}")
+    return chat_ctx
+
+
+def _texts(chat_ctx: llm.ChatContext) -> list[str]:
+    return [message.text_content for message in chat_ctx.messages()]
+
+
+async def test_old_turns_are_folded_into_a_summary() -> None:
+    summarizer = FakeLLM(["The user asked questions 0 to 3."], ttft=0.0)
+    compactor = ContextCompactor(summarizer, keep_turns=2)
+
+    chat_ctx = _conversation(6)
+    # the summary isn't ready yet, the turns are still sent verbatim
+    assert len(compactor.compact(chat_ctx).messages()) == 13
+    await asyncio.sleep(0.1)
+    assert compactor.summary == "The user asked questions 0 to 3."
+
+    assert _texts(compactor.compact(chat_ctx)) == [
+        "You are a helpful assistant.",
+        "Summary of the earlier conversation: The user asked questions 0 to 3.",
+        "Question 4",
+        "Answer 4",
+        "Question 5",
+        "Answer 5",
+    ]
+    await compactor.aclose()
+
+
+async def test_summary_is_updated_incrementally() -> None:
+    summarizer = FakeLLM(["First summary.", "Second summary."], ttft=0.0)
+    compactor = ContextCompactor(summarizer, keep_turns=2, fold_turns=2)
+
+    chat_ctx = _conversation(4)
+    compactor.compact(chat_ctx)
+    await asyncio.sleep(0.1)
+    assert compactor.summary == "First summary."
+
+    _conversation(2, chat_ctx)
+    compactor.compact(chat_ctx)
+    await asyncio.sleep(0.1)
+
+    # the second summary only folds the turns 2 and 3 into the first one
+    assert compactor.summary == "Second summary."
+    assert summarizer.prompt_tokens[1] < summarizer.prompt_tokens[0] + 20
+    assert len(compactor.compact(chat_ctx).messages()) == 6
+    await compactor.aclose()
+
+
+async def test_requests_keep_their_prefix_between_folds() -> None:
+    summarizer = FakeLLM(["First summary.", "Second summary."], ttft=0.0)
+    compactor = ContextCompactor(summarizer, keep_turns=2, fold_turns=3)
+
+    chat_ctx = _conversation(5)
+    compactor.compact(chat_ctx)
+    await asyncio.sleep(0.1)
+    assert compactor.summary == "First summary."
+
+    # the next turns are appended to the previous request, the summary isn't
+    # updated until 3 more turns are waiting
+    previous = _texts(compactor.compact(chat_ctx))
+    for _ in range(2):
+        _conversation(1, chat_ctx)
+        texts = _texts(compactor.compact(chat_ctx))
+        await asyncio.sleep(0.1)
+        assert texts[: len(previous)] == previous
+        previous = texts
+    assert compactor.summary == "First summary."
+
+    _conversation(1, chat_ctx)
+    compactor.compact(chat_ctx)
+    await asyncio.sleep(0.1)
+    assert compactor.summary == "Second summary."
+    await compactor.aclose()
+
+
+async def test_oldest_turns_are_dropped_above_the_budget() -> None:
+    compactor = ContextCompactor(None, keep_turns=100, max_tokens=40)
+
+    assert _texts(compactor.compact(_conversation(10))) == [
+        "You are a helpful assistant.",
+        "Question 8",
+        "Answer 8",
+        "Question 9",
+        "Answer 9",
+    ]
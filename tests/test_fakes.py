@@ -0,0 +1,73 @@
+import pytest
+from livekit.agents import AgentSession, llm
+
+from agent import Assistant
+from fakes import (
+    FakeAudioInput,
+    FakeAudioOutput,
+    FakeLLM,
+    FakeSTT,
+    FakeTTS,
+    silence_frames,
+    speech_frames,
+)
+
+
+async def test_jitter_is_deterministic() -> None:
+    delays = []
+    for _ in range(2):
+        fake_llm = FakeLLM(["Hi"], ttft=0.2, jitter=0.05, seed=42)
+        for _ in range(3):
+            await fake_llm.chat(chat_ctx=llm.ChatContext.empty()).aclose()
+        delays.append(fake_llm.delays)
+
+    assert delays[0] == delays[1]
+    assert len(set(delays[0])) == 3
+
+
+async def test_tts_synthesize_goes_through_a_stream() -> None:
+    fake_tts = FakeTTS(ttfb=0.01, seconds_per_char=0.01)
+
+    frame = await fake_tts.synthesize("Hello there").collect()
+
+    assert frame.duration == pytest.approx(0.11, abs=0.01)
+    assert [stream.segments for stream in fake_tts.streams] == [["Hello there"]]
+
+
+async def test_voice_turn_with_fake_providers() -> None:
+    fake_stt = FakeSTT(["Hello there"], latency=0.05)
+    fake_llm = FakeLLM(["Hi! How can I help?"], ttft=0.05)
+    fake_tts = FakeTTS(ttfb=0.05)
+    audio_input, audio_output = FakeAudioInput(), FakeAudioOutput(realtime=False)
+    async with AgentSession(
+        stt=fake_stt,
+        llm=fake_llm,
+        tts=fake_tts,
+        turn_detection="stt",
+        min_endpointing_delay=0.0,
+    ) as session:
+        session.input.audio = audio_input
+        session.output.audio = audio_output
+        await session.start(Assistant())
+
+        await audio_input.push_frames(speech_frames(0.2))
+        await audio_input.push_frames(silence_frames(0.8))
+        audio_input.close()
+
+        messages = session.history.messages()
+        assert [(m.role, m.text_content) for m in messages] == [
+            ("user", "Hello there"),
+            ("assistant", "Hi! How can I help?"),
+        ]
+
+    latency = audio_output.first_frame_times[0] - fake_stt.utterance_end_times[0]
+    # STT, LLM and TTS latencies
+    assert latency >= 0.15
+
+
+async def test_audio_input_drops_frames_when_full() -> None:
+    audio_input = FakeAudioInput(max_queued=5)
+    await audio_input.push_frames(silence_frames(0.2), realtime=False)
+
+    assert audio_input.pushed_frames == 10
+    assert audio_input.dropped_frames == 5
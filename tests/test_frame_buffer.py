@@ -0,0 +1,61 @@
+import numpy as np
+from livekit import rtc
+from livekit.agents import vad
+
+from fakes import speech_frames
+from frame_buffer import chunk_views, frame_view
+from shared_models import load_vad
+
+
+def _samples(frame: rtc.AudioFrame) -> np.ndarray:
+    return np.frombuffer(frame.data, dtype=np.int16)
+
+
+def test_views_have_the_layout_of_audio_frames() -> None:
+    # `frame_view` sets the private attributes of `rtc.AudioFrame`, this fails when
+    # a new version of livekit-rtc changes them
+    samples = np.arange(640, dtype=np.int16)
+    view = frame_view(samples, 16000, 2)
+    frame = rtc.AudioFrame(samples.tobytes(), 16000, 2, 320)
+
+    assert vars(view).keys() == vars(frame).keys()
+    for name in ("sample_rate", "num_channels", "samples_per_channel", "duration"):
+        assert getattr(view, name) == getattr(frame, name)
+    assert bytes(view.data) == bytes(frame.data)
+    assert view.userdata == frame.userdata
+    assert view.to_wav_bytes() == frame.to_wav_bytes()
+    assert bytes(rtc.combine_audio_frames([view, frame]).data) == bytes(
+        rtc.combine_audio_frames([frame, frame]).data
+    )
+
+
+def test_chunks_share_the_samples_of_the_frame() -> None:
+    frame = next(iter(speech_frames(0.02, sample_rate=16000)))
+
+    chunks = chunk_views(frame)
+
+    assert [chunk.samples_per_channel for chunk in chunks] == [160, 160]
+    _samples(chunks[1])[:] = 0
+    assert not _samples(frame)[160:].any()
+    assert _samples(frame)[:160].any()
+
+
+async def test_vad_reads_frame_views() -> None:
+    frames = list(speech_frames(1.0, sample_rate=16000))
+    views = [frame_view(_samples(frame).copy(), 16000) for frame in frames]
+
+    probabilities = []
+    for inputs in [frames, views]:
+        stream = load_vad().stream()
+        for frame in inputs:
+            stream.push_frame(frame)
+        stream.end_input()
+        probabilities.append(
+            [
+                ev.probability
+                async for ev in stream
+                if ev.type == vad.VADEventType.INFERENCE_DONE
+            ]
+        )
+
+    assert probabilities[0] == probabilities[1]
@@ -0,0 +1,187 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+import pytest
+from aiohttp import web
+from livekit.agents import llm
+from livekit.plugins import openai
+
+from hedging import HedgedLLM, HedgingStats
+from provider_clients import ProviderClients
+
+StandIn = Callable[..., Awaitable[str]]
+
+
+@pytest.fixture
+async def chat_server() -> AsyncIterator[StandIn]:
+    """Starts OpenAI compatible stand-ins streaming a reply after a delay."""
+    runners: list[web.AppRunner] = []
+
+    async def _start(reply: str, *, ttft: float, status: int = 200) -> str:
+        async def _handle(request: web.Request) -> web.StreamResponse:
+            await asyncio.sleep(ttft)
+            if status != 200:
+                return web.Response(status=status)
+
+            resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await resp.prepare(request)
+            for i, word in enumerate(reply.split(" ")):
+                chunk = {
+                    "id": "chatcmpl",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": "stand-in",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": word if i == 0 else " " + word},
+                            "finish_reason": None,
+                        }
+                    ],
+                }
+                await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await resp.write(b"data: [DONE]\n\n")
+            return resp
+
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", _handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        runners.append(runner)
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1"
+
+    yield _start
+
+    for runner in runners:
+        await runner.cleanup()
+
+
+async def _reply(hedged: HedgedLLM) -> str:
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(role="user", content="Hello")
+    async with hedged.chat(chat_ctx=chat_ctx) as stream:
+        return "".join([chunk.delta.content async for chunk in stream if chunk.delta])
+
+
+def _hedged(
+    providers: ProviderClients,
+    primary: str,
+    secondary: str,
+    stats: HedgingStats | None = None,
+) -> HedgedLLM:
+    return HedgedLLM(
+        openai.LLM(
+            model="primary",
+            client=providers.openai_client(base_url=primary, api_key="test"),
+        ),
+        openai.LLM(
+            model="secondary",
+            client=providers.openai_client(base_url=secondary, api_key="test"),
+        ),
+        initial_deadline=0.2,
+        min_samples=3,
+        stats=stats,
+    )
+
+
+async def test_fast_primary_is_not_hedged(chat_server) -> None:
+    providers = ProviderClients()
+    hedged = _hedged(
+        providers,
+        await chat_server("From the primary", ttft=0.0),
+        await chat_server("From the secondary", ttft=0.0),
+    )
+
+    assert await _reply(hedged) == "From the primary"
+    assert len(hedged.stats.primary) == 1
+    assert len(hedged.stats.secondary) == 0
+    await providers.aclose()
+
+
+async def test_metrics_task_drains_the_events(chat_server) -> None:
+    providers = ProviderClients()
+    hedged = _hedged(
+        providers,
+        await chat_server("From the primary", ttft=0.0),
+        await chat_server("From the secondary", ttft=0.0),
+    )
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(role="user", content="Hello")
+
+    async with hedged.chat(chat_ctx=chat_ctx) as stream:
+        await stream.__anext__()
+        # reads its copy of the events as they come, instead of leaving them to
+        # pile up until the stream is closed
+        assert not stream._metrics_task.done()
+        async for _ in stream:
+            pass
+        await asyncio.wait_for(stream._metrics_task, timeout=1.0)
+    await providers.aclose()
+
+
+async def test_slow_primary_is_hedged(chat_server) -> None:
+    providers = ProviderClients()
+    hedged = _hedged(
+        providers,
+        await chat_server("From the primary", ttft=1.0),
+        await chat_server("From the secondary", ttft=0.0),
+    )
+
+    assert await _reply(hedged) == "From the secondary"
+    # the cancelled request counts as slow as the time it was waited for
+    assert hedged.stats.primary.quantile(0.5) >= 0.2
+    await providers.aclose()
+
+
+async def test_failed_primary_is_hedged(chat_server) -> None:
+    providers = ProviderClients()
+    hedged = _hedged(
+        providers,
+        await chat_server("From the primary", ttft=0.0, status=400),
+        await chat_server("From the secondary", ttft=0.0),
+    )
+
+    assert await _reply(hedged) == "From the secondary"
+    await providers.aclose()
+
+
+async def test_deadline_follows_primary_ttft(chat_server) -> None:
+    providers = ProviderClients()
+    hedged = _hedged(
+        providers,
+        await chat_server("From the primary", ttft=0.3),
+        await chat_server("From the secondary", ttft=0.0),
+    )
+    hedged.stats.primary.add(0.5)
+
+    assert hedged.deadline() == 0.2
+    for _ in range(2):
+        hedged.stats.primary.add(0.5)
+    # p95 of the primary once enough requests were measured
+    assert hedged.deadline() == pytest.approx(0.5)
+
+    assert await _reply(hedged) == "From the primary"
+    await providers.aclose()
+
+
+async def test_sessions_of_a_process_share_the_statistics(chat_server) -> None:
+    providers = ProviderClients()
+    primary = await chat_server("From the primary", ttft=0.0)
+    secondary = await chat_server("From the secondary", ttft=0.0)
+    stats = HedgingStats()
+
+    # one request per session, the statistics are kept from one to the next
+    for _ in range(3):
+        hedged = _hedged(providers, primary, secondary, stats)
+        assert await _reply(hedged) == "From the primary"
+        await hedged.aclose()
+
+    hedged = _hedged(providers, primary, secondary, stats)
+    assert len(hedged.stats.primary) == 3
+    # the quantile of the requests of the previous sessions, at least min_deadline
+    assert hedged.deadline() == 0.2
+    assert len(_hedged(providers, primary, secondary).stats.primary) == 0
+    await providers.aclose()
@@ -0,0 +1,67 @@
+import prometheus_client
+import pytest
+from livekit.agents import ConversationItemAddedEvent, llm, utils
+
+from latency import LatencyCollector
+
+
+def _turn(collector: LatencyCollector, e2e_latency: float) -> None:
+    user = llm.ChatMessage(role="user", content=["Hello"])
+    user.metrics = {
+        "stopped_speaking_at": 100.0,
+        "transcription_delay": 0.1,
+        "end_of_turn_delay": 0.3,
+        "on_user_turn_completed_delay": 0.0,
+    }
+    assistant = llm.ChatMessage(role="assistant", content=["Hi there!"])
+    assistant.metrics = {
+        "llm_node_ttft": 0.2,
+        "tts_node_ttfb": 0.15,
+        "e2e_latency": e2e_latency,
+    }
+    for item in (user, assistant):
+        collector._on_conversation_item_added(ConversationItemAddedEvent(item=item))
+
+
+def test_records_turn_timeline() -> None:
+    collector = LatencyCollector("room-a", per_room=True)
+    for e2e_latency in (0.6, 0.7, 0.8, 2.0):
+        _turn(collector, e2e_latency)
+
+    assert len(collector.turns) == 4
+    assert collector.turns[0].stages() == {
+        "transcription_delay": 0.1,
+        "end_of_turn_delay": 0.3,
+        "on_user_turn_completed_delay": 0.0,
+        "llm_ttft": 0.2,
+        "tts_ttfb": 0.15,
+        "e2e_latency": 0.6,
+    }
+
+    summary = collector.summary()
+    assert summary["e2e_latency"]["p50"] == pytest.approx(0.75)
+    assert summary["e2e_latency"]["p99"] > 1.9
+    assert summary["llm_ttft"] == {"p50": 0.2, "p95": 0.2, "p99": 0.2}
+
+    registry = prometheus_client.REGISTRY
+    count = registry.get_sample_value(
+        "lk_agent_room_turn_stage_seconds_count",
+        {"stage": "e2e_latency", "room": "room-a"},
+    )
+    assert count == 4
+    assert (
+        registry.get_sample_value(
+            "lk_agent_turn_stage_seconds_count",
+            {"stage": "e2e_latency", "nodename": utils.nodename()},
+        )
+        >= 4
+    )
+
+
+def test_assistant_message_without_user_turn() -> None:
+    collector = LatencyCollector("room-b")
+    greeting = llm.ChatMessage(role="assistant", content=["Hello!"])
+    greeting.metrics = {"tts_node_ttfb": 0.2}
+    collector._on_conversation_item_added(ConversationItemAddedEvent(item=greeting))
+
+    assert collector.turns[0].stages() == {"tts_ttfb": 0.2}
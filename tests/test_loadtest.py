@@ -0,0 +1,44 @@
+import wave
+from pathlib import Path
+
+import pytest
+
+from loadtest import wav_frames
+
+
+def _write_wav(path: Path, *, num_samples: int, channels: int = 1) -> None:
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(bytes(num_samples * channels * 2))
+
+
+def test_wav_frames(tmp_path: Path) -> None:
+    path = tmp_path / "utterance.wav"
+    # 1s and a partial frame, which is dropped
+    _write_wav(path, num_samples=16000 + 100)
+
+    frames = wav_frames(path)
+    assert len(frames) == 50
+    assert all(frame.sample_rate == 16000 for frame in frames)
+    assert all(frame.samples_per_channel == 320 for frame in frames)
+
+
+def test_wav_frames_requires_mono(tmp_path: Path) -> None:
+    path = tmp_path / "stereo.wav"
+    _write_wav(path, num_samples=16000, channels=2)
+
+    with pytest.raises(ValueError):
+        wav_frames(path)
+
+
+def test_wav_frames_resampled(tmp_path: Path) -> None:
+    path = tmp_path / "utterance.wav"
+    _write_wav(path, num_samples=16000)
+
+    frames = wav_frames(path, sample_rate=8000, frame_duration=0.01)
+    assert all(frame.sample_rate == 8000 for frame in frames)
+    assert all(frame.samples_per_channel == 80 for frame in frames)
+    # the resampler holds back a few samples of its filter
+    assert 95 <= len(frames) <= 100
@@ -0,0 +1,107 @@
+import pytest
+from livekit.agents import stt
+
+from fakes import FakeVAD, silence_frames, speech_frames
+from local_stt import LocalSTT, word_error_rate
+
+
+class _CountingUtterance:
+    def __init__(self, recognizer: "_CountingRecognizer") -> None:
+        self._recognizer = recognizer
+        self._num_bytes = 0
+
+    def accept(self, pcm: bytes) -> str:
+        self._num_bytes += len(pcm)
+        self._recognizer.accepted_bytes += len(pcm)
+        return self._transcript()
+
+    def finish(self) -> str:
+        return self._transcript()
+
+    def _transcript(self) -> str:
+        # one word per 100ms of audio
+        return " ".join(["word"] * (self._num_bytes // 2 // 1600))
+
+
+class _CountingRecognizer:
+    sample_rate = 16000
+
+    def __init__(self) -> None:
+        self.accepted_bytes = 0
+
+    def utterance(self) -> _CountingUtterance:
+        return _CountingUtterance(self)
+
+
+async def test_transcripts_are_streamed_from_the_speech_only() -> None:
+    recognizer = _CountingRecognizer()
+    local_stt = LocalSTT(recognizer, vad=FakeVAD(min_silence=0.2))
+
+    events = []
+    async with local_stt.stream() as stream:
+        for frame in [
+            *silence_frames(1.0),
+            *speech_frames(0.5),
+            *silence_frames(0.4),
+        ]:
+            stream.push_frame(frame)
+        stream.end_input()
+        async for ev in stream:
+            events.append(ev)
+
+    types = [ev.type for ev in events]
+    assert types[0] == stt.SpeechEventType.START_OF_SPEECH
+    assert types[-2:] == [
+        stt.SpeechEventType.FINAL_TRANSCRIPT,
+        stt.SpeechEventType.END_OF_SPEECH,
+    ]
+    interims = [
+        ev.alternatives[0].text
+        for ev in events
+        if ev.type == stt.SpeechEventType.INTERIM_TRANSCRIPT
+    ]
+    # the transcript grows while the user speaks
+    assert interims[:2] == ["word", "word word"]
+    # the speech and the silence ending it, the leading silence is never recognized
+    assert recognizer.accepted_bytes / 2 / 16000 == pytest.approx(0.7, abs=0.1)
+    assert events[-2].alternatives[0].text.count("word") == 7
+    await local_stt.aclose()
+
+
+async def test_onset_of_the_speech_is_recognized() -> None:
+    recognizer = _CountingRecognizer()
+    local_stt = LocalSTT(recognizer, vad=FakeVAD(min_silence=0.2, prefix_padding=0.1))
+
+    async with local_stt.stream() as stream:
+        # at the rate of the recognizer, not resampled
+        for frame in [
+            *silence_frames(1.0, sample_rate=16000),
+            *speech_frames(0.5, sample_rate=16000),
+            *silence_frames(0.4, sample_rate=16000),
+        ]:
+            stream.push_frame(frame)
+        stream.end_input()
+        async for _ in stream:
+            pass
+
+    # the padding, all the speech and the silence ending it (within a frame)
+    assert recognizer.accepted_bytes / 2 / 16000 == pytest.approx(0.8, abs=0.02)
+    await local_stt.aclose()
+
+
+async def test_recognize_resamples_to_the_recognizer() -> None:
+    local_stt = LocalSTT(_CountingRecognizer(), vad=FakeVAD())
+
+    ev = await local_stt.recognize(list(speech_frames(0.3, sample_rate=48000)))
+    assert ev.alternatives[0].text == "word word word"
+    await local_stt.aclose()
+
+
+def test_word_error_rate() -> None:
+    assert (
+        word_error_rate("What are your opening hours?", "what are your opening hours")
+        == 0.0
+    )
+    # one substitution and one deletion
+    assert word_error_rate("Reset my password please", "reset my passport") == 0.5
+    assert word_error_rate("", "") == 0.0
@@ -0,0 +1,58 @@
+import time
+from collections.abc import Iterator
+
+import pytest
+
+from local_tts import LocalTTS
+
+
+class _SlowVoice:
+    """Yields 100ms of audio every 100ms."""
+
+    sample_rate = 16000
+
+    def __init__(self, *, fail: bool = False) -> None:
+        self._fail = fail
+        self.finished_at: float | None = None
+
+    def synthesize(self, text: str) -> Iterator[bytes]:
+        for _ in range(3):
+            time.sleep(0.1)
+            if self._fail:
+                raise RuntimeError("voice failed")
+            yield bytes(self.sample_rate // 10 * 2)
+        self.finished_at = time.perf_counter()
+
+
+async def test_audio_is_streamed_as_it_is_synthesized() -> None:
+    voice = _SlowVoice()
+    local_tts = LocalTTS(voice)
+
+    first_audio_at, duration = None, 0.0
+    async with local_tts.synthesize("Hello there, how can I help?") as stream:
+        async for audio in stream:
+            first_audio_at = first_audio_at or time.perf_counter()
+            duration += audio.frame.duration
+
+    assert duration == pytest.approx(0.3, abs=0.02)
+    assert voice.finished_at is not None
+    assert first_audio_at < voice.finished_at - 0.1
+    await local_tts.aclose()
+
+
+async def test_audio_is_resampled_to_the_output_rate() -> None:
+    local_tts = LocalTTS(_SlowVoice(), sample_rate=24000)
+
+    frames = [audio.frame async for audio in local_tts.synthesize("Hello there")]
+
+    assert {frame.sample_rate for frame in frames} == {24000}
+    assert sum(frame.duration for frame in frames) == pytest.approx(0.3, abs=0.02)
+    await local_tts.aclose()
+
+
+async def test_synthesis_errors_are_raised() -> None:
+    local_tts = LocalTTS(_SlowVoice(fail=True))
+
+    with pytest.raises(Exception, match="voice failed"):
+        await local_tts.synthesize("Hello").collect()
+    await local_tts.aclose()
@@ -0,0 +1,92 @@
+from collections.abc import AsyncIterator
+
+from livekit import rtc
+
+from phrase_cache import PhraseCache, load_phrases
+
+SAMPLE_RATE = 24000
+
+
+def _cache(directory, **kwargs) -> PhraseCache:
+    opts = {"model": "cartesia/sonic-3", "voice": "voice", "sample_rate": SAMPLE_RATE}
+    return PhraseCache(directory, **{**opts, **kwargs})
+
+
+def _frame(value: int, samples: int = 240) -> rtc.AudioFrame:
+    return rtc.AudioFrame(
+        data=bytes([value]) * samples * 2,
+        sample_rate=SAMPLE_RATE,
+        num_channels=1,
+        samples_per_channel=samples,
+    )
+
+
+async def _text(*chunks: str) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+def test_put_and_read_back(tmp_path) -> None:
+    _cache(tmp_path).put("Hello! How can I help you today?", [_frame(1), _frame(2)])
+
+    # a new cache (e.g. in another job process) reads the index from disk
+    cache = _cache(tmp_path)
+    assert "hello how can I help you today" in cache
+    frames = list(cache.frames("Hello, how can I help you today?"))
+    audio = b"".join(bytes(f.data) for f in frames)
+    assert audio == bytes([1]) * 480 + bytes([2]) * 480
+    assert all(f.sample_rate == SAMPLE_RATE for f in frames)
+
+    # cached audio is specific to the voice and sample rate
+    assert "Hello! How can I help you today?" not in _cache(tmp_path, voice="other")
+    assert "Hello! How can I help you today?" not in _cache(tmp_path, sample_rate=8000)
+
+
+async def test_tts_node(tmp_path) -> None:
+    cache = _cache(tmp_path)
+    cache.put("Sure, one moment.", [_frame(7)])
+    synthesized: list[str] = []
+
+    async def _synthesize(text: AsyncIterator[str]) -> AsyncIterator[rtc.AudioFrame]:
+        synthesized.append("".join([chunk async for chunk in text]))
+        yield _frame(0)
+
+    frames = [f async for f in cache.tts_node(_text("Sure, one moment."), _synthesize)]
+    assert bytes(frames[0].data)[:2] == bytes([7, 7])
+    assert synthesized == []
+
+    # text diverging from the cached phrases is synthesized as a whole
+    frames = [
+        f
+        async for f in cache.tts_node(_text("Sure", ", the answer is 42."), _synthesize)
+    ]
+    assert synthesized == ["Sure, the answer is 42."]
+
+
+async def test_reply_starting_with_a_phrase(tmp_path) -> None:
+    cache = _cache(tmp_path)
+    cache.put("Sure, one moment.", [_frame(7)])
+    synthesized: list[str] = []
+
+    async def _synthesize(text: AsyncIterator[str]) -> AsyncIterator[rtc.AudioFrame]:
+        synthesized.append("".join([chunk async for chunk in text]))
+        yield _frame(0)
+
+    # streamed by the LLM token by token
+    reply = "Sure, one moment. The store opens at nine tomorrow, and closes at six."
+    tokens = [token + " " for token in reply.split(" ")]
+    frames = [f async for f in cache.tts_node(_text(*tokens), _synthesize)]
+
+    assert [bytes(f.data)[:1] for f in frames] == [bytes([7]), bytes([0])]
+    assert synthesized == ["The store opens at nine tomorrow, and closes at six. "]
+
+    # a phrase ends at a punctuation mark, not in the middle of a clause
+    reply = "Sure, one moment.5 is the answer."
+    frames = [f async for f in cache.tts_node(_text(reply), _synthesize)]
+    assert synthesized[-1] == reply
+
+
+def test_load_phrases(tmp_path) -> None:
+    path = tmp_path / "phrases.txt"
+    path.write_text("# comment\nHello!\n\n  Goodbye.  \n")
+    assert load_phrases(path) == ["Hello!", "Goodbye."]
@@ -0,0 +1,66 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from pipeline_config import PipelineConfig, PipelineConfigFile, load_config
+from session_profile import SIP_PROFILE, WEBRTC_PROFILE
+
+SRC = Path(__file__).parent.parent / "src"
+
+
+def test_default_config_file() -> None:
+    assert load_config(SRC / "pipeline.toml") == PipelineConfig()
+    assert PipelineConfig().profile(WEBRTC_PROFILE) == WEBRTC_PROFILE
+    assert PipelineConfig().profile(SIP_PROFILE) == SIP_PROFILE
+
+
+def test_invalid_config(tmp_path: Path) -> None:
+    path = tmp_path / "pipeline.toml"
+    for content in [
+        '[tts]\nvoices = "a"\n',
+        "[turn]\nmin_endpointing_delay = true\n",
+        "[turn]\nmin_endpointing_delay = 2\nmax_endpointing_delay = 1\n",
+        "[turn]\nmax_endpointing_delay = 0\n",
+        "[vad]\n",
+    ]:
+        path.write_text(content)
+        with pytest.raises(ValueError):
+            load_config(path)
+
+
+def test_delays_contradicting_the_profile_are_ignored(caplog) -> None:
+    # above the maximum of the SIP profile, not of the WebRTC one
+    config = PipelineConfig(min_endpointing_delay=2.8)
+
+    assert config.profile(WEBRTC_PROFILE).min_endpointing_delay == 2.8
+    profile = config.profile(SIP_PROFILE)
+    assert profile.min_endpointing_delay == SIP_PROFILE.min_endpointing_delay
+    assert profile.max_endpointing_delay == SIP_PROFILE.max_endpointing_delay
+    assert "invalid endpointing delays" in caplog.text
+
+
+def test_reload_on_change(tmp_path: Path) -> None:
+    path = tmp_path / "pipeline.toml"
+    path.write_text('[tts]\nvoice = "a"\n')
+    config_file = PipelineConfigFile(path)
+    config = config_file.current()
+    assert config.tts_voice == "a"
+    assert config_file.current() is config
+
+    def _write(content: str) -> None:
+        # modification times can be coarser than the writes of a test
+        stamp = path.stat().st_mtime_ns + 1_000_000_000
+        path.write_text(content)
+        os.utime(path, ns=(stamp, stamp))
+
+    _write('[tts]\nvoice = "b"\n\n[turn]\nmax_endpointing_delay = 2.0\n')
+    config = config_file.current()
+    assert config.tts_voice == "b"
+    assert config.profile(SIP_PROFILE).max_endpointing_delay == 2.0
+    assert config.profile(SIP_PROFILE).min_endpointing_delay == 0.4
+    assert config_file.reloads == 1
+
+    # an invalid edit keeps the last valid config
+    _write("[tts\n")
+    assert config_file.current() is config
@@ -0,0 +1,58 @@
+from livekit.agents import function_tool, llm
+
+from prompt_layout import PromptCacheStats, PromptLayout, canonicalize
+
+
+def test_canonical_instructions_ignore_indentation() -> None:
+    indented = """You are a helpful assistant.
+            Be concise.
+
+
+            Be friendly.  """
+    wrapped = "You are a helpful  assistant.\r\nBe concise.\n\nBe friendly."
+
+    assert (
+        canonicalize(indented)
+        == "You are a helpful assistant.\nBe concise.\n\nBe friendly."
+    )
+    assert canonicalize(wrapped) == canonicalize(indented)
+
+
+@function_tool
+async def lookup_weather(location: str) -> str:
+    """Look up the weather."""
+    return "sunny"
+
+
+@function_tool
+async def book_table(time: str) -> str:
+    """Book a table."""
+    return "booked"
+
+
+def test_volatile_context_goes_last() -> None:
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(
+        role="system", content="  You are a helpful assistant.\n  Be concise."
+    )
+    chat_ctx.add_message(role="user", content="What's the weather?")
+    layout = PromptLayout(volatile=lambda: {"time": "Monday 10:00 UTC"})
+
+    request_ctx, tools = layout.layout(chat_ctx, [lookup_weather, book_table])
+
+    assert [(m.role, m.text_content) for m in request_ctx.messages()] == [
+        ("system", "You are a helpful assistant.\nBe concise."),
+        ("user", "What's the weather?"),
+        ("system", "Context of this call:\n- time: Monday 10:00 UTC"),
+    ]
+    assert tools == [book_table, lookup_weather]
+    # the history of the session is left as is
+    assert len(chat_ctx.messages()) == 2
+
+
+def test_cached_token_ratio() -> None:
+    stats = PromptCacheStats()
+    stats.record(1000, 0)
+    stats.record(1200, 1000)
+
+    assert stats.hit_ratio() == 1000 / 2200
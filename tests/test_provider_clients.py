@@ -0,0 +1,86 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+import pytest
+from aiohttp import web
+
+from provider_clients import ProviderClients
+
+
+@pytest.fixture
+async def stand_in_server() -> AsyncIterator[tuple[str, set[int]]]:
+    """Local provider stand-in, reporting the TCP connections it accepted."""
+    connections: set[int] = set()
+
+    async def _handle(request: web.Request) -> web.Response:
+        connections.add(id(request.transport))
+        if request.path == "/v1/models":
+            return web.json_response({"object": "list", "data": []})
+        return web.Response(status=401)
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", _handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    yield f"http://127.0.0.1:{port}", connections
+
+    await runner.cleanup()
+
+
+async def test_warm_http_connection_is_reused(stand_in_server) -> None:
+    url, connections = stand_in_server
+    providers = ProviderClients(warm_urls=[f"{url}/v1/listen"])
+
+    await providers.warm()
+    assert len(connections) == 1
+
+    for _ in range(3):
+        async with providers.http_session().get(f"{url}/v1/listen") as resp:
+            assert resp.status == 401
+
+    assert len(connections) == 1
+    await providers.aclose()
+
+
+async def test_warm_openai_connection_is_reused(stand_in_server) -> None:
+    url, connections = stand_in_server
+    providers = ProviderClients()
+    client = providers.openai_client(base_url=f"{url}/v1", api_key="test")
+
+    # one client per endpoint
+    assert providers.openai_client(base_url=f"{url}/v1", api_key="test") is client
+
+    await providers.warm()
+    assert len(connections) == 1
+
+    await client.models.list()
+    assert len(connections) == 1
+    await providers.aclose()
+
+
+async def test_warm_ignores_unreachable_providers() -> None:
+    providers = ProviderClients(warm_urls=["http://127.0.0.1:9"])
+    providers.openai_client(base_url="http://127.0.0.1:9/v1", api_key="test")
+
+    await providers.warm()
+    await providers.aclose()
+
+
+def test_clients_are_closed_when_the_process_exits() -> None:
+    providers = ProviderClients()
+    loop = asyncio.new_event_loop()
+
+    # the jobs of the process are done with the clients, their loop is stopped
+    async def _job():
+        return providers.http_session()
+
+    http_session = loop.run_until_complete(_job())
+    assert not http_session.closed
+
+    providers._close_at_exit()
+    assert http_session.closed
+    loop.close()
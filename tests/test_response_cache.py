@@ -0,0 +1,284 @@
+import asyncio
+import time
+from collections.abc import AsyncIterable, AsyncIterator
+
+import prometheus_client
+from livekit import rtc
+from livekit.agents import llm, utils
+from livekit.agents import tts as agents_tts
+
+from fakes import FakeTTS
+from response_cache import CachedResponse, ResponseCache, ResponseCacheNodes
+
+INSTRUCTIONS = "You are a helpful voice AI assistant."
+
+
+def _frames(count: int, sample_rate: int = 24000) -> list[rtc.AudioFrame]:
+    samples = sample_rate // 50
+    return [
+        rtc.AudioFrame(
+            data=bytes([i % 256]) * samples * 2,
+            sample_rate=sample_rate,
+            num_channels=1,
+            samples_per_channel=samples,
+        )
+        for i in range(count)
+    ]
+
+
+async def _text(*chunks: str) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_exact_match(tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "cache.db")
+    frames = _frames(5)
+    await cache.store(
+        INSTRUCTIONS, "What are your opening hours?", CachedResponse("9 to 5.", frames)
+    )
+
+    hit = await cache.lookup(INSTRUCTIONS, "what are your  opening hours")
+    assert hit is not None
+    assert hit.text == "9 to 5."
+    assert b"".join(bytes(f.data) for f in hit.frames) == b"".join(
+        bytes(f.data) for f in frames
+    )
+
+    # different instructions are a different cache scope
+    assert (
+        await cache.lookup("Other instructions", "What are your opening hours?") is None
+    )
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+
+async def test_similarity_match(tmp_path) -> None:
+    vectors = {
+        "what are your opening hours": [1.0, 0.0, 0.1],
+        "when are you open": [0.98, 0.05, 0.1],
+        "where are you located": [0.0, 1.0, 0.0],
+    }
+
+    async def _embed(text: str) -> list[float]:
+        return vectors[text]
+
+    cache = ResponseCache(tmp_path / "cache.db", embedder=_embed)
+    await cache.store(
+        INSTRUCTIONS,
+        "What are your opening hours?",
+        CachedResponse("9 to 5.", _frames(2)),
+    )
+
+    hit = await cache.lookup(INSTRUCTIONS, "When are you open?")
+    assert hit is not None and hit.text == "9 to 5."
+    assert await cache.lookup(INSTRUCTIONS, "Where are you located?") is None
+    assert cache.stats.similar_hits == 1
+
+
+async def test_ttl_and_size_eviction(tmp_path) -> None:
+    frame_bytes = len(_frames(1)[0].data.tobytes())
+    cache = ResponseCache(tmp_path / "cache.db", max_bytes=frame_bytes * 25)
+
+    for question in ("one", "two", "three"):
+        await cache.store(INSTRUCTIONS, question, CachedResponse("a", _frames(10)))
+
+    # the least recently used entry was evicted to stay under max_bytes
+    assert await cache.lookup(INSTRUCTIONS, "one") is None
+    assert await cache.lookup(INSTRUCTIONS, "three") is not None
+    assert cache.stats.evictions == 1
+
+    cache._ttl = 0
+    assert await cache.lookup(INSTRUCTIONS, "three") is None
+
+
+async def test_nodes_store_then_replay(tmp_path) -> None:
+    nodes = ResponseCacheNodes(ResponseCache(tmp_path / "cache.db"))
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(role="user", content="What are your opening hours?")
+    synthesized = _frames(3)
+    first_token = asyncio.Event()
+    first_token.set()
+    responses = 0
+
+    async def _llm() -> AsyncIterator[str]:
+        nonlocal responses
+        await first_token.wait()
+        yield "We're open "
+        yield "9 to 5."
+        responses += 1
+
+    async def _synthesize(text: AsyncIterator[str]) -> AsyncIterator[rtc.AudioFrame]:
+        async for _ in text:
+            pass
+        for frame in synthesized:
+            yield frame
+
+    # miss: the LLM and TTS run, and the response is stored
+    text = [c async for c in nodes.llm_node(INSTRUCTIONS, chat_ctx, _llm())]
+    frames = [f async for f in nodes.tts_node(_text(*text), _synthesize)]
+    assert responses == 1
+    assert len(frames) == 3
+    # stored in the background, after the playout
+    await nodes.aclose()
+
+    # hit: the LLM request started with the lookup is cancelled and the cached
+    # audio is replayed
+    first_token.clear()
+    text = [c async for c in nodes.llm_node(INSTRUCTIONS, chat_ctx, _llm())]
+    assert text == ["We're open 9 to 5."]
+    synthesized = []
+    frames = [f async for f in nodes.tts_node(_text(*text), _synthesize)]
+    assert responses == 1
+    assert sum(f.samples_per_channel for f in frames) == 3 * 480
+
+
+def _chat_ctx(*messages: tuple[str, str]) -> llm.ChatContext:
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(role="system", content=INSTRUCTIONS)
+    for role, content in messages:
+        chat_ctx.add_message(role=role, content=content)
+    return chat_ctx
+
+
+async def _llm_reply(*chunks: str) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def _synthesized(text: AsyncIterable[str]) -> AsyncIterator[rtc.AudioFrame]:
+    async for _ in text:
+        pass
+    for frame in _frames(2):
+        yield frame
+
+
+async def _turn(
+    nodes: ResponseCacheNodes,
+    chat_ctx: llm.ChatContext,
+    reply: str,
+    *,
+    cacheable: bool = True,
+) -> list[str]:
+    text = [
+        chunk
+        async for chunk in nodes.llm_node(
+            INSTRUCTIONS, chat_ctx, _llm_reply(reply), cacheable=cacheable
+        )
+    ]
+    async for _ in nodes.tts_node(_text(*text), _synthesized):
+        pass
+    await nodes.aclose()
+    return text
+
+
+async def test_replies_depend_on_the_conversation(tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "cache.db")
+    nodes = ResponseCacheNodes(cache)
+
+    pizza = _chat_ctx(
+        ("user", "I'd like a pizza"),
+        ("assistant", "Sure, one pizza."),
+        ("user", "What was my order again?"),
+    )
+    salad = _chat_ctx(
+        ("user", "I'd like a salad"),
+        ("assistant", "Sure, one salad."),
+        ("user", "What was my order again?"),
+    )
+    assert await _turn(nodes, pizza, "One pizza.") == ["One pizza."]
+    # the same question after another conversation isn't answered from the cache
+    assert await _turn(nodes, salad, "One salad.") == ["One salad."]
+    assert cache.stats.hits == 0 and cache.stats.stores == 2
+
+    # the same conversation is
+    assert await _turn(nodes, pizza, "Something else.") == ["One pizza."]
+    assert cache.stats.hits == 1
+
+
+async def test_turns_with_a_call_context_are_not_cached(tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "cache.db")
+    nodes = ResponseCacheNodes(cache)
+    chat_ctx = _chat_ctx(("user", "What time is it?"))
+
+    await _turn(nodes, chat_ctx, "It's 10 o'clock.", cacheable=False)
+    await _turn(nodes, chat_ctx, "It's 11 o'clock.", cacheable=False)
+    assert cache.stats.stores == 0
+    assert cache.stats.hits + cache.stats.misses == 0
+
+
+async def test_replies_of_a_fallback_voice_are_not_stored(tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "cache.db")
+    nodes = ResponseCacheNodes(cache, voice="cartesia")
+    primary, fallback = FakeTTS(), FakeTTS()
+    adapter = agents_tts.FallbackAdapter([primary, fallback])
+    nodes.watch_fallback(adapter)
+    chat_ctx = _chat_ctx(("user", "What are your opening hours?"))
+
+    adapter.emit(
+        "tts_availability_changed", agents_tts.AvailabilityChangedEvent(primary, False)
+    )
+    await _turn(nodes, chat_ctx, "9 to 5.")
+    assert cache.stats.stores == 0
+
+    adapter.emit(
+        "tts_availability_changed", agents_tts.AvailabilityChangedEvent(primary, True)
+    )
+    await _turn(nodes, chat_ctx, "9 to 5.")
+    assert cache.stats.stores == 1
+    await adapter.aclose()
+
+
+async def test_audio_is_scoped_to_the_voice(tmp_path) -> None:
+    cache = ResponseCache(tmp_path / "cache.db")
+    await cache.store(
+        INSTRUCTIONS,
+        "What are your opening hours?",
+        CachedResponse("9 to 5.", _frames(2)),
+        voice="sonic-3:voice-a:24000",
+    )
+
+    hit = await cache.lookup(
+        INSTRUCTIONS, "What are your opening hours?", voice="sonic-3:voice-a:24000"
+    )
+    assert hit is not None
+    for voice in ("sonic-3:voice-b:24000", "sonic-3:voice-a:16000"):
+        assert (
+            await cache.lookup(
+                INSTRUCTIONS, "What are your opening hours?", voice=voice
+            )
+            is None
+        )
+
+
+async def test_slow_lookup_doesnt_hold_the_llm(tmp_path) -> None:
+    async def _slow_embed(text: str) -> list[float]:
+        await asyncio.sleep(10)
+        return [1.0]
+
+    cache = ResponseCache(tmp_path / "cache.db", embedder=_slow_embed)
+    nodes = ResponseCacheNodes(cache, lookup_timeout=0.05)
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(role="user", content="What are your opening hours?")
+
+    async def _llm() -> AsyncIterator[str]:
+        yield "We're open "
+        yield "9 to 5."
+
+    registry = prometheus_client.REGISTRY
+    timeouts = registry.get_sample_value(
+        "lk_agent_response_cache_lookups_total",
+        {"result": "timeout", "nodename": utils.nodename()},
+    )
+    started_at = time.perf_counter()
+    text = [c async for c in nodes.llm_node(INSTRUCTIONS, chat_ctx, _llm())]
+    assert text == ["We're open ", "9 to 5."]
+    assert time.perf_counter() - started_at < 1.0
+    assert cache.stats.timeouts == 1 and cache.stats.misses == 0
+    assert (
+        registry.get_sample_value(
+            "lk_agent_response_cache_lookups_total",
+            {"result": "timeout", "nodename": utils.nodename()},
+        )
+        == (timeouts or 0) + 1
+    )
@@ -0,0 +1,48 @@
+from livekit import rtc
+from livekit.protocol import agent, models
+
+from session_profile import (
+    SIP_PROFILE,
+    WEBRTC_PROFILE,
+    job_participant_kind,
+    profile_for,
+)
+from shared_models import load_vad
+
+
+def test_profile_for_participant_kind() -> None:
+    assert profile_for(rtc.ParticipantKind.PARTICIPANT_KIND_SIP) is SIP_PROFILE
+    assert profile_for(rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD) is WEBRTC_PROFILE
+
+
+def test_sip_profile_vad() -> None:
+    vad = load_vad()
+    assert WEBRTC_PROFILE.vad(vad) is vad
+
+    sip_vad = SIP_PROFILE.vad(vad)
+    assert sip_vad._onnx_session is vad._onnx_session
+    assert sip_vad._opts.sample_rate == 8000
+    assert sip_vad._opts.activation_threshold == 0.6
+    assert sip_vad._opts.min_silence_duration == 0.4
+
+
+def test_job_participant_kind() -> None:
+    def _job(room_name: str, kind: int | None = None) -> agent.Job:
+        job = agent.Job(room=models.Room(name=room_name))
+        if kind is not None:
+            job.participant.CopyFrom(models.ParticipantInfo(kind=kind))
+        return job
+
+    sip = rtc.ParticipantKind.PARTICIPANT_KIND_SIP
+    standard = rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD
+    assert job_participant_kind(_job("room", models.ParticipantInfo.Kind.SIP)) == sip
+    assert (
+        job_participant_kind(
+            _job("call-1", models.ParticipantInfo.Kind.STANDARD),
+            sip_room_prefix="call-",
+        )
+        == standard
+    )
+    assert job_participant_kind(_job("call-1"), sip_room_prefix="call-") == sip
+    assert job_participant_kind(_job("call-1")) == standard
+    assert job_participant_kind(_job("room"), sip_room_prefix="call-") == standard
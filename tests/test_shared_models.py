@@ -0,0 +1,37 @@
+import os
+import stat
+
+from shared_models import SHARED_VAD_MODEL_ENV, load_vad, publish_vad_model
+
+
+def test_publish_vad_model(tmp_path, monkeypatch) -> None:
+    # restored once the test is over, publish_vad_model sets it
+    monkeypatch.setenv(SHARED_VAD_MODEL_ENV, "")
+
+    path = publish_vad_model(tmp_path)
+
+    assert path.is_file()
+    assert stat.S_IMODE(path.stat().st_mode) == 0o444
+    assert os.environ[SHARED_VAD_MODEL_ENV] == str(path)
+
+    vad = load_vad(min_silence_duration=0.3)
+    assert vad.model == "silero"
+
+
+def test_publish_vad_model_over_a_previous_one(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv(SHARED_VAD_MODEL_ENV, "")
+
+    # left read-only by a server that had the same pid
+    first = publish_vad_model(tmp_path)
+    second = publish_vad_model(tmp_path)
+
+    assert second == first
+    assert stat.S_IMODE(second.stat().st_mode) == 0o444
+    assert [p.name for p in tmp_path.iterdir()] == [second.name]
+
+
+def test_load_vad_without_shared_model(monkeypatch) -> None:
+    monkeypatch.setenv(SHARED_VAD_MODEL_ENV, "/nonexistent/silero.ort")
+
+    vad = load_vad()
+    assert vad.model == "silero"
@@ -0,0 +1,78 @@
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator
+
+from livekit import rtc
+from livekit.agents import AgentSession
+
+from agent import Assistant
+from fakes import (
+    FakeAudioInput,
+    FakeAudioOutput,
+    FakeLLM,
+    FakeSTT,
+    FakeTTS,
+    FakeTurnDetector,
+    silence_frames,
+    speech_frames,
+)
+from speculation import SpeculativeTTS, _Speculation
+
+
+async def _text(chunks: list[str]) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_sentence_mode_holds_the_rest_of_the_reply() -> None:
+    speculation = SpeculativeTTS(mode="sentence")
+    speculation._awaiting_turn = True
+    speculation._latest = _Speculation(created_at=0.0)
+
+    synthesized: list[str] = []
+
+    async def _synthesize(text: AsyncIterable[str]) -> AsyncIterator[rtc.AudioFrame]:
+        async for chunk in text:
+            synthesized.append(chunk)
+            yield rtc.AudioFrame.create(24000, 1, 480)
+
+    frames = speculation.tts_node(
+        _text(["Sure!", " Let me", " check that."]), _synthesize
+    )
+    consume = asyncio.create_task(asyncio.wait_for(_drain(frames), 1.0))
+    await asyncio.sleep(0.05)
+    assert synthesized == ["Sure!"]
+
+    speculation.turn_committed()
+    assert await consume == 3
+    assert synthesized == ["Sure!", " Let me", " check that."]
+
+
+async def _drain(frames: AsyncIterable[rtc.AudioFrame]) -> int:
+    return len([frame async for frame in frames])
+
+
+async def test_preemptive_reply_is_counted_as_used() -> None:
+    speculation = SpeculativeTTS()
+    audio_input = FakeAudioInput()
+    async with AgentSession(
+        stt=FakeSTT(["What time is it?"], latency=0.05),
+        llm=FakeLLM(["It's noon."], ttft=0.05),
+        tts=FakeTTS(ttfb=0.05),
+        # the end of turn is confirmed after the reply was synthesized
+        turn_detection=FakeTurnDetector(delay=0.3),
+        min_endpointing_delay=0.0,
+        preemptive_generation=True,
+    ) as session:
+        session.input.audio = audio_input
+        session.output.audio = FakeAudioOutput(realtime=False)
+        speculation.attach(session)
+        await session.start(Assistant(speculation=speculation))
+
+        await audio_input.push_frames(speech_frames(0.2))
+        await audio_input.push_frames(silence_frames(1.0))
+        audio_input.close()
+
+    assert speculation.stats.used == 1
+    assert speculation.stats.discarded == 0
+    # the LLM and TTS latencies were hidden behind the end of turn detection
+    assert speculation.stats.saved[0] >= 0.1
@@ -0,0 +1,102 @@
+from collections.abc import AsyncIterator
+
+import pytest
+
+from fakes import FakeTTS, silence_frames
+from phrase_cache import PhraseCache
+from tts_chunking import AdaptiveChunker
+
+
+async def _tokens(text: str) -> AsyncIterator[str]:
+    for token in text.split(" "):
+        yield token + " "
+
+
+async def _chunks(chunker: AdaptiveChunker, text: str) -> list[str]:
+    return [chunk async for chunk in chunker.chunks(_tokens(text))]
+
+
+async def test_first_chunk_is_a_clause() -> None:
+    chunks = await _chunks(
+        AdaptiveChunker(),
+        "Sure thing, we're open from nine to six. On Saturdays we close at noon. Ok.",
+    )
+
+    assert chunks == [
+        "Sure thing,",
+        "we're open from nine to six.",
+        # too short to be flushed on its own
+        "On Saturdays we close at noon. Ok.",
+    ]
+
+
+async def test_first_chunk_is_cut_after_a_few_words() -> None:
+    chunks = await _chunks(
+        AdaptiveChunker(max_first_words=4),
+        "Our opening hours are from nine to six every day.",
+    )
+
+    assert chunks == ["Our opening hours are", "from nine to six every day."]
+
+
+async def test_chunks_are_flushed_in_a_single_stream() -> None:
+    chunker = AdaptiveChunker(min_first_words=2, max_first_words=8)
+    fake_tts = FakeTTS(ttfb=0.01, seconds_per_char=0.01)
+
+    frames = [
+        frame
+        async for frame in chunker.tts_node(
+            _tokens("Let me check our calendar. We have a slot at three."),
+            fake_tts.stream,
+        )
+    ]
+
+    [stream] = fake_tts.streams
+    assert stream.segments == [
+        "Let me check our calendar. ",
+        "We have a slot at three. ",
+    ]
+    assert sum(frame.duration for frame in frames) == pytest.approx(0.52, abs=0.01)
+    # a fast TTS only needs the minimum
+    assert chunker.first_chunk_words == 2
+
+
+async def test_chunks_are_pushed_without_flush() -> None:
+    fake_tts = FakeTTS(ttfb=0.01, seconds_per_char=0.01)
+
+    frames = AdaptiveChunker().tts_node(
+        _tokens("Let me check our calendar. We have a slot at three."),
+        fake_tts.stream,
+        flush=False,
+    )
+    [_ async for _ in frames]
+
+    [stream] = fake_tts.streams
+    assert stream.segments == ["Let me check our calendar. We have a slot at three. "]
+
+
+async def test_cached_phrases_are_not_split(tmp_path) -> None:
+    cache = PhraseCache(tmp_path, model="model", voice="voice", sample_rate=24000)
+    cached = "Sure thing. Let me check that for you."
+    cache.put(cached, silence_frames(1.0, sample_rate=24000))
+    chunker = AdaptiveChunker(min_first_words=2, max_first_words=8)
+    # a fast TTS, the first chunks are 2 words
+    chunker._record(0.3, words=1, duration=0.35)
+    fake_tts = FakeTTS(ttfb=0.01, seconds_per_char=0.01, sample_rate=24000)
+
+    # composed like `Assistant.tts_node`: the phrase cache sees the whole reply
+    async def _reply(text: str) -> float:
+        frames = cache.tts_node(
+            _tokens(text), lambda t: chunker.tts_node(t, fake_tts.stream)
+        )
+        return sum([frame.duration async for frame in frames])
+
+    assert await _reply(cached) == pytest.approx(1.0)
+    assert fake_tts.streams == []
+
+    await _reply("Sure thing. We open at nine every day of the week.")
+    [stream] = fake_tts.streams
+    assert stream.segments == [
+        "Sure thing. ",
+        "We open at nine every day of the week. ",
+    ]
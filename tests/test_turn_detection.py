@@ -0,0 +1,228 @@
+import json
+
+import numpy as np
+import pytest
+from livekit.agents import llm
+from livekit.agents.inference_runner import _InferenceRunner
+from livekit.plugins.turn_detector.multilingual import _EUORunnerMultilingual
+
+from turn_detection import CachedEOURunner, PrewarmedTurnDetector
+
+
+class _FakeRunner(_InferenceRunner):
+    INFERENCE_METHOD = "lk_end_of_utterance_multilingual"
+
+    def __init__(self) -> None:
+        self.initialized = False
+        self.calls: list[list[dict]] = []
+        self.session_ids: list[str | None] = []
+
+    @classmethod
+    def model_revision(cls) -> str:
+        return "fake"
+
+    def initialize(self) -> None:
+        self.initialized = True
+
+    def run(self, data: bytes) -> bytes | None:
+        request = json.loads(data)
+        self.calls.append(request["chat_ctx"])
+        self.session_ids.append(request.get("session_id"))
+        return json.dumps({"eou_probability": 0.9, "duration": 0.0}).encode()
+
+
+async def test_prewarmed_turn_detector() -> None:
+    detector = PrewarmedTurnDetector.load(
+        _FakeRunner, languages={"en": {"threshold": 0.01}}
+    )
+    runner = detector._executor._runners[_FakeRunner.INFERENCE_METHOD]
+
+    # the model was loaded and warmed up with a first prediction
+    assert runner.initialized
+    assert len(runner.calls) == 1
+
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(role="user", content="What's the weather like")
+
+    model = detector.model()
+    assert await model.supports_language("en-US")
+    assert await model.predict_end_of_turn(chat_ctx) == 0.9
+    assert runner.calls[-1] == [{"role": "user", "content": "What's the weather like"}]
+
+    # every session of the process shares the same runner
+    other = detector.model(unlikely_threshold=0.2)
+    assert await other.unlikely_threshold("en") == 0.2
+    await other.predict_end_of_turn(chat_ctx)
+    assert len(runner.calls) == 3
+    assert detector.in_flight == 0
+    # the requests of the plugin, with the session of the model
+    first, second = runner.session_ids[1:]
+    assert first and second and first != second
+
+
+class _CharTokenizer:
+    pad_token_id = 0
+
+    def __init__(self) -> None:
+        self.tokenized: list[str] = []
+
+    def __call__(
+        self,
+        text: str,
+        *,
+        return_tensors: str | None = None,
+        max_length: int | None = None,
+        truncation: bool = False,
+        **kwargs,
+    ) -> dict:
+        self.tokenized.append(text)
+        ids = [ord(c) for c in text]
+        if truncation and max_length:
+            # truncated on the left, like the tokenizer loaded by the plugin
+            ids = ids[-max_length:]
+        return {"input_ids": np.array([ids]) if return_tensors == "np" else ids}
+
+    def apply_chat_template(self, chat_ctx: list[dict], **kwargs) -> str:
+        return "".join(
+            f"<|im_start|>{msg['role']}\n{msg['content']}<|im_end|>\n"
+            for msg in chat_ctx
+        )
+
+
+class _CausalSession:
+    """Probability at every token from the tokens up to it only."""
+
+    def run(self, output_names, inputs: dict) -> list[np.ndarray]:
+        input_ids = inputs["input_ids"]
+        return [(np.cumsum(input_ids, axis=1) % 97 / 97)[:, :, None]]
+
+
+def _request(*messages: tuple[str, str], session_id: str | None = None) -> bytes:
+    chat_ctx = [{"role": role, "content": content} for role, content in messages]
+    return json.dumps({"chat_ctx": chat_ctx, "session_id": session_id}).encode()
+
+
+def _runner(cls: type[_EUORunnerMultilingual]) -> _EUORunnerMultilingual:
+    runner = cls()
+    runner._tokenizer, runner._session = _CharTokenizer(), _CausalSession()
+    return runner
+
+
+def test_cached_runner_predicts_like_the_plugin() -> None:
+    runner, reference = _runner(CachedEOURunner), _runner(_EUORunnerMultilingual)
+
+    greeting = ("assistant", "Hello, how can I help you?")
+    requests = [
+        _request(greeting, ("user", "What are")),
+        _request(greeting, ("user", "What are your opening")),
+        _request(greeting, ("user", "What are your opening hours")),
+    ]
+    for data in requests:
+        expected = json.loads(reference.run(data))
+        result = json.loads(runner.run(data))
+        assert result == {**expected, "duration": result["duration"]}
+
+    # the greeting was tokenized once, only the user message is tokenized again
+    assert runner.tokenized_prefixes == 1
+
+
+def test_session_tokens_are_reused_within_a_turn() -> None:
+    runner, reference = _runner(CachedEOURunner), _runner(_EUORunnerMultilingual)
+
+    greeting = ("assistant", "Hello, how can I help you?")
+    question = ("user", "I'd like to book a table.")
+    turns = [
+        [greeting, ("user", "What are")],
+        [greeting, ("user", "What are your opening hours?")],
+        # the next user message is merged with the previous one by the model
+        [greeting, question, ("user", "For")],
+        [greeting, question, ("user", "For four, tonight")],
+    ]
+    for messages in turns:
+        expected = json.loads(reference.run(_request(*messages)))
+        result = json.loads(runner.run(_request(*messages, session_id="s1")))
+        assert result == {**expected, "duration": result["duration"]}
+
+    # the conversation was formatted and tokenized when the user message started,
+    # then only the message was tokenized again
+    assert runner.tokenized_prefixes == 2
+    assert runner._tokenizer.tokenized[-1] == (
+        "<|im_start|>user\ni'd like to book a table for four tonight"
+    )
+
+
+@pytest.fixture(scope="module")
+def model_runners() -> tuple[_EUORunnerMultilingual, CachedEOURunner]:
+    runners = (_EUORunnerMultilingual(), CachedEOURunner())
+    for runner in runners:
+        try:
+            runner.initialize()
+        except RuntimeError:
+            pytest.skip("the turn detector model isn't downloaded (download-files)")
+    return runners
+
+
+# messages of the same role merged, punctuation and accents normalized, and a
+# conversation longer than the tokens kept by the model
+_CONVERSATIONS = [
+    [
+        ("assistant", "Hi there, how can I help you today?"),
+        ("user", "I'd like to know… your opening hours?"),
+    ],
+    [
+        ("assistant", "Sure."),
+        ("assistant", "Anything else?"),
+        ("user", "Book a table"),
+        ("user", "for four, tonight at the Café"),
+    ],
+    [
+        (
+            "user" if i % 2 else "assistant",
+            f"Tell me more about option number {i}, with all the details please.",
+        )
+        for i in range(30)
+    ],
+]
+
+
+def test_cached_runner_matches_the_plugin_on_the_model(model_runners) -> None:
+    reference, runner = model_runners
+    for messages in _CONVERSATIONS:
+        # every interim transcript of the last message
+        *history, (role, content) = messages
+        words = content.split()
+        for n in range(1, len(words) + 1):
+            data = _request(*history, (role, " ".join(words[:n])))
+            expected = json.loads(reference.run(data))
+            result = json.loads(runner.run(data))
+            assert result["input"] == expected["input"]
+            assert result["eou_probability"] == pytest.approx(
+                expected["eou_probability"], abs=1e-6
+            )
+
+
+def test_session_tokens_match_the_plugin_on_the_model(model_runners) -> None:
+    reference, runner = model_runners
+    for i, messages in enumerate(_CONVERSATIONS):
+        # the conversation of a call, growing message by message with every interim
+        # transcript of each message, and a transcript rewritten by the STT
+        requests = []
+        for end in range(1, len(messages) + 1):
+            *history, (role, content) = messages[:end]
+            words = content.split()
+            requests += [
+                (*history, (role, " ".join(words[:n])))
+                for n in range(1, len(words) + 1)
+            ]
+            requests.append((*history, (role, f"{content} uh")))
+            requests.append((*history, (role, content)))
+
+        for messages_so_far in requests:
+            expected = json.loads(reference.run(_request(*messages_so_far)))
+            result = json.loads(
+                runner.run(_request(*messages_so_far, session_id=f"session-{i}"))
+            )
+            assert result["input"] == expected["input"]
+            assert result["eou_probability"] == pytest.approx(
+                expected["eou_probability"], abs=1e-6
+            )